@@ -0,0 +1,5 @@
+"""
+Offline benchmark suite for the screening pipeline.
+
+Run with `python -m benchmarks`; see benchmarks/run.py for the options.
+"""
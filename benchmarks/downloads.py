@@ -0,0 +1,110 @@
+"""
+Loads a synthetic universe into a scratch PriceStore from a fake data source
+with injected failures and latency, and checks that only failed tickers are
+retried, that every stored bar matches the source, and that a reload after
+failures that outlasted the retries requests the failed tickers alone.
+
+Examples:
+    python -m benchmarks.downloads
+    python -m benchmarks.downloads --tickers 2000 --latency 0.2 --error-rate 0.05 --empty-rate 0.1
+
+Exits with status 1 on the first failed check.
+"""
+import argparse
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+import numpy as np
+
+from screener.downloads import DOWNLOAD_BATCH_SIZE, DOWNLOAD_WORKERS
+from screener.store import PriceStore
+
+from .synthetic import FlakySource, make_ohlcv
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.downloads', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--tickers', type=int, default=500)
+    parser.add_argument('--history', default='1y', help="Synthetic history, as a yfinance period (default: 1y).")
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds per request (default: 0.05).")
+    parser.add_argument('--error-rate', type=float, default=0.02,
+                        help="Share of tickers whose requests raise (default: 0.02).")
+    parser.add_argument('--empty-rate', type=float, default=0.05,
+                        help="Share of tickers returned all-NaN (default: 0.05).")
+    parser.add_argument('--batch-size', type=int, default=DOWNLOAD_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=DOWNLOAD_WORKERS)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+
+def requested(source, since=0):
+    """Tickers included in the requests of `source` from the `since`-th on."""
+    return {ticker for tickers, _, _ in source.requests[since:] for ticker in tickers}
+
+
+def poisoned(source):
+    """Tickers that shared a request with a ticker whose requests raise, and so failed with it."""
+    return {ticker for batch, _, _ in source.requests if set(batch) & source.erroring for ticker in batch}
+
+
+def load(args, data_df, failures, retries):
+    """Loads the universe into a scratch store; returns (store, source, stored window, seconds)."""
+    source = FlakySource(data_df, args.latency, args.error_rate, args.empty_rate, failures, args.seed)
+    store = PriceStore(root=tempfile.mkdtemp(prefix='flaky-store-'), downloader=source,
+                       batch_size=args.batch_size, workers=args.workers, retries=retries)
+    store.scheduler.sleep = lambda seconds: None  # Backoff is not what is being measured
+    started = time.perf_counter()
+    window = store.load_window(data_df['Close'].columns.tolist(), data_df.index[0], fresh_for=timedelta(hours=1))
+    return store, source, window, time.perf_counter() - started
+
+
+def same_closes(window, data_df, tickers):
+    expected = data_df['Close'][tickers]
+    actual = window['Close'].reindex(index=expected.index, columns=tickers)
+    return np.array_equal(actual.to_numpy(), expected.to_numpy(), equal_nan=True)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    data_df = make_ohlcv(args.tickers, args.history, fields=('Close', 'Volume'), seed=args.seed)
+    tickers = data_df['Close'].columns.tolist()
+    try:
+        # Every failure clears within the retries
+        store, source, window, seconds = load(args, data_df, failures=1, retries=2)
+        flaky = source.erroring | source.emptying
+        check(not store.failed, f"{len(store.failed)} tickers failed although their failures cleared in time.")
+        check(same_closes(window, data_df, tickers), "Stored closes differ from the source.")
+        retried = {ticker for ticker, count in source.seen.items() if count > 1}
+        check(retried <= flaky | poisoned(source), "Tickers that succeeded were requested again.")
+        serial = store.stats['requests'] * args.latency
+        print(f"Loaded {args.tickers} tickers with {len(flaky)} flaky in {seconds:.2f}s "
+              f"({store.stats['requests']} requests, {store.stats['retried']} ticker retries; "
+              f"{serial:.2f}s of latency if run one at a time).")
+
+        # Failures outlast the retries: a reload requests only the failed tickers
+        store, source, window, _ = load(args, data_df, failures=2, retries=1)
+        failed = set(store.failed)
+        check(failed and failed <= source.erroring | source.emptying | poisoned(source),
+              "Unexpected set of failed tickers.")
+        check(failed.isdisjoint(window['Close'].columns), "Failed tickers were returned without any bars.")
+        first = len(source.requests)
+        window = store.load_window(tickers, data_df.index[0], fresh_for=timedelta(hours=1))
+        check(requested(source, first) == failed, "The reload requested tickers that had not failed.")
+        check(not store.failed and same_closes(window, data_df, tickers), "The reload did not recover every ticker.")
+        print(f"{len(failed)} tickers still failing after the retries were recovered by a reload "
+              f"that requested only them.")
+    except AssertionError as e:
+        print(e)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Regenerates the saved HTML fixtures in benchmarks/fixtures/.
+
+The pages are synthetic but follow the markup of the real Finviz quote page and
+Wikipedia constituents page closely enough to exercise the same parsing paths,
+at a comparable size. Run with `python -m benchmarks.make_fixtures`.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FINVIZ_FIXTURE = os.path.join(FIXTURES_DIR, 'finviz_quote.html')
+WIKIPEDIA_FIXTURE = os.path.join(FIXTURES_DIR, 'sp500_constituents.html')
+
+SECTORS = ['Information Technology', 'Health Care', 'Financials', 'Consumer Discretionary',
+           'Communication Services', 'Industrials', 'Consumer Staples', 'Energy', 'Utilities',
+           'Real Estate', 'Materials']
+
+
+def _filler(rng, n_blocks):
+    # Navigation, scripts and unrelated tables surrounding the element we parse
+    blocks = []
+    for i in range(n_blocks):
+        cells = ''.join(f'<td class="snapshot-td2">Label {j}</td><td class="snapshot-td2"><b>{rng.random():.2f}</b></td>'
+                        for j in range(6))
+        blocks.append(f'<div class="content-block" id="block-{i}"><script>var cfg{i} = {{"a": {i}}};</script>'
+                      f'<table class="snapshot-table2"><tr>{cells}</tr><tr>{cells}</tr></table></div>')
+    return '\n'.join(blocks)
+
+
+def make_finviz_page(ticker='TEST', n_news=100, seed=0):
+    """Returns a Finviz-style quote page with `n_news` rows in its 'news-table'."""
+    rng = np.random.default_rng(seed)
+    timestamps = pd.Timestamp('2025-12-31 16:00') - pd.to_timedelta(np.cumsum(rng.integers(5, 400, n_news)), unit='min')
+    rows = []
+    previous_day = None
+    for i, ts in enumerate(timestamps):
+        # Finviz only prints the date on the first headline of each day
+        day = ts.strftime('%b-%d-%y')
+        when = ts.strftime('%I:%M%p') if day == previous_day else f"{day} {ts.strftime('%I:%M%p')}"
+        previous_day = day
+        rows.append(
+            f'<tr class="cursor-pointer has-label" onclick="trClickHandler(event)">'
+            f'<td width="130" align="right">{when}</td>'
+            f'<td align="left"><div class="news-link-container"><div class="news-link-left">'
+            f'<a class="tab-link-news" href="https://example.com/news/{ticker.lower()}-{i}" target="_blank" '
+            f'rel="nofollow">{ticker} headline number {i} about quarterly results and guidance</a></div>'
+            f'<div class="news-link-right flex gap-1 items-center"><span>(Source {i % 7})</span></div>'
+            f'</div></td></tr>'
+        )
+    return (
+        f'<!DOCTYPE html><html lang="en"><head><title>{ticker} Stock Price and Quote</title></head><body>'
+        f'{_filler(rng, 60)}'
+        f'<table width="100%" cellpadding="1" cellspacing="0" border="0" id="news-table" class="fullview-news-outer news-table">'
+        f'{"".join(rows)}</table>'
+        f'{_filler(rng, 40)}</body></html>'
+    )
+
+
+def make_wikipedia_page(n_constituents=503, n_changes=350, seed=0):
+    """Returns a Wikipedia-style page with the constituents table followed by the changes table."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n_constituents):
+        symbol = f"T{i:03d}" if i % 97 else f"T{i:03d}.B"  # A few dotted share classes, like BRK.B
+        rows.append(
+            f'<tr><td><a rel="nofollow" class="external text" href="https://www.nyse.com/quote/{symbol}">{symbol}</a></td>'
+            f'<td><a href="/wiki/Company_{i}" title="Company {i}">Company {i} Inc.</a></td>'
+            f'<td>{SECTORS[i % len(SECTORS)]}</td><td>Sub-Industry {rng.integers(0, 120)}</td>'
+            f'<td><a href="/wiki/City_{i % 50}">City {i % 50}, State</a></td>'
+            f'<td>{1957 + i % 68}-0{1 + i % 9}-1{i % 10}</td><td>{1000000 + i:010d}</td><td>{1850 + i % 170}</td></tr>'
+        )
+    constituents = (
+        '<table class="wikitable sortable sticky-header" id="constituents"><tbody>'
+        '<tr><th>Symbol</th><th>Security</th><th>GICS Sector</th><th>GICS Sub-Industry</th>'
+        '<th>Headquarters Location</th><th>Date added</th><th>CIK</th><th>Founded</th></tr>'
+        f'{"".join(rows)}</tbody></table>'
+    )
+    changes = ''.join(
+        f'<tr><td>2024-0{1 + i % 9}-1{i % 10}</td><td>A{i:03d}</td><td>Added {i}</td>'
+        f'<td>R{i:03d}</td><td>Removed {i}</td><td>Market capitalization change.<sup>[{i}]</sup></td></tr>'
+        for i in range(n_changes)
+    )
+    changes = (
+        '<table class="wikitable sortable" id="changes"><tbody>'
+        '<tr><th rowspan="2">Effective Date</th><th colspan="2">Added</th><th colspan="2">Removed</th>'
+        '<th rowspan="2">Reason</th></tr><tr><th>Ticker</th><th>Security</th><th>Ticker</th><th>Security</th></tr>'
+        f'{changes}</tbody></table>'
+    )
+    paragraphs = ''.join(f'<p>Paragraph {i} of the article text.</p>' for i in range(40))
+    return (
+        '<!DOCTYPE html><html><head><title>List of S&amp;P 500 companies - Wikipedia</title></head><body>'
+        f'{paragraphs}{constituents}{paragraphs}{changes}</body></html>'
+    )
+
+
+def main():
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    with open(FINVIZ_FIXTURE, 'w') as f:
+        f.write(make_finviz_page())
+    with open(WIKIPEDIA_FIXTURE, 'w') as f:
+        f.write(make_wikipedia_page())
+    print(f"Wrote {FINVIZ_FIXTURE} and {WIKIPEDIA_FIXTURE}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Refreshes a scratch MetadataStore from a stub info loader whose requests
+succeed, come back without a description or fail, and checks that a second
+refresh (or ensure) of the same tickers makes no request at all, that a refresh
+stores its results in one write, that ensure does not request tickers a
+background refresh is fetching, and that only failed requests are repeated once
+the retry delay has passed.
+
+Examples:
+    python -m benchmarks.metadata
+    python -m benchmarks.metadata --tickers 2000
+
+Exits with status 1 on the first failed check.
+"""
+import argparse
+from collections import Counter
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from screener.metadata import MetadataStore
+
+
+class StubInfo:
+    """Info loader: every third ticker has no description and every fifth one fails."""
+
+    def __init__(self, latency=0.0):
+        self.calls = Counter()
+        self.latency = latency
+        self._lock = threading.Lock()
+
+    def __call__(self, ticker):
+        with self._lock:
+            self.calls[ticker] += 1
+        time.sleep(self.latency)
+        number = int(ticker[1:])
+        if number % 5 == 0:
+            raise ConnectionError(f"no info for {ticker}")
+        return {'name': f"{ticker} Corp", 'description': None if number % 3 == 0 else f"{ticker} does business."}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.metadata', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--tickers', type=int, default=500)
+    return parser.parse_args(argv)
+
+
+def check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+
+class CountingStore(MetadataStore):
+    """MetadataStore counting the SQLite connections it opens, one per write once open."""
+
+    connections = 0
+
+    def _connect(self):
+        self.connections += 1
+        return super()._connect()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tickers = [f"T{i:04d}" for i in range(args.tickers)]
+    failing = {ticker for ticker in tickers if int(ticker[1:]) % 5 == 0}
+    path = os.path.join(tempfile.mkdtemp(prefix='metadata-store-'), 'metadata.sqlite')
+    # A store created before failed requests were recorded, to be migrated on open
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE metadata (ticker TEXT PRIMARY KEY, name TEXT, sector TEXT, industry TEXT, "
+                     "description TEXT, info_updated REAL)")
+    loader = StubInfo()
+    store = CountingStore(path=path, info_loader=loader)
+    try:
+        opened = store.connections
+        store.refresh(tickers)
+        check(sum(loader.calls.values()) == len(tickers), "The first refresh did not request every ticker once.")
+        check(store.connections - opened == 1,
+              f"The first refresh wrote {store.connections - opened} times instead of once.")
+        first = sum(loader.calls.values())
+        store.refresh(tickers)
+        store.ensure(tickers)
+        check(sum(loader.calls.values()) == first,
+              f"A second refresh made {sum(loader.calls.values()) - first} requests instead of none.")
+        reopened = MetadataStore(path=path, info_loader=loader)
+        reopened.refresh(tickers)
+        check(sum(loader.calls.values()) == first, "A reopened store requested tickers again.")
+        print(f"Refreshed {len(tickers)} tickers ({len(failing)} failing, some without a description); "
+              f"refreshing them again made no request.")
+
+        reopened.retry_delay = timedelta(0)
+        reopened.refresh(tickers)
+        retried = {ticker for ticker, count in loader.calls.items() if count > 1}
+        check(retried == failing, "Requests other than the failed ones were repeated after the retry delay.")
+        print(f"After the retry delay only the {len(failing)} failed tickers were requested again.")
+
+        # A background refresh and ensure of the same new tickers, as the app starts both
+        slow = StubInfo(latency=0.01)
+        fresh = MetadataStore(path=os.path.join(os.path.dirname(path), 'fresh.sqlite'), info_loader=slow)
+        fresh.refresh_in_background(tickers)
+        fresh.ensure(tickers)
+        fresh._refresh_thread.join()
+        repeated = [ticker for ticker, count in slow.calls.items() if count > 1]
+        check(not repeated, f"ensure requested {len(repeated)} tickers the background refresh was fetching.")
+        check(len(slow.calls) == len(tickers), "The background refresh and ensure left tickers unrequested.")
+        print("ensure during a background refresh requested no ticker twice.")
+    except AssertionError as e:
+        print(e)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Fetches headlines for a set of tickers from a local HTTP stub that serves the
+saved Finviz fixture with injected latency and a transient 503 for some
+tickers, and checks that requests run concurrently, that the 503s are retried,
+that the headlines match the fixture and that a second fetch within the TTL is
+served from the cache without any request.
+
+Examples:
+    python -m benchmarks.news
+    python -m benchmarks.news --tickers 32 --workers 8 --latency 0.5 --unavailable 4
+
+Exits with status 1 on the first failed check.
+"""
+import argparse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from screener.extract import extract_finviz_headlines
+from screener.news import NewsFetcher
+
+from .make_fixtures import FINVIZ_FIXTURE
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves `page` for any ticker after `latency` seconds; tickers in `unavailable` get one 503 first."""
+
+    page = b''
+    latency = 0.0
+    unavailable = set()
+    requests = Counter()  # ticker -> requests received
+    lock = threading.Lock()
+
+    def do_GET(self):
+        ticker = parse_qs(urlsplit(self.path).query)['t'][0]
+        with self.lock:
+            self.requests[ticker] += 1
+            fail = ticker in self.unavailable and self.requests[ticker] == 1
+        time.sleep(self.latency)
+        self.send_response(503 if fail else 200)
+        self.send_header('Content-Length', '0' if fail else str(len(self.page)))
+        self.end_headers()
+        if not fail:
+            self.wfile.write(self.page)
+
+    def log_message(self, *args):
+        pass  # Keep the output to the check results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.news', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--tickers', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.2, help="Seconds per request (default: 0.2).")
+    parser.add_argument('--unavailable', type=int, default=2,
+                        help="Tickers answered with one 503 before their page (default: 2).")
+    parser.add_argument('--backoff', type=float, default=0.05)
+    return parser.parse_args(argv)
+
+
+def check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tickers = [f"T{i:03d}" for i in range(args.tickers)]
+    with open(FINVIZ_FIXTURE, 'rb') as f:
+        StubHandler.page = f.read()
+    StubHandler.latency = args.latency
+    StubHandler.unavailable = set(tickers[:args.unavailable])
+    StubHandler.requests.clear()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    fetcher = NewsFetcher(base_url=f"http://127.0.0.1:{server.server_port}/quote.ashx?t=",
+                          max_workers=args.workers, rate=None, backoff=args.backoff)
+    expected = extract_finviz_headlines(StubHandler.page.decode(), fetcher.n_headlines)
+    try:
+        started = time.perf_counter()
+        results = fetcher.fetch_all(tickers)
+        seconds = time.perf_counter() - started
+        check(all(error is None for _, error in results.values()), "Some tickers failed despite their retries.")
+        check(all(headlines == expected for headlines, _ in results.values()),
+              "Headlines differ from the fixture's.")
+        check(StubHandler.requests == Counter({ticker: 2 if ticker in StubHandler.unavailable else 1
+                                               for ticker in tickers}),
+              f"Unexpected requests per ticker: {dict(StubHandler.requests)}.")
+        rounds = -(-args.tickers // args.workers)
+        # Every round of requests runs at once; the retried tickers add one request and their backoff
+        concurrent = (rounds + (1 if args.unavailable else 0)) * args.latency + args.backoff
+        serial = sum(StubHandler.requests.values()) * args.latency
+        check(seconds < concurrent * 1.5 + 0.1, f"Fetching took {seconds:.2f}s, expected about {concurrent:.2f}s "
+                                                f"with {args.workers} requests at a time.")
+        print(f"Fetched {args.tickers} tickers in {seconds:.2f}s ({serial:.2f}s of latency if run one at a time), "
+              f"retrying {args.unavailable} after a 503.")
+
+        first = sum(StubHandler.requests.values())
+        started = time.perf_counter()
+        cached = fetcher.fetch_all(tickers)
+        check(sum(StubHandler.requests.values()) == first, "A fetch within the TTL sent requests.")
+        check(cached == results, "Cached headlines differ from the fetched ones.")
+        print(f"Fetched them again from the cache in {time.perf_counter() - started:.3f}s without any request.")
+    except AssertionError as e:
+        print(e)
+        return 1
+    finally:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""
+The HTML parsers that screener.extract replaced, kept as reference stages for
+the benchmark suite: the targeted parsers must stay faster than these on the
+saved fixtures. The Finviz reference needs beautifulsoup4, which the screener
+itself no longer uses; without it that comparison is skipped.
+"""
+import io
+
+import pandas as pd
+
+from screener.universe import COLUMN_ALIASES, normalize_constituents
+
+
+def bs4_finviz_headlines(html, n_headlines):
+    """
+    The former parse_finviz_headlines: builds a BeautifulSoup tree of the whole
+    page and returns up to `n_headlines` (headline, date/time text) tuples, or
+    None if the page has no 'news-table'.
+    """
+    from bs4 import BeautifulSoup  # Imported lazily: optional, only needed for this reference
+
+    news_table = BeautifulSoup(html, features="lxml").find(id='news-table')
+    if not news_table:
+        return None
+
+    headlines = []
+    for table_row in news_table.find_all('tr'):
+        if len(headlines) >= n_headlines:
+            break
+        a_tag = table_row.find('a')
+        td_tag = table_row.find('td')
+        if a_tag and td_tag:
+            headlines.append((a_tag.text, td_tag.text.strip()))
+    return headlines
+
+
+def read_html_constituents(html):
+    """The former parse_constituents_table: parses every table of the page with pd.read_html."""
+    for table in pd.read_html(io.StringIO(html)):
+        if any(alias in table.columns for alias in COLUMN_ALIASES['Symbol']):
+            return normalize_constituents(table)
+    raise ValueError("No constituents table found on the page.")
@@ -0,0 +1,282 @@
+"""
+Benchmarks every stage of the screening pipeline on synthetic data and saved
+HTML fixtures, entirely offline, and compares the timings with a stored
+baseline.
+
+Examples:
+    python -m benchmarks                       # quick suite, compared with baseline.json
+    python -m benchmarks --suite full
+    python -m benchmarks --tickers 500,5000 --history 1y,10y --nan-density 0.02
+    python -m benchmarks --update-baseline     # record the current timings as the baseline
+
+Each stage reports its median wall time over --repeat runs, the peak memory it
+allocated (tracemalloc) and its throughput. A stage slower than the baseline by
+more than --tolerance (and by more than a few milliseconds, to ignore timer noise)
+is timed again with three times the runs; if it is still slower, it is reported
+as a regression and makes the run exit with status 1, as does a stage that is
+not faster than the reference stage it replaced (see FASTER_THAN), timed in the
+same run. Baselines are machine-specific: record one on the machine that runs
+the comparison, and raise --tolerance on machines with noisy timings (shared CI
+runners, containers).
+"""
+import argparse
+import gc
+import importlib.util
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+from screener.backtest import run_backtest
+from screener.downloads import DownloadScheduler
+from screener.incremental import MomentumState
+from screener.indicators import calculate_indicators_for_all
+from screener.momentum import MOMENTUM_HORIZONS, calculate_momentum_for_all, extract_close_prices
+from screener.news import parse_finviz_headlines
+from screener.ranking import RankIndex, build_momentum_snapshot
+from screener.sectors import aggregate_group_momentum, format_group_summary
+from screener.streaming import stream_snapshot
+from screener.universe import parse_sp500_constituents
+
+from .make_fixtures import FINVIZ_FIXTURE, WIKIPEDIA_FIXTURE
+from .reference import bs4_finviz_headlines, read_html_constituents
+from .synthetic import FlakySource, make_ohlcv, make_sector_map
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# Slowdowns smaller than this many seconds are treated as timer noise
+MIN_REGRESSION_SECONDS = 0.005
+# Stages that must beat the stage of the code they replaced, timed on the same case in the same run
+FASTER_THAN = {
+    'finviz_parse': 'finviz_parse_reference',
+    'wikipedia_parse': 'wikipedia_parse_reference',
+}
+
+# (tickers, history, nan density, listing-gap density) cases per suite
+SUITES = {
+    'quick': [
+        (500, '3mo', 0.0, 0.0),
+        (500, '2y', 0.02, 0.05),
+        (2000, '1y', 0.02, 0.05),
+    ],
+    'full': [
+        (500, '2mo', 0.0, 0.0),
+        (500, '3mo', 0.0, 0.0),
+        (500, '2y', 0.02, 0.05),
+        (500, '10y', 0.02, 0.05),
+        (2000, '1y', 0.02, 0.05),
+        (5000, '1y', 0.05, 0.10),
+        (10000, '2mo', 0.0, 0.0),
+        (10000, '2y', 0.02, 0.05),
+    ],
+}
+
+
+def measure(func, repeat):
+    """
+    Returns (median wall seconds, peak traced bytes, last result) over `repeat`
+    calls of `func`. The median, unlike the best run, is not set by one
+    unusually fast run, so a baseline recorded with it is reproducible.
+    """
+    # Untimed warm-up, so one-off costs (lazy imports, caches) do not land on the first case
+    result = func()
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+
+    # Memory is measured in a separate run, as tracing slows allocation-heavy code down
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(timings), peak, result
+
+
+def data_stages(n_tickers, history, nan_density, gap_density):
+    """Yields (stage, work units, unit name, function) for one synthetic data case."""
+    data_df = make_ohlcv(n_tickers, history, nan_density, gap_density)
+    columns = list(MOMENTUM_HORIZONS)
+    momentum_df, _, _ = build_momentum_snapshot(data_df, columns)
+    sector_map = make_sector_map(momentum_df['Ticker'].tolist())
+    summary, _ = aggregate_group_momentum(momentum_df, sector_map, columns=columns)
+
+    def format_results():
+        # A fresh index each time, so every run formats its rows from scratch
+        rank_index = RankIndex(momentum_df, columns)
+        for col in columns:
+            rank_index.display_rows(rank_index.head(col, 50, ascending=False), percentile_column=col)
+            rank_index.display_rows(rank_index.head(col, 50, ascending=True), percentile_column=col)
+        format_group_summary(summary, columns[0])
+
+    closes = data_df['Close']
+    state = MomentumState.from_history(closes.iloc[:-1])
+    last_date, last_bar = closes.index[-1], closes.iloc[-1]
+
+    def incremental_update():
+        # After the first call this amends the current bar, as an intraday refresh does;
+        # compare with the 'momentum' stage (ranking is measured on its own)
+        state.apply_bar(last_date, last_bar)
+        return state.momentum()
+
+    tickers = data_df.columns.get_level_values(1)
+
+    def load_chunk(chunk):
+        return data_df.loc[:, tickers.isin(chunk)]
+
+    def download():
+        # Batching, splitting and one retry of 5% of the tickers; no latency and no backoff
+        scheduler = DownloadScheduler(FlakySource(data_df, empty_rate=0.05), sleep=lambda seconds: None)
+        return scheduler.run(tickers.unique(), data_df.index[0])
+
+    yield 'download', n_tickers, 'tickers', download
+    yield 'momentum', n_tickers, 'tickers', lambda: calculate_momentum_for_all(data_df)
+    yield 'indicators', n_tickers, 'tickers', lambda: calculate_indicators_for_all(data_df)
+    yield 'incremental', n_tickers, 'tickers', incremental_update
+    try:
+        run_backtest(closes)
+    except ValueError:
+        pass  # Fewer than two month-ends of history
+    else:
+        yield 'backtest', n_tickers, 'tickers', lambda: run_backtest(extract_close_prices(data_df))
+    yield 'ranking', n_tickers, 'tickers', lambda: RankIndex(momentum_df, columns)
+    # Momentum and ranking chunk by chunk; its peak memory stays flat as the universe grows
+    yield 'streaming', n_tickers, 'tickers', lambda: stream_snapshot(tickers.unique(), load_chunk, columns)
+    yield 'formatting', n_tickers, 'tickers', format_results
+    yield 'sectors', n_tickers, 'tickers', lambda: aggregate_group_momentum(momentum_df, sector_map, columns=columns)
+
+
+def html_stages():
+    """Yields (stage, work units, unit name, function) for the saved HTML fixtures."""
+    with open(FINVIZ_FIXTURE) as f:
+        finviz_html = f.read()
+    with open(WIKIPEDIA_FIXTURE) as f:
+        wikipedia_html = f.read()
+
+    yield 'finviz_parse', len(finviz_html) / 1e6, 'MB', lambda: parse_finviz_headlines(finviz_html, 3)
+    if importlib.util.find_spec('bs4') is None:
+        print("beautifulsoup4 is not installed: skipping finviz_parse_reference.", file=sys.stderr)
+    else:
+        yield 'finviz_parse_reference', len(finviz_html) / 1e6, 'MB', lambda: bs4_finviz_headlines(finviz_html, 3)
+    yield 'wikipedia_parse', len(wikipedia_html) / 1e6, 'MB', lambda: parse_sp500_constituents(wikipedia_html)
+    yield ('wikipedia_parse_reference', len(wikipedia_html) / 1e6, 'MB',
+           lambda: read_html_constituents(wikipedia_html))
+
+
+def run_suite(cases, repeat, suspect=None):
+    """
+    Runs every stage for every case, returning a list of result dicts. A stage
+    for which `suspect(key, seconds)` is true, e.g. one slower than its
+    baseline, is timed again with three times the runs and keeps the faster
+    median, so a burst of load on the machine is not taken for a regression.
+    """
+    results = []
+    groups = [(f"{n}x{history} nan={nan} gaps={gaps}", data_stages(n, history, nan, gaps))
+              for n, history, nan, gaps in cases]
+    groups.append(('fixtures', html_stages()))
+    for case, stages in groups:
+        for stage, units, unit, func in stages:
+            key = f"{stage}[{case}]"
+            seconds, peak, _ = measure(func, repeat)
+            if suspect is not None and suspect(key, seconds):
+                seconds = min(seconds, measure(func, 3 * repeat)[0])
+            results.append({
+                'key': key,
+                'stage': stage,
+                'case': case,
+                'seconds': seconds,
+                'peak_mb': peak / 1e6,
+                'throughput': f"{units / seconds:,.1f} {unit}/s" if seconds else 'n/a',
+            })
+            print(f"{results[-1]['key']:<55} {seconds * 1e3:>10.2f} ms {peak / 1e6:>9.1f} MB  {results[-1]['throughput']}")
+    return results
+
+
+def is_regression(seconds, reference, tolerance):
+    """Whether `seconds` is slower than the `reference` timing by more than `tolerance` and timer noise."""
+    return seconds > reference * (1 + tolerance) and seconds - reference > MIN_REGRESSION_SECONDS
+
+
+def compare(results, baseline, tolerance):
+    """Returns the results that are slower than the baseline by more than `tolerance`."""
+    return [(result, baseline[result['key']]) for result in results
+            if result['key'] in baseline and is_regression(result['seconds'], baseline[result['key']], tolerance)]
+
+
+def compare_references(results):
+    """Returns (result, reference result) pairs of the FASTER_THAN stages that were not faster."""
+    by_key = {result['key']: result for result in results}
+    slower = []
+    for result in results:
+        reference = by_key.get(f"{FASTER_THAN.get(result['stage'])}[{result['case']}]")
+        if reference is not None and result['seconds'] >= reference['seconds']:
+            slower.append((result, reference))
+    return slower
+
+
+def parse_cases(args):
+    if not (args.tickers or args.history or args.nan_density):
+        return SUITES[args.suite]
+    tickers = [int(n) for n in (args.tickers or '500').split(',')]
+    histories = (args.history or '3mo').split(',')
+    nan_densities = [float(x) for x in (args.nan_density or '0').split(',')]
+    return [(n, h, nan, nan) for n, h, nan in itertools.product(tickers, histories, nan_densities)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.strip().splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--suite', choices=list(SUITES), default='quick', help="Predefined set of cases.")
+    parser.add_argument('--tickers', help="Comma-separated ticker counts (overrides --suite).")
+    parser.add_argument('--history', help="Comma-separated history lengths, e.g. 2mo,1y,10y (overrides --suite).")
+    parser.add_argument('--nan-density', help="Comma-separated NaN and listing-gap densities (overrides --suite).")
+    parser.add_argument('--repeat', type=int, default=7, help="Timed runs per stage; the median is kept.")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="Baseline JSON file.")
+    parser.add_argument('--tolerance', type=float, default=1.0,
+                        help="Allowed slowdown relative to the baseline (default: 1.0, i.e. up to 2x).")
+    parser.add_argument('--update-baseline', action='store_true', help="Write the timings to the baseline file.")
+    parser.add_argument('--json', help="Also write the full results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    def suspect(key, seconds):
+        return not args.update_baseline and key in baseline and is_regression(seconds, baseline[key], args.tolerance)
+
+    results = run_suite(parse_cases(args), args.repeat, suspect)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+
+    if args.update_baseline:
+        baseline.update({result['key']: round(result['seconds'], 6) for result in results})
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} REGRESSION(S) against {args.baseline}:", file=sys.stderr)
+        for result, reference in regressions:
+            print(f"  {result['key']}: {result['seconds'] * 1e3:.2f} ms vs baseline {reference * 1e3:.2f} ms "
+                  f"({result['seconds'] / reference:.2f}x)", file=sys.stderr)
+    slower = compare_references(results)
+    if slower:
+        print(f"\n{len(slower)} STAGE(S) not faster than the code they replaced:", file=sys.stderr)
+        for result, reference in slower:
+            print(f"  {result['key']}: {result['seconds'] * 1e3:.2f} ms vs {reference['key']} "
+                  f"{reference['seconds'] * 1e3:.2f} ms", file=sys.stderr)
+    if regressions or slower:
+        return 1
+    print(f"\nNo regressions against {args.baseline}." if baseline else "\nNo baseline to compare against.")
+    return 0
@@ -0,0 +1,107 @@
+"""
+Loads overlapping slices of a synthetic universe into one scratch price store
+from several writers at once, each with its own PriceStore, as the app's
+foreground loads and background refreshes do, and checks that no writer drops
+the bars or manifest entries of another and that the manifest describes the
+bars the table holds.
+
+Examples:
+    python -m benchmarks.store
+    python -m benchmarks.store --tickers 2000 --writers 8 --latency 0.05
+
+Exits with status 1 on the first failed check.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from screener.store import PriceStore
+
+from .synthetic import FlakySource, make_ohlcv
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.store', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--tickers', type=int, default=600)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--chunk-size', type=int, default=50)
+    parser.add_argument('--history', default='1y', help="Synthetic history, as a yfinance period (default: 1y).")
+    parser.add_argument('--latency', type=float, default=0.02, help="Seconds per request (default: 0.02).")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+
+def writer_tickers(tickers, writer, writers):
+    """The slice of `tickers` loaded by `writer`: its own share plus half of the next writer's."""
+    share = len(tickers) // writers
+    begin = writer * share
+    return tickers[begin:begin + share + share // 2]
+
+
+def write(root, source, tickers, start, chunk_size):
+    """Loads `tickers` in chunks without flushing, then flushes once, as ChunkLoader does."""
+    store = PriceStore(root=root, downloader=source)
+    for i in range(0, len(tickers), chunk_size):
+        store.load_window(tickers[i:i + chunk_size], start, flush=False)
+    store.flush()
+
+
+def check_store(root, data_df, tickers, start):
+    """Checks that a fresh store holds the source's bars of `tickers` from `start` on, as its manifest says."""
+    store = PriceStore(root=root)
+    missing = sorted(set(tickers) - set(store.manifest))
+    check(not missing, f"{len(missing)} tickers lost their manifest entries, e.g. {missing[:3]}.")
+    window = store.read_window(tickers, start, fields=['Close'])
+    expected = data_df['Close'][tickers]
+    expected = expected[expected.index >= pd.Timestamp(start)]
+    actual = window['Close'].reindex(index=expected.index, columns=tickers) if not window.empty else None
+    check(actual is not None and np.array_equal(actual.to_numpy(), expected.to_numpy(), equal_nan=True),
+          "Stored closes differ from the source: a writer dropped bars written by another.")
+    closes = window['Close']
+    for ticker in tickers:
+        entry = store.manifest[ticker]
+        stored = closes[ticker].dropna().index
+        check(pd.Timestamp(entry['last']) == stored[-1],
+              f"The manifest of {ticker} ends on {entry['last']}, the table on {stored[-1]:%Y-%m-%d}.")
+        check(pd.Timestamp(entry['start']) <= pd.Timestamp(start),
+              f"The manifest of {ticker} starts on {entry['start']}, after the window loaded from {start:%Y-%m-%d}.")
+    leftovers = [name for name in os.listdir(store.directory) if name.startswith('staged.')]
+    check(not leftovers, f"{len(leftovers)} staging files were left behind.")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    data_df = make_ohlcv(args.tickers, args.history, fields=('Open', 'High', 'Low', 'Close', 'Volume'),
+                         seed=args.seed)
+    tickers = data_df['Close'].columns.tolist()
+    root = tempfile.mkdtemp(prefix='shared-store-')
+    source = FlakySource(data_df, args.latency)
+    slices = [writer_tickers(tickers, writer, args.writers) for writer in range(args.writers)]
+    try:
+        # Every writer first stores the second half of the history, then extends it back to the first bar
+        for start in (data_df.index[len(data_df) // 2], data_df.index[0]):
+            with ThreadPoolExecutor(max_workers=args.writers) as executor:
+                for future in [executor.submit(write, root, source, part, start, args.chunk_size) for part in slices]:
+                    future.result()
+            covered = sorted({ticker for part in slices for ticker in part})
+            check_store(root, data_df, covered, start)
+            print(f"{args.writers} writers loading {len(covered)} tickers from {start:%Y-%m-%d} at once kept "
+                  f"every ticker's bars and manifest entry.")
+    except AssertionError as e:
+        print(e)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Deterministic synthetic market data shaped like a yfinance download.
+"""
+import re
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+OHLCV_FIELDS = ['Close', 'High', 'Low', 'Open', 'Volume']
+# Trading days per period unit, used to size the synthetic history
+TRADING_DAYS = {'d': 1, 'wk': 5, 'mo': 21, 'y': 252}
+# Last date of every synthetic history, so results never depend on today's date
+END_DATE = '2025-12-31'
+
+
+def history_length(period):
+    """Returns the number of trading days in a yfinance-style period such as '2mo' or '10y'."""
+    match = re.fullmatch(r'(\d+)(d|wk|mo|y)', period)
+    if not match:
+        raise ValueError(f"Unsupported period: {period!r}")
+    return int(match.group(1)) * TRADING_DAYS[match.group(2)]
+
+
+def make_ohlcv(n_tickers, period='3mo', nan_density=0.0, listing_gap_density=0.0,
+               fields=OHLCV_FIELDS, seed=0):
+    """
+    Generates a yfinance-shaped OHLCV frame (columns: field x ticker) of random walks.
+
+    Args:
+        n_tickers (int): Number of tickers.
+        period (str): History length as a yfinance period, e.g. '2mo' or '10y'.
+        nan_density (float): Share of bars knocked out at random, like missing quotes.
+        listing_gap_density (float): Share of tickers that list part-way through the
+                                     history, leaving a leading run of NaNs.
+        fields (list): Price fields to include.
+        seed (int): Random seed; the same arguments always give the same frame.
+
+    Returns:
+        pd.DataFrame: Date-indexed frame with ('Price', 'Ticker') MultiIndex columns.
+    """
+    rng = np.random.default_rng(seed)
+    n_days = history_length(period)
+    dates = pd.bdate_range(end=END_DATE, periods=n_days, name='Date')
+    tickers = [f"T{i:05d}" for i in range(n_tickers)]
+
+    drift = rng.normal(0.0003, 0.0005, n_tickers)
+    volatility = rng.uniform(0.01, 0.03, n_tickers)
+    log_returns = rng.standard_normal((n_days, n_tickers)) * volatility + drift
+    close = rng.uniform(10, 500, n_tickers) * np.exp(np.cumsum(log_returns, axis=0))
+
+    missing = rng.random((n_days, n_tickers)) < nan_density
+    listed_late = rng.random(n_tickers) < listing_gap_density
+    listing_day = rng.integers(0, n_days, n_tickers)
+    missing |= listed_late & (np.arange(n_days)[:, None] < listing_day)
+
+    spread = np.abs(rng.standard_normal((n_days, n_tickers))) * volatility * close
+    values = {
+        'Close': close,
+        'High': close + spread,
+        'Low': close - spread,
+        'Open': close * np.exp(rng.standard_normal((n_days, n_tickers)) * volatility / 2),
+        'Volume': rng.integers(100_000, 10_000_000, (n_days, n_tickers)).astype(np.float64),
+    }
+    for field in values.values():
+        field[missing] = np.nan
+
+    columns = pd.MultiIndex.from_product([list(fields), tickers], names=['Price', 'Ticker'])
+    return pd.DataFrame(np.hstack([values[f] for f in fields]), index=dates, columns=columns)
+
+
+def make_sector_map(tickers, n_sectors=11, n_industries=60, seed=0):
+    """Returns a ticker-indexed 'sector'/'industry' frame like screener.sectors.get_sector_map."""
+    rng = np.random.default_rng(seed)
+    industries = rng.integers(0, n_industries, len(tickers))
+    return pd.DataFrame(
+        {
+            'sector': [f"Sector {i % n_sectors}" for i in industries],
+            'industry': [f"Industry {i}" for i in industries],
+        },
+        index=pd.Index(tickers, name='Ticker'),
+    )
+
+
+class FlakySource:
+    """
+    Fake data source for PriceStore and DownloadScheduler: serves the bars of a
+    make_ohlcv frame with simulated latency and injected failures.
+
+    A seeded share `error_rate` of the tickers makes every request that includes
+    them raise ConnectionError, and a share `empty_rate` comes back all-NaN (as
+    yfinance returns tickers that hit a transient error), for their first
+    `failures` requests; afterwards they succeed. Every request is recorded in
+    `requests`.
+    """
+
+    def __init__(self, data_df, latency=0.0, error_rate=0.0, empty_rate=0.0, failures=1, seed=0):
+        self.data_df = data_df
+        self.latency = latency
+        tickers = data_df.columns.get_level_values(1).unique()
+        draws = np.random.default_rng(seed).random(len(tickers))
+        self.erroring = set(tickers[draws < error_rate])
+        self.emptying = set(tickers[(draws >= error_rate) & (draws < error_rate + empty_rate)])
+        self.failures = failures
+        self.requests = []  # (tickers, start, end) of every call
+        self.seen = {}  # ticker -> number of requests that included it
+        self._lock = threading.Lock()
+
+    def __call__(self, tickers, start, end=None, interval='1d'):
+        with self._lock:
+            self.requests.append((tuple(tickers), start, end))
+            failing = set()
+            for ticker in tickers:
+                self.seen[ticker] = self.seen.get(ticker, 0) + 1
+                if self.seen[ticker] <= self.failures:
+                    failing.add(ticker)
+        time.sleep(self.latency)
+        if failing & self.erroring:
+            raise ConnectionError(f"Injected failure for {sorted(failing & self.erroring)[0]}")
+
+        dates = self.data_df.index
+        rows = (dates >= pd.Timestamp(start)) & (dates < pd.Timestamp(end) if end is not None else True)
+        columns = self.data_df.columns.get_level_values(1).isin(tickers)
+        values = self.data_df.to_numpy()[np.ix_(rows, columns)]
+        served = self.data_df.columns[columns]
+        values[:, served.get_level_values(1).isin(list(failing & self.emptying))] = np.nan
+        return pd.DataFrame(values, index=dates[rows], columns=served)
+
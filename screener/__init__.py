@@ -0,0 +1,8 @@
+"""
+UI-free S&P 500 momentum screening pipeline: ticker universe, price store,
+momentum calculation, rankings, company metadata and news.
+
+Submodules are imported on demand, so `import screener` stays cheap; the
+Streamlit app (streamlit_app.py) and the command-line screener
+(`python -m screener`) are both thin clients of these modules.
+"""
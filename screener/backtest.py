@@ -0,0 +1,198 @@
+"""
+Walk-forward backtest of the momentum rankings over the downloaded history.
+
+At every rebalance date the cross-section is ranked on each horizon the way the
+app ranks it today, and equal-weighted top-N and bottom-N portfolios are held
+until the next rebalance. All rebalance dates are priced and ranked at once with
+array operations; there is no Python loop over dates.
+"""
+import numpy as np
+import pandas as pd
+
+from .momentum import MAX_STALENESS, anchor_rows, as_horizons, close_values, latest_valid_rows
+
+# Rebalance frequencies offered to users, as pandas period aliases
+REBALANCE_FREQUENCIES = {
+    'Weekly': 'W',
+    'Monthly': 'M',
+    'Quarterly': 'Q',
+}
+
+# Portfolio sizes offered to users: a fraction of the ranked names, or a number of names
+PORTFOLIO_SIZES = {
+    'Deciles': 0.1,
+    'Quintiles': 0.2,
+    'Top 10': 10,
+    'Top 25': 25,
+    'Top 50': 50,
+}
+
+# Per-period statistics reported for each horizon
+BACKTEST_STATS = ('Top', 'Bottom', 'Spread', 'Universe', 'Top Hit Rate', 'Bottom Hit Rate',
+                  'Top Turnover', 'Bottom Turnover', 'Names')
+
+
+def rebalance_rows(dates, frequency='M'):
+    """
+    Returns the rows of `dates` (sorted) to rebalance on: the last trading day of
+    every period of `frequency` (a pandas period alias such as 'W', 'M' or 'Q'),
+    or every `frequency`-th row counting back from the latest if it is an int.
+    """
+    if isinstance(frequency, (int, np.integer)):
+        return np.arange(len(dates) - 1, -1, -int(frequency))[::-1]
+    periods = pd.DatetimeIndex(dates).to_period(frequency)
+    return np.flatnonzero(np.append(periods[1:] != periods[:-1], True))
+
+
+def portfolio_sizes(counts, size):
+    """
+    Names per side for each rebalance date: `size` names if it is 1 or more, or that
+    fraction of the ranked names (0.1 for deciles), never more than half of them.
+    """
+    if 0 < size < 1:
+        sizes = np.floor(counts * size).astype(np.int64)
+    else:
+        sizes = np.full(len(counts), int(size))
+    return np.minimum(sizes, counts // 2)
+
+
+def _mean(values):
+    """Mean of the non-NaN entries, NaN (without a warning) if there are none."""
+    values = values[~np.isnan(values)]
+    return values.mean() if len(values) else np.nan
+
+
+def _rank_positions(keys):
+    """Position of every entry in its row's ascending sort order."""
+    order = np.argsort(keys, axis=1, kind='stable')
+    positions = np.empty_like(order)
+    np.put_along_axis(positions, order, np.arange(keys.shape[1])[None, :], axis=1)
+    return positions
+
+
+def run_backtest(close_prices_df, horizons=None, rebalance='M', size=0.1, max_staleness=MAX_STALENESS):
+    """
+    Backtests top-N and bottom-N momentum portfolios for every horizon.
+
+    Args:
+        close_prices_df (pd.DataFrame): Close prices, one column per ticker.
+        horizons (dict, optional): Mapping of label to Horizon, as in
+                                   `compute_calendar_momentum`. Defaults to
+                                   MOMENTUM_HORIZONS.
+        rebalance (str or int): Rebalance frequency, see `rebalance_rows`.
+        size (int or float): Names per portfolio, or a fraction of the ranked
+                             names (0.1 for top and bottom deciles).
+        max_staleness (pd.Timedelta): Tickers whose anchor or entry price is
+                                      older than this are not ranked.
+
+    Returns:
+        tuple: (summary, periods). `periods` is indexed by rebalance date with
+               (horizon, stat) columns for every stat in BACKTEST_STATS: the
+               forward return of each equal-weighted portfolio until the next
+               rebalance, the share of its names beating (top) or trailing
+               (bottom) the cross-sectional median, the share of names replaced
+               since the previous rebalance, and the number of names ranked.
+               `summary` has one row per horizon with the mean of each stat,
+               the cumulative returns and the share of periods the top
+               portfolio beat the bottom one.
+
+    Raises:
+        ValueError: If the history spans fewer than two rebalance dates.
+    """
+    horizons = as_horizons(horizons)
+    close_prices_df, values = close_values(close_prices_df)
+    dates = pd.DatetimeIndex(close_prices_df.index).as_unit('ns')
+    rows = rebalance_rows(dates, rebalance)
+    if len(rows) < 2:
+        raise ValueError("The history is too short for a backtest: it needs at least two rebalance dates.")
+
+    last_valid = latest_valid_rows(values)
+    dates_ns = dates.asi8
+    limit = pd.Timedelta(max_staleness).value
+    columns = np.arange(values.shape[1])
+
+    def prices_at(at_rows):
+        """(rebalance dates x tickers) prices as of `at_rows` and whether each is stale or missing."""
+        idx = last_valid[np.maximum(at_rows, 0)]
+        found = (idx >= 0) & (at_rows >= 0)[:, None]
+        idx = np.maximum(idx, 0)
+        prices = np.where(found, values[idx, columns], np.nan).astype(np.float64)
+        stale = ~found | (dates_ns[idx] < dates_ns[np.maximum(at_rows, 0)][:, None] - limit)
+        return prices, stale
+
+    entry, entry_stale = prices_at(rows)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        forward = entry[1:] / entry[:-1] - 1  # held from each rebalance to the next
+    entry, entry_stale = entry[:-1], entry_stale[:-1]
+    held_rows = rows[:-1]
+
+    periods = {}
+    summary = {}
+    for label, horizon in horizons.items():
+        start, start_stale = prices_at(anchor_rows(dates, horizon.start, held_rows))
+        end, end_stale = prices_at(anchor_rows(dates, horizon.end, held_rows))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            momentum = np.where(start != 0, end / start - 1, np.nan)
+        eligible = ~np.isnan(momentum) & ~(start_stale | end_stale | entry_stale) & ~np.isnan(forward)
+
+        counts = eligible.sum(axis=1)
+        sizes = portfolio_sizes(counts, size)
+        # Ineligible names sort last in both directions, so they never make a portfolio
+        top = _rank_positions(np.where(eligible, -momentum, np.inf)) < sizes[:, None]
+        bottom = _rank_positions(np.where(eligible, momentum, np.inf)) < sizes[:, None]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ranked_forward = np.where(eligible, forward, np.nan)
+            median = np.full(len(counts), np.nan)
+            has_names = counts > 0
+            median[has_names] = np.nanmedian(ranked_forward[has_names], axis=1)
+            filled = np.where(eligible, forward, 0.0)
+            stats = {
+                'Top': (filled * top).sum(axis=1) / sizes,
+                'Bottom': (filled * bottom).sum(axis=1) / sizes,
+                'Universe': filled.sum(axis=1) / counts,
+                'Top Hit Rate': (top & (forward > median[:, None])).sum(axis=1) / sizes,
+                'Bottom Hit Rate': (bottom & (forward < median[:, None])).sum(axis=1) / sizes,
+            }
+            stats['Spread'] = stats['Top'] - stats['Bottom']
+            for side, members in (('Top', top), ('Bottom', bottom)):
+                kept = (members[1:] & members[:-1]).sum(axis=1)
+                # Undefined right after a period without a portfolio
+                turnover = np.where(sizes[:-1] > 0, 1 - kept / sizes[1:], np.nan)
+                stats[f"{side} Turnover"] = np.append(np.nan, turnover)
+        stats['Names'] = counts
+        empty = sizes == 0
+        for stat in BACKTEST_STATS:
+            if stat != 'Names':
+                stats[stat] = np.where(empty, np.nan, stats[stat])
+            periods[(label, stat)] = stats[stat]
+
+        held = ~empty
+        summary[label] = {
+            'Periods': int(held.sum()),
+            'Top Return': _mean(stats['Top']),
+            'Bottom Return': _mean(stats['Bottom']),
+            'Spread': _mean(stats['Spread']),
+            'Universe Return': _mean(stats['Universe']),
+            'Top Cumulative': np.prod(1 + stats['Top'][held]) - 1 if held.any() else np.nan,
+            'Bottom Cumulative': np.prod(1 + stats['Bottom'][held]) - 1 if held.any() else np.nan,
+            'Spread Win Rate': np.mean(stats['Spread'][held] > 0) if held.any() else np.nan,
+            'Top Hit Rate': _mean(stats['Top Hit Rate']),
+            'Bottom Hit Rate': _mean(stats['Bottom Hit Rate']),
+            'Top Turnover': _mean(stats['Top Turnover']),
+            'Bottom Turnover': _mean(stats['Bottom Turnover']),
+        }
+
+    periods_df = pd.DataFrame(periods, index=pd.DatetimeIndex(close_prices_df.index[held_rows], name='Rebalance'))
+    periods_df.columns = pd.MultiIndex.from_tuples(periods_df.columns, names=['Horizon', 'Stat'])
+    summary_df = pd.DataFrame.from_dict(summary, orient='index')
+    summary_df.index.name = 'Horizon'
+    return summary_df, periods_df
+
+
+def format_backtest_summary(summary):
+    """Formats a backtest summary for display: returns and rates as percentages."""
+    formatted = pd.DataFrame({'Periods': summary['Periods']}, index=summary.index)
+    for col in summary.columns.drop('Periods'):
+        formatted[col] = summary[col].apply(lambda x: f"{x:.2%}" if pd.notna(x) else "N/A")
+    return formatted
@@ -0,0 +1,318 @@
+"""
+Command-line screener: ranks a ticker universe by momentum and writes the
+results to CSV, Parquet or JSON, without a Streamlit runtime.
+
+Examples:
+    python -m screener --period 6mo --sort 1M --top 50 --output ranked.csv
+    python -m screener --offline --format json --output -
+    python -m screener --watch 300 --top 20       # re-rank on the latest bar every 5 minutes
+    python -m screener --period 1y --sort "RSI 14" --indicators
+    python -m screener --universe "Russell 3000" --chunk-size 250 --top 100
+    python -m screener --universe-file watchlist.csv
+    python -m screener --backtest --period 10y --rebalance M --size 0.1
+"""
+import argparse
+from datetime import timedelta
+import os
+import sys
+import time
+
+from .downloads import DOWNLOAD_RETRIES
+from .indicators import INDICATORS
+from .momentum import MOMENTUM_HORIZONS
+from .store import DOWNLOAD_CHUNK_SIZE
+from .universe import UNIVERSES
+
+OUTPUT_FORMATS = ('csv', 'parquet', 'json')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m screener', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--period', default='3mo', help="History to screen, as a yfinance period (default: 3mo).")
+    parser.add_argument('--sort', default='1M', choices=list(MOMENTUM_HORIZONS) + list(INDICATORS),
+                        help="Momentum or indicator column to rank by (default: 1M).")
+    parser.add_argument('--indicators', action='store_true',
+                        help="Add the technical indicator columns (implied when sorting by one).")
+    parser.add_argument('--ascending', action='store_true', help="Rank lowest momentum first.")
+    parser.add_argument('--top', type=int, default=None, help="Only write the first N ranked tickers.")
+    parser.add_argument('--max-staleness', type=float, default=7, metavar='DAYS',
+                        help="Treat a horizon's anchor price as stale if it is more than DAYS older than "
+                             "the anchor date (default: 7).")
+    parser.add_argument('--stale', choices=('exclude', 'mark'), default='exclude',
+                        help="Drop stale changes, or keep them and list the affected horizons in a "
+                             "'Stale' column (default: exclude).")
+    parser.add_argument('--universe', choices=list(UNIVERSES), default='S&P 500',
+                        help="Index whose constituents are screened (default: S&P 500).")
+    parser.add_argument('--universe-file', default=None, metavar='PATH',
+                        help="CSV file (with a Symbol or Ticker column) or list of symbols, one per line, "
+                             "to screen instead of --universe.")
+    parser.add_argument('--tickers', default=None,
+                        help="Comma-separated tickers to screen instead of --universe.")
+    parser.add_argument('--chunk-size', type=int, default=DOWNLOAD_CHUNK_SIZE, metavar='N',
+                        help=f"Load and rank the universe N tickers at a time, which bounds memory use "
+                             f"(default: {DOWNLOAD_CHUNK_SIZE}).")
+    parser.add_argument('--retries', type=int, default=DOWNLOAD_RETRIES, metavar='N',
+                        help=f"Retry tickers whose download fails up to N times, with backoff "
+                             f"(default: {DOWNLOAD_RETRIES}).")
+    parser.add_argument('--offline', action='store_true',
+                        help="Read prices from the local store only; never contact a data source.")
+    parser.add_argument('--store-dir', default=None, help="Price store directory (default: PRICE_STORE_DIR).")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default=None,
+                        help="Output format (default: from the output file extension, else csv).")
+    parser.add_argument('--output', '-o', default='-', help="Output file, or '-' for stdout (default).")
+    parser.add_argument('--backtest', action='store_true',
+                        help="Instead of ranking as of today, backtest top and bottom portfolios for every "
+                             "horizon over the --period history and write the summary per horizon.")
+    parser.add_argument('--rebalance', choices=['W', 'M', 'Q'], default='M',
+                        help="Backtest rebalance frequency: weekly, monthly or quarterly (default: M).")
+    parser.add_argument('--size', type=float, default=0.1,
+                        help="Backtest portfolio size: a number of names, or a fraction of the ranked names "
+                             "(default: 0.1, i.e. top and bottom deciles).")
+    parser.add_argument('--watch', type=float, default=None, metavar='SECONDS',
+                        help="Keep running and, every SECONDS, fetch the latest bars, update momentum "
+                             "incrementally and rewrite the results. Stop with Ctrl-C.")
+    parser.add_argument('--metrics', default=None,
+                        help="Record per-stage timings and write them to this file: Prometheus text format "
+                             "for a .prom path, JSON lines otherwise.")
+    return parser.parse_args(argv)
+
+
+def log(message):
+    print(message, file=sys.stderr)
+
+
+def resolve_tickers(args, store):
+    """
+    Returns the tickers to screen: --tickers, the --universe-file symbols, the
+    stored tickers when offline, else the --universe constituents.
+    """
+    if args.tickers:
+        return [t.strip().upper() for t in args.tickers.split(',') if t.strip()]
+
+    from .universe import FALLBACK_TICKERS, CsvSource, load_universe
+
+    if args.universe_file:
+        constituents = CsvSource(args.universe_file).fetch()
+    elif args.offline:
+        return sorted(store.manifest)
+    else:
+        try:
+            constituents, origin = load_universe(args.universe)
+        except Exception as e:
+            log(f"Error fetching {args.universe} tickers: {e}. Falling back to a small hardcoded list.")
+            return list(FALLBACK_TICKERS)
+        if origin == 'snapshot':
+            log(f"Could not fetch {args.universe} tickers; using the last saved list.")
+
+    from .metadata import MetadataStore
+
+    MetadataStore().seed_constituents(constituents)
+    return constituents['Symbol'].tolist()
+
+
+def rank_results(momentum_df, rank_index, sort_column, ascending=False, top=None):
+    """
+    Orders `momentum_df` by `sort_column` (NaN last) and adds 'Rank' and
+    percentile columns, keeping the first `top` rows if given.
+    """
+    order = rank_index.order(sort_column, ascending=ascending)[:top]
+    ranked = momentum_df.iloc[order].reset_index(drop=True)
+    ranked.insert(0, 'Rank', range(1, len(ranked) + 1))
+    ranked[f"{sort_column} Percentile"] = rank_index.percentiles[order, rank_index.columns.index(sort_column)]
+    return ranked
+
+
+def add_metadata(ranked):
+    """Adds name, sector and sub-industry from the metadata store, if one exists on disk."""
+    from .metadata import METADATA_DB_PATH, MetadataStore
+
+    if not os.path.exists(METADATA_DB_PATH):
+        return ranked
+    store = MetadataStore()
+    for field in ('name', 'sector', 'industry'):
+        ranked[field.capitalize()] = [store.get(t).get(field) for t in ranked['Ticker']]
+    return ranked
+
+
+def write_results(ranked, output, fmt=None):
+    if fmt is None:
+        extension = os.path.splitext(output)[1].lstrip('.').lower()
+        fmt = extension if extension in OUTPUT_FORMATS else 'csv'
+
+    if fmt == 'parquet':
+        if output == '-':
+            raise ValueError("Parquet output needs a file path, not stdout.")
+        ranked.to_parquet(output, index=False)
+    elif fmt == 'json':
+        ranked.to_json(sys.stdout if output == '-' else output, orient='records', date_format='iso', indent=1)
+    else:
+        ranked.to_csv(sys.stdout if output == '-' else output, index=False)
+
+
+def write_metrics(path):
+    """Writes the spans recorded so far to `path` as Prometheus text (.prom) or JSON lines."""
+    from .instrumentation import recorder, to_jsonl, to_prometheus
+
+    records = recorder.snapshot()
+    text = to_prometheus(records) if path.endswith('.prom') else to_jsonl(records)
+    with open(path, 'w') as f:
+        f.write(text)
+    log(f"Wrote {len(records)} spans to {path}.")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.metrics is None:
+        return screen(args)
+
+    from .instrumentation import recorder
+
+    recorder.enabled = True
+    try:
+        return screen(args)
+    finally:
+        write_metrics(args.metrics)
+
+
+def screen(args):
+    """Loads prices, ranks the tickers and writes the results; returns the exit status."""
+    from .instrumentation import span
+    from .ranking import build_momentum_snapshot
+    from .store import PRICE_STORE_DIR, ChunkLoader, PriceStore, period_start
+    from .streaming import stream_snapshot
+
+    store = PriceStore(root=args.store_dir or PRICE_STORE_DIR, retries=args.retries)
+    tickers = resolve_tickers(args, store)
+    if not tickers:
+        log("No tickers to screen.")
+        return 1
+
+    start = period_start(args.period)
+    columns = list(MOMENTUM_HORIZONS)
+    if args.indicators or args.sort in INDICATORS:
+        columns += list(INDICATORS)
+        if args.watch:
+            log("--watch updates momentum horizons only; drop --indicators and sort by a horizon to use it.")
+            return 1
+    # Momentum only needs closes, and the indicators volumes, which keeps both paths lean
+    fields = ['Close', 'Volume'] if len(columns) > len(MOMENTUM_HORIZONS) else ['Close']
+    max_staleness = timedelta(days=args.max_staleness)
+    loader = ChunkLoader(store, start, fields=fields, offline=args.offline)
+
+    if args.backtest or args.watch:
+        # Both work on the whole price panel
+        data_df = loader.load(tickers)
+        loader.flush()
+        report_load(args, loader)
+        if data_df.empty:
+            log("No price data available.")
+            return 1
+        if args.backtest:
+            return backtest(args, data_df)
+        with span('momentum') as s:
+            momentum_df, rank_index, excluded = build_momentum_snapshot(data_df, columns, max_staleness, args.stale)
+            s.set(rows=len(momentum_df))
+    else:
+        # Chunk by chunk, so memory stays bounded however large the universe is
+        with span('momentum', tickers=len(tickers)) as s:
+            momentum_df, rank_index, excluded = stream_snapshot(
+                tickers, loader.load, columns, args.chunk_size, max_staleness, args.stale)
+            s.set(rows=len(momentum_df))
+        loader.flush()
+        report_load(args, loader)
+    if momentum_df.empty:
+        log("No momentum results generated. Check data validity or selected period.")
+        return 1
+    if excluded:
+        log(f"{excluded} tickers were excluded due to incomplete data for all momentum periods.")
+
+    emit(args, momentum_df, rank_index)
+    if args.watch:
+        if args.offline:
+            log("--watch needs live data and is ignored with --offline.")
+        else:
+            watch(args, store, data_df)
+    return 0
+
+
+def report_load(args, loader):
+    """Logs the store errors, the download counts and the tickers that failed to download."""
+    for warning in loader.warnings:
+        log(warning)
+    if args.offline:
+        return
+    log(f"Downloaded {loader.stats['downloaded_rows']} new bars "
+        f"({loader.stats['full_downloads']} tickers fetched in full).")
+    failed = loader.failed
+    if failed:
+        sample = ', '.join(f"{ticker} ({reason})" for ticker, reason in list(failed.items())[:5])
+        log(f"{len(failed)} tickers still failed after {args.retries} retries and were served from the "
+            f"store or left out: {sample}{', ...' if len(failed) > 5 else ''}")
+
+
+def backtest(args, data_df):
+    from .backtest import run_backtest
+    from .instrumentation import span
+    from .momentum import extract_close_prices
+
+    size = int(args.size) if args.size >= 1 else args.size
+    with span('backtest', rebalance=args.rebalance) as s:
+        try:
+            summary, periods = run_backtest(extract_close_prices(data_df), rebalance=args.rebalance, size=size,
+                                            max_staleness=timedelta(days=args.max_staleness))
+        except ValueError as e:
+            log(str(e))
+            return 1
+        s.set(rows=len(periods))
+    write_results(summary.reset_index(), args.output, args.format)
+    log(f"Backtested {len(periods)} rebalances from {periods.index[0]:%Y-%m-%d} to {periods.index[-1]:%Y-%m-%d}.")
+    return 0
+
+
+def emit(args, momentum_df, rank_index):
+    from .instrumentation import span
+
+    with span('output', format=args.format) as s:
+        ranked = add_metadata(rank_results(momentum_df, rank_index, args.sort, args.ascending, args.top))
+        write_results(ranked, args.output, args.format)
+        s.set(rows=len(ranked))
+    log(f"Ranked {len(momentum_df)} tickers by {args.sort}.")
+
+
+def watch(args, store, data_df):
+    """
+    Re-ranks every `args.watch` seconds from the latest bars only, updating the
+    momentum state in place rather than recomputing from the full history. The
+    provisional bars are not written to the price store.
+    """
+    from .incremental import MomentumState
+    from .instrumentation import span
+    from .momentum import extract_close_prices
+
+    state = MomentumState.from_history(extract_close_prices(data_df),
+                                       max_staleness=timedelta(days=args.max_staleness), stale=args.stale)
+    tickers = list(state.tickers)
+    while True:
+        try:
+            time.sleep(args.watch)
+        except KeyboardInterrupt:
+            return
+        try:
+            # Everything from the latest bar on: its intraday update plus any bars added since
+            with span('watch.download', tickers=len(tickers)) as s:
+                latest = store.downloader(tickers, start=(state.last_date - timedelta(days=1)).strftime('%Y-%m-%d'),
+                                          interval=store.interval)
+                s.set(rows=len(latest) if latest is not None else 0)
+        except Exception as e:
+            log(f"Could not fetch the latest bars ({e}); retrying in {args.watch:g}s.")
+            continue
+        closes = extract_close_prices(latest) if latest is not None and not latest.empty else None
+        if closes is not None:
+            closes = closes.dropna(axis=1, how='all')  # Failed tickers keep their current bar
+        if closes is None or closes.empty:
+            log(f"No new bars; retrying in {args.watch:g}s.")
+            continue
+        with span('watch.update', bars=len(closes)):
+            state.apply_frame(closes)
+            momentum_df, rank_index, _ = state.snapshot()
+        emit(args, momentum_df, rank_index)
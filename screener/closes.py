@@ -0,0 +1,312 @@
+"""
+Compact date x ticker close-price matrices, memory-mapped from disk.
+
+The screen only needs close prices (and volume, for the volume indicators), so
+instead of holding the full OHLCV frame in float64 the app keeps one float32 (or,
+on request, float64) array of closes, with the volumes alongside in the same
+dtype. float32 holds whole numbers exactly only up to 2**24 (about 16.8 million),
+so larger daily volumes are rounded to a relative error of at most 6e-8 (a few
+shares on a volume of a hundred million), far below what the volume indicators
+and turnover figures show; float64 keeps them exact.
+Matrices are written once to a content-addressed file and opened read-only with
+`mmap_mode='r'`; every session and every worker process mapping the same file
+shares the same physical pages through the OS page cache instead of holding its
+own copy. Point CLOSE_MATRIX_DIR at a tmpfs such as /dev/shm to keep the
+matrices in shared memory without touching the disk.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .momentum import extract_close_prices
+from .store import DOWNLOAD_CHUNK_SIZE, PRICE_STORE_DIR
+from .streaming import iter_chunks
+
+CLOSE_MATRIX_DIR = os.environ.get('CLOSE_MATRIX_DIR', os.path.join(PRICE_STORE_DIR, 'closes'))
+
+# Precision modes offered to users, by label
+CLOSE_DTYPES = {
+    'float32': np.float32,  # ~7 significant digits (volumes above 2**24 rounded), half the memory (default)
+    'float64': np.float64,  # full precision, as downloaded
+}
+
+# Price fields of a yfinance download; used to estimate what the full frame would take
+OHLCV_FIELDS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+
+def ohlcv_frame_bytes(n_dates, n_tickers):
+    """Size of a float64 OHLCV frame of `n_dates` x `n_tickers`, the layout a close matrix replaces."""
+    return n_dates * n_tickers * len(OHLCV_FIELDS) * 8
+
+
+class CloseMatrix:
+    """
+    A date x ticker array of close prices with its date index and ticker labels.
+    Extra fields such as 'Volume' are stacked to the right of the closes, one
+    block of ticker columns per field, in the same array and so the same dtype
+    (see the module docstring on float32 volumes).
+    """
+
+    def __init__(self, values, dates, tickers, fields=('Close',)):
+        self.values = values
+        self.dates = pd.DatetimeIndex(dates, name='Date')
+        self.tickers = list(tickers)
+        self.fields = list(fields)
+
+    @classmethod
+    def from_prices(cls, data_df, dtype=np.float32, fields=('Close',)):
+        """
+        Builds a matrix from a yfinance-shaped download, keeping only the closes
+        and the other `fields` present in it.
+
+        Returns:
+            CloseMatrix or None: None if `data_df` has no recognizable 'Close' prices.
+        """
+        close_prices_df = extract_close_prices(data_df)
+        if close_prices_df is None:
+            return None
+        if not close_prices_df.index.is_monotonic_increasing:
+            close_prices_df = close_prices_df.sort_index()
+        blocks, kept = [close_prices_df], ['Close']
+        if isinstance(data_df.columns, pd.MultiIndex):
+            present = data_df.columns.get_level_values(0)
+            for field in fields:
+                if field != 'Close' and field in present:
+                    blocks.append(data_df[field].reindex(index=close_prices_df.index, columns=close_prices_df.columns))
+                    kept.append(field)
+        values = np.ascontiguousarray(np.hstack([block.to_numpy(dtype=dtype, na_value=np.nan) for block in blocks]))
+        return cls(values, close_prices_df.index, close_prices_df.columns, kept)
+
+    @classmethod
+    def concat(cls, matrices, allocate=None):
+        """
+        Joins matrices of disjoint tickers side by side on the union of their
+        dates (NaN where a ticker has no bar), in one preallocated array.
+        `allocate(shape, dtype)` returns that array (default: np.empty), e.g. a
+        writable memory-mapped file; a single matrix is returned as it is
+        unless `allocate` is given.
+        """
+        matrices = [matrix for matrix in matrices if matrix is not None]
+        if not matrices:
+            return None
+        if len(matrices) == 1 and allocate is None:
+            return matrices[0]
+        dates = matrices[0].dates
+        for matrix in matrices[1:]:
+            dates = dates.union(matrix.dates)
+        fields = list(dict.fromkeys(field for matrix in matrices for field in matrix.fields))
+        tickers = [ticker for matrix in matrices for ticker in matrix.tickers]
+        dtype = np.result_type(*[matrix.values.dtype for matrix in matrices])
+        values = (allocate or np.empty)((len(dates), len(fields) * len(tickers)), dtype)
+        values[...] = np.nan
+        offset = 0
+        for matrix in matrices:
+            rows = dates.get_indexer(matrix.dates)
+            n = len(matrix.tickers)
+            for i, field in enumerate(matrix.fields):
+                start = fields.index(field) * len(tickers) + offset
+                values[rows, start:start + n] = matrix.values[:, i * n:(i + 1) * n]
+            offset += n
+        return cls(values, dates, tickers, fields)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def to_frame(self):
+        """
+        Wraps the matrix, without copying it, in a DataFrame with (Price, Ticker)
+        columns so the rest of the pipeline can treat it like a download.
+        """
+        columns = pd.MultiIndex.from_product([self.fields, self.tickers], names=['Price', 'Ticker'])
+        return pd.DataFrame(self.values, index=self.dates, columns=columns, copy=False)
+
+
+class SharedCloseStore:
+    """
+    Directory of read-only, memory-mapped close matrices.
+
+    Files are named after a digest of their content, so sessions and processes
+    that load the same window end up mapping the same file. Only the newest
+    `keep` matrices are kept; processes still mapping a removed file keep their
+    mapping until they drop it.
+    """
+
+    def __init__(self, root=CLOSE_MATRIX_DIR, keep=8):
+        self.root = root
+        self.keep = keep
+
+    # Bytes of a matrix hashed at a time, so a memory-mapped one is never read into memory whole
+    DIGEST_BLOCK_SIZE = 1 << 24
+
+    @classmethod
+    def _digest(cls, matrix):
+        digest = hashlib.sha1()
+        digest.update(str(matrix.values.dtype).encode())
+        digest.update('\0'.join(matrix.fields).encode())
+        digest.update('\0'.join(matrix.tickers).encode())
+        digest.update(matrix.dates.asi8.tobytes())
+        rows = max(cls.DIGEST_BLOCK_SIZE // max(matrix.values[:1].nbytes, 1), 1)
+        for i in range(0, len(matrix.values), rows):
+            digest.update(np.ascontiguousarray(matrix.values[i:i + rows]).tobytes())
+        return digest.hexdigest()[:20]
+
+    def _paths(self, key):
+        base = os.path.join(self.root, key)
+        return base + '.npy', base + '.json'
+
+    def _publish(self, key, matrix, tmp_values_path):
+        """Moves the values written to `tmp_values_path` into place as matrix `key`, after its index."""
+        values_path, index_path = self._paths(key)
+        # The index goes first: a values file only appears once both are complete
+        index = {'tickers': matrix.tickers, 'fields': matrix.fields, 'dates': [d.isoformat() for d in matrix.dates]}
+        tmp_path = f"{index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
+        os.replace(tmp_values_path, values_path)
+        self._prune()
+
+    def _open_or(self, key, matrix):
+        try:
+            return self.open(key)
+        except FileNotFoundError:  # Pruned by another process in the meantime
+            return matrix
+
+    def share(self, matrix):
+        """
+        Writes `matrix` to the store unless an identical one is already there, and
+        returns the memory-mapped copy. The in-memory `matrix` can be dropped.
+        """
+        key = self._digest(matrix)
+        values_path, _ = self._paths(key)
+        if not os.path.exists(values_path):
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = f"{values_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, matrix.values)
+            self._publish(key, matrix, tmp_path)
+        return self._open_or(key, matrix)
+
+    def share_concat(self, matrices):
+        """
+        Joins `matrices` as CloseMatrix.concat does, but straight into a file of
+        the store, so the joined matrix is never held in memory, and returns its
+        memory-mapped copy (None if there is nothing to join).
+        """
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f"joining.{os.getpid()}.{threading.get_ident()}.tmp")
+        matrix = CloseMatrix.concat(
+            matrices, allocate=lambda shape, dtype: np.lib.format.open_memmap(tmp_path, 'w+', dtype, shape))
+        if matrix is None:
+            return None
+        matrix.values.flush()
+        key = self._digest(matrix)
+        if os.path.exists(self._paths(key)[0]):
+            os.remove(tmp_path)
+        else:
+            self._publish(key, matrix, tmp_path)
+        return self._open_or(key, matrix)
+
+    def staging(self):
+        """Returns a temporary directory in the store, removed on cleanup, to `spill` matrices to."""
+        os.makedirs(self.root, exist_ok=True)
+        return tempfile.TemporaryDirectory(prefix='staging.', dir=self.root)
+
+    @staticmethod
+    def spill(matrix, directory):
+        """Writes `matrix` to a file in `directory` and returns its memory-mapped copy."""
+        path = os.path.join(directory, f"{len(os.listdir(directory))}.npy")
+        np.save(path, matrix.values)
+        return CloseMatrix(np.load(path, mmap_mode='r'), matrix.dates, matrix.tickers, matrix.fields)
+
+    def open(self, key):
+        values_path, index_path = self._paths(key)
+        with open(index_path) as f:
+            index = json.load(f)
+        values = np.load(values_path, mmap_mode='r')
+        return CloseMatrix(values, pd.to_datetime(index['dates']), index['tickers'], index.get('fields', ['Close']))
+
+    def _prune(self):
+        matrices = [os.path.join(self.root, name) for name in os.listdir(self.root) if name.endswith('.npy')]
+        matrices.sort(key=os.path.getmtime, reverse=True)
+        for values_path in matrices[self.keep:]:
+            for path in (values_path, values_path[:-len('.npy')] + '.json'):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def load_close_matrix(tickers, loader, dtype=np.float32, close_store=None, chunk_size=DOWNLOAD_CHUNK_SIZE,
+                      progress=None):
+    """
+    Loads the closes and volumes of `tickers` with `loader`, a chunk at a time,
+    reducing every chunk to a compact CloseMatrix before the next one is loaded,
+    and saves the downloaded bars with `loader.flush()`.
+
+    With a `close_store`, each chunk's matrix is spilled to a staging file and
+    the chunks are joined straight into the store's memory-mapped file, so
+    neither the chunks nor the joined matrix stay in memory. If the store
+    fails, the matrices stay in memory and the error is added to
+    `loader.warnings`.
+
+    Args:
+        tickers (list): Tickers to load.
+        loader (ChunkLoader): Source of each chunk's prices.
+        dtype (type): Value type of the matrix, one of CLOSE_DTYPES.
+        close_store (SharedCloseStore, optional): Store to memory-map the result from.
+        chunk_size (int): Tickers per chunk.
+        progress (callable, optional): Called with (tickers done, total) after
+                                       every chunk.
+
+    Returns:
+        CloseMatrix or None: None if no chunk had any close prices.
+    """
+    def store_failed(e):
+        loader.warnings.append(f"Could not share the close matrix between sessions ({e}). "
+                               f"Keeping it in memory instead.")
+
+    staging = None
+    spilled = False
+    if close_store is not None:
+        try:
+            staging = close_store.staging()
+        except OSError as e:
+            store_failed(e)
+            close_store = None
+    try:
+        matrices = []
+        done = 0
+        for chunk in iter_chunks(tickers, chunk_size):
+            data_df = loader.load(chunk)
+            if data_df is not None and not data_df.empty:
+                matrix = CloseMatrix.from_prices(data_df, dtype, fields=('Close', 'Volume'))
+                if matrix is not None and close_store is not None:
+                    try:
+                        matrix = close_store.spill(matrix, staging.name)
+                        spilled = True
+                    except OSError as e:
+                        store_failed(e)
+                        close_store = None
+                matrices.append(matrix)
+            del data_df  # Only the compact matrix of a chunk is kept
+            done += len(chunk)
+            if progress is not None:
+                progress(done, len(tickers))
+        loader.flush()
+        if close_store is not None:
+            try:
+                return close_store.share_concat(matrices)
+            except OSError as e:
+                store_failed(e)
+        # Spilled chunks are copied into memory, as their files are removed below
+        return CloseMatrix.concat(matrices, allocate=np.empty if spilled else None)
+    finally:
+        if staging is not None:
+            staging.cleanup()
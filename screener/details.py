@@ -0,0 +1,64 @@
+"""
+Concurrent loading of the company details and headlines shown for the ranked
+tickers, delivered ticker by ticker as they complete so a client can render
+each one without waiting for the slowest.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import sqlite3
+
+# Metadata and news requests in flight at once
+DETAIL_WORKERS = 8
+# Tickers whose details are fetched and shown per page
+DETAILS_PAGE_SIZE = 10
+
+
+def page_count(n_items, size=DETAILS_PAGE_SIZE):
+    """Returns the number of pages of `size` needed for `n_items` (at least 1)."""
+    return max((n_items + size - 1) // size, 1)
+
+
+def page_of(items, page, size=DETAILS_PAGE_SIZE):
+    """Returns the items on 1-based `page`."""
+    return items[(page - 1) * size:page * size]
+
+
+def iter_details(tickers, metadata_store, news_fetcher, max_workers=DETAIL_WORKERS):
+    """
+    Fetches the metadata and the news of every ticker in `tickers` at once, on
+    one thread pool, and yields each ticker as soon as both of its results are
+    in (in completion order, not the order of `tickers`).
+
+    Args:
+        tickers (list): Tickers to fetch.
+        metadata_store (MetadataStore): Store whose missing descriptions are fetched.
+        news_fetcher (NewsFetcher): Fetcher of the headlines.
+        max_workers (int): Fetches in flight at once.
+
+    Yields:
+        tuple: (ticker, record, headlines, error) where `record` is the
+               ticker's metadata dict (see MetadataStore.get) and `headlines`
+               and `error` are as returned by NewsFetcher.fetch.
+    """
+    waiting = {ticker: 2 for ticker in tickers}  # ticker -> results still missing
+    news = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for ticker in waiting:
+            futures[executor.submit(metadata_store.ensure, [ticker])] = (ticker, 'metadata')
+            futures[executor.submit(news_fetcher.fetch, ticker)] = (ticker, 'news')
+        for future in as_completed(futures):
+            ticker, kind = futures[future]
+            if kind == 'news':
+                try:
+                    news[ticker] = future.result()
+                except Exception as err:  # e.g. a page the parser chokes on: shown on this ticker's card only
+                    news[ticker] = (None, err)
+            else:
+                try:
+                    future.result()
+                except (OSError, sqlite3.Error):
+                    pass  # Whatever is stored for the ticker is shown; the next refresh tries again
+            waiting[ticker] -= 1
+            if not waiting[ticker]:
+                headlines, error = news.pop(ticker)
+                yield ticker, metadata_store.get(ticker), headlines, error
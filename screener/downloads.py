@@ -0,0 +1,149 @@
+"""
+Fault-tolerant batch downloads from a price data source.
+
+A request for many tickers is split into batches that run with bounded
+concurrency. A batch can fail as a whole (the data source raises) or in part
+(some tickers come back empty or all-NaN, as yfinance does on transient
+errors); either way only the tickers that failed are retried, in new batches,
+with exponential backoff. Tickers that succeed are never requested again.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import numpy as np
+import pandas as pd
+
+from .instrumentation import span
+
+# Most tickers requested from the data source in one call
+DOWNLOAD_BATCH_SIZE = 50
+# Batches in flight at once
+DOWNLOAD_WORKERS = 4
+# Retries of a failed ticker after its first attempt
+DOWNLOAD_RETRIES = 2
+# Seconds to wait before the first retry, doubled before every further one
+RETRY_BACKOFF = 1.0
+# Failure reason of a ticker the data source returned no bars for
+NO_DATA = 'no data'
+
+
+def split_download(raw_df, tickers):
+    """
+    Splits a yfinance-shaped download (columns: field x ticker) into one OHLCV
+    DataFrame per ticker, dropping dates on which a ticker has no data at all.
+    """
+    frames = {}
+    if raw_df is None or raw_df.empty:
+        return frames
+
+    if not isinstance(raw_df.columns, pd.MultiIndex):
+        # A single ticker may come back with flat field columns
+        raw_df = pd.concat({tickers[0]: raw_df}, axis=1).swaplevel(axis=1)
+    if getattr(raw_df.index, 'tz', None) is not None:
+        raw_df = raw_df.tz_localize(None)
+
+    # Slicing one float array per ticker is several times faster than DataFrame.xs
+    raw_df = raw_df.sort_index()
+    values = raw_df.to_numpy(dtype=np.float64)
+    fields = raw_df.columns.get_level_values(0).tolist()
+    positions = {}  # ticker -> its column positions
+    for position, ticker in enumerate(raw_df.columns.get_level_values(1)):
+        positions.setdefault(ticker, []).append(position)
+    dates = raw_df.index.rename('Date')
+    columns = {}  # field names -> the column Index shared by the frames with them
+    for ticker in tickers:
+        if ticker not in positions:
+            continue
+        block = values[:, positions[ticker]]
+        rows = ~np.isnan(block).all(axis=1)
+        if not rows.any():
+            continue
+        names = tuple(fields[position] for position in positions[ticker])
+        if names not in columns:
+            columns[names] = pd.Index(names, name=raw_df.columns.names[0])
+        complete = rows.all()
+        frames[ticker] = pd.DataFrame(block if complete else block[rows], index=dates if complete else dates[rows],
+                                      columns=columns[names], copy=False)
+    return frames
+
+
+class DownloadScheduler:
+    """
+    Runs downloads through `downloader`, a callable taking (tickers, start,
+    end=None, interval='1d') and returning a yfinance-shaped DataFrame, in
+    batches of `batch_size` tickers with at most `workers` batches in flight.
+
+    Failed tickers are retried up to `retries` times, waiting `backoff` seconds
+    before the first retry and twice as long before each further one, in
+    batches half as large every time, so that a ticker that makes its whole
+    batch fail takes fewer others down with it. `sleep` does the waiting, so
+    tests can replace it.
+    """
+
+    def __init__(self, downloader, batch_size=DOWNLOAD_BATCH_SIZE, workers=DOWNLOAD_WORKERS,
+                 retries=DOWNLOAD_RETRIES, backoff=RETRY_BACKOFF, sleep=time.sleep):
+        self.downloader = downloader
+        self.batch_size = batch_size
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.sleep = sleep
+        self.stats = {}
+
+    def _download_batch(self, batch, start, end, interval, attempt):
+        """Returns (frames, failed, rows) for one batch; `failed` maps tickers to a reason."""
+        try:
+            with span('prices.download', tickers=len(batch), interval=interval, attempt=attempt) as s:
+                raw_df = self.downloader(batch, start=start, end=end, interval=interval)
+                frames = split_download(raw_df, batch)
+                rows = sum(len(frame) for frame in frames.values())
+                # In-memory size of the float64 payload; the data source does not expose wire bytes
+                s.set(rows=rows, bytes=raw_df.size * 8 if raw_df is not None else 0, failed=len(batch) - len(frames))
+        except Exception as e:  # Any error of the data source fails the batch, not the download
+            return {}, {ticker: f"{type(e).__name__}: {e}" for ticker in batch}, 0
+        return frames, {ticker: NO_DATA for ticker in batch if ticker not in frames}, rows
+
+    def run(self, tickers, start, end=None, interval='1d', retry_empty=True):
+        """
+        Downloads bars of `tickers` from `start` (inclusive) to `end` (exclusive,
+        None for today).
+
+        Args:
+            tickers (list): Tickers to download.
+            start (pd.Timestamp): First date.
+            end (pd.Timestamp, optional): Date after the last one.
+            interval (str): Bar interval.
+            retry_empty (bool): Whether tickers that come back without bars are
+                                retried. Leave it on unless an empty result is
+                                expected, e.g. for dates before a listing.
+
+        Returns:
+            tuple: (frames, failed) where `frames` maps tickers to their OHLCV
+                   DataFrame and `failed` maps the tickers still missing after
+                   the last attempt to the reason (NO_DATA or the error).
+        """
+        self.stats = {'requests': 0, 'retried': 0, 'downloaded_rows': 0}
+        start = start.strftime('%Y-%m-%d')
+        end = end.strftime('%Y-%m-%d') if end is not None else None
+        frames, failed = {}, {}
+        pending = list(tickers)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self.sleep(self.backoff * 2 ** (attempt - 1))
+                    self.stats['retried'] += len(pending)
+                size = max(self.batch_size >> attempt, 1)
+                batches = [pending[i:i + size] for i in range(0, len(pending), size)]
+                results = pool.map(lambda batch: self._download_batch(batch, start, end, interval, attempt), batches)
+                for ticker in pending:
+                    failed.pop(ticker, None)
+                for batch_frames, batch_failed, rows in results:
+                    frames.update(batch_frames)
+                    failed.update(batch_failed)
+                    self.stats['requests'] += 1
+                    self.stats['downloaded_rows'] += rows
+                pending = [ticker for batch in batches for ticker in batch
+                           if ticker in failed and (retry_empty or failed[ticker] != NO_DATA)]
+                if not pending:
+                    break
+        return frames, failed
@@ -0,0 +1,165 @@
+"""
+Targeted extraction of the few HTML elements the screener reads.
+
+Instead of building a tree of a whole page (BeautifulSoup, pd.read_html), the
+page is searched as text for the start of the target table, and only from
+there on is it fed, a chunk at a time, to lxml's incremental (pull) parser.
+Parsing stops as soon as enough rows have been read or the table is closed,
+so the rest of the page is never parsed at all.
+"""
+from collections import namedtuple
+from datetime import datetime
+import re
+
+from lxml import etree
+import pandas as pd
+
+# Characters of HTML fed to the parser at a time; small enough to stop soon after the last row needed
+FEED_CHUNK_SIZE = 8192
+# Date and time formats of the Finviz news table, e.g. 'Dec-31-25 03:59PM'
+FINVIZ_DATE_FORMAT = '%b-%d-%y'
+FINVIZ_TIME_FORMAT = '%I:%M%p'
+
+_TABLE_START = re.compile(r'<table\b', re.IGNORECASE)
+# All text of an element, concatenated in C rather than by joining itertext()
+_STRING = etree.XPath('string()')
+
+
+class Headline(namedtuple('Headline', ['title', 'published', 'source', 'url', 'when'])):
+    """
+    A news headline: its title, publication time (a naive datetime in the New
+    York time Finviz prints, or None if `when` could not be parsed), publisher,
+    link, and the date/time text as printed on the page.
+    """
+
+    __slots__ = ()
+
+
+def find_element(html, element_id):
+    """Returns the offset of the start tag of the element with id `element_id` in `html`, or -1."""
+    match = re.search(rf'''\sid\s*=\s*(["']?){re.escape(element_id)}\1[\s/>]''', html)
+    return html.rfind('<', 0, match.start()) if match else -1
+
+
+def cell_text(element):
+    """Returns the text of `element` and its descendants with surrounding whitespace removed."""
+    return _STRING(element).strip()
+
+
+def iter_table_rows(html, start):
+    """
+    Yields the <tr> elements of the table whose start tag is at offset `start`
+    of `html` (not those of tables nested in it), each as soon as it has been
+    parsed, and stops at the end of the table. A row is cleared once the next
+    one is requested, so read what is needed from it before that.
+    """
+    parser = etree.HTMLPullParser(events=('start', 'end'), tag=('table', 'tr'))
+    depth = 0  # Nesting level of tables; rows at level 1 belong to the target table
+    for offset in range(start, len(html) + FEED_CHUNK_SIZE, FEED_CHUNK_SIZE):
+        if offset < len(html):
+            parser.feed(html[offset:offset + FEED_CHUNK_SIZE])
+        else:
+            parser.close()  # Flushes the rows of a table the page never closes
+        for event, element in parser.read_events():
+            if element.tag == 'table':
+                depth += 1 if event == 'start' else -1
+                if not depth:
+                    return
+            elif event == 'end' and depth == 1:
+                yield element
+                element.clear()
+
+
+def parse_finviz_time(when, day=None, today=None):
+    """
+    Parses the date/time text of a Finviz news row: 'Dec-31-25 03:59PM',
+    'Today 03:59PM', or a bare '03:59PM', which Finviz prints for every
+    headline after the first of a day and which belongs to `day`.
+
+    Returns:
+        tuple: (published, day) with `published` a naive datetime (None if the
+               text could not be parsed) and `day` the date to pass on to the
+               next row.
+    """
+    parts = when.split()
+    try:
+        if len(parts) == 2:
+            if parts[0].lower() == 'today':
+                day = (today or datetime.now()).date()
+            else:
+                day = datetime.strptime(parts[0], FINVIZ_DATE_FORMAT).date()
+        if day is None or not parts:
+            return None, day
+        return datetime.combine(day, datetime.strptime(parts[-1], FINVIZ_TIME_FORMAT).time()), day
+    except ValueError:
+        return None, day
+
+
+def extract_finviz_headlines(html, n_headlines, today=None):
+    """
+    Extracts the first `n_headlines` headlines of the 'news-table' of a Finviz
+    quote page, parsing nothing before the table and nothing after the last
+    row needed. `today` is the date 'Today' rows refer to (default: now).
+
+    Returns:
+        list or None: Headline records, or None if the page has no 'news-table'.
+    """
+    start = find_element(html, 'news-table')
+    if start == -1:
+        return None
+
+    headlines = []
+    day = None
+    for row in iter_table_rows(html, start):
+        if len(headlines) >= n_headlines:
+            break
+        cell = row.find('td')
+        link = row.find('.//a')
+        if cell is None or link is None:
+            continue
+        when = cell_text(cell)
+        published, day = parse_finviz_time(when, day, today)
+        source = row.find('.//span')
+        headlines.append(Headline(
+            title=cell_text(link),
+            published=published,
+            source=cell_text(source).strip('()') if source is not None else '',
+            url=link.get('href', ''),
+            when=when,
+        ))
+    return headlines
+
+
+def extract_table(html, accept, columns=None):
+    """
+    Reads the first table of `html` whose header (the cell texts of its first
+    row) satisfies `accept(header)`. Every other table is abandoned after its
+    first row, and nothing after the end of the accepted table is parsed.
+
+    Args:
+        html (str): Page to search.
+        accept (callable): Takes the header, a list of str, and returns
+                           whether the table is the one wanted.
+        columns (collection, optional): Header names of the columns to read;
+                                        the text of other cells is never
+                                        extracted. Defaults to all.
+
+    Returns:
+        pd.DataFrame or None: The cell texts of the columns read, or None if
+                              no table was accepted.
+    """
+    for match in _TABLE_START.finditer(html):
+        header, keep, rows = None, None, []
+        for row in iter_table_rows(html, match.start()):
+            cells = [cell for cell in row if cell.tag in ('td', 'th')]
+            if header is None:
+                header = [cell_text(cell) for cell in cells]
+                if not accept(header):
+                    break
+                keep = [i for i, name in enumerate(header) if columns is None or name in columns]
+            elif cells:
+                rows.append([cell_text(cells[i]) if i < len(cells) else '' for i in keep])
+        else:
+            if header is not None:
+                return pd.DataFrame(rows, columns=[header[i] for i in keep])
+    return None
@@ -0,0 +1,150 @@
+"""
+Incremental momentum: a ring buffer of recent bars that absorbs new closes
+without re-reading history.
+"""
+import numpy as np
+import pandas as pd
+
+from .momentum import (MAX_STALENESS, NO_DATE, anchor_span_days, anchored_changes, as_horizons, close_values,
+                       latest_valid_rows, momentum_frame, resolve_anchors)
+from .ranking import snapshot_from_momentum
+
+
+class MomentumState:
+    """
+    Rolling momentum state for a fixed set of tickers.
+
+    The state keeps the last rows of the shared trading-day index in a ring
+    buffer, each holding every ticker's latest close as of that row and the date
+    of that close. The ring reaches back far enough for the longest horizon,
+    plus one row so that the current bar can be amended (or a close withdrawn)
+    intraday. Applying a bar touches O(tickers) values, and the results match
+    `compute_calendar_momentum` over the full history exactly. Bars are expected
+    to be daily or coarser.
+    """
+
+    def __init__(self, tickers, horizons=None, max_staleness=MAX_STALENESS, stale='exclude'):
+        self.horizons = as_horizons(horizons)
+        self.max_staleness = max_staleness
+        self.stale = stale
+        self.tickers = pd.Index(tickers)
+        reach = max((anchor_span_days(anchor) for horizon in self.horizons.values()
+                     for anchor in (horizon.start, horizon.end)), default=0)
+        # One row per day at most, the anchor row itself, and a spare row to undo the current bar
+        self.capacity = reach + 2
+
+        n = len(self.tickers)
+        self.dates = np.full(self.capacity, NO_DATE)  # ns
+        self.prices = np.full((self.capacity, n), np.nan)  # latest close as of each row
+        self.stamps = np.full((self.capacity, n), NO_DATE)  # date of that close (ns)
+        self.head = -1  # slot of the latest row
+        self.size = 0  # rows held
+        self.last_date = None  # date of the latest bar applied
+
+    @classmethod
+    def from_history(cls, close_prices_df, horizons=None, max_staleness=MAX_STALENESS, stale='exclude'):
+        """Builds the state from a date x ticker DataFrame of closes in one vectorized pass."""
+        state = cls(close_prices_df.columns, horizons, max_staleness, stale)
+        if close_prices_df.empty:
+            return state
+        close_prices_df, values = close_values(close_prices_df)
+
+        # Latest valid row per ticker and date, for the rows kept
+        last_valid = latest_valid_rows(values)[-state.capacity:]
+        found = last_valid >= 0
+        idx = np.maximum(last_valid, 0)
+        dates_ns = pd.DatetimeIndex(close_prices_df.index).as_unit('ns').asi8
+
+        state.size = len(last_valid)
+        state.head = state.size - 1
+        state.dates[:state.size] = dates_ns[-state.size:]
+        state.prices[:state.size] = np.where(found, values[idx, np.arange(values.shape[1])], np.nan)
+        state.stamps[:state.size] = np.where(found, dates_ns[idx], NO_DATE)
+        state.last_date = close_prices_df.index[-1]
+        return state
+
+    def apply_bar(self, date, closes):
+        """
+        Applies one bar of closes (a Series or dict keyed by ticker; tickers outside
+        the state are ignored, and NaN means no close for that bar).
+
+        A bar dated after the latest one is appended. A bar with the same date
+        replaces the current bar: tickers with a new close overwrite theirs, and
+        tickers with NaN drop the close they had for that date. Tickers absent
+        from `closes` keep their current bar.
+
+        Raises:
+            ValueError: If `date` is earlier than the latest bar applied.
+        """
+        date = pd.Timestamp(date)
+        if self.last_date is not None and date < self.last_date:
+            raise ValueError(f"Bar dated {date:%Y-%m-%d %H:%M} is older than the latest bar ({self.last_date:%Y-%m-%d %H:%M}).")
+        closes = pd.Series(closes, dtype=np.float64)
+        positions = self.tickers.get_indexer(closes.index)
+        known = positions >= 0
+        present = np.zeros(len(self.tickers), dtype=bool)
+        present[positions[known]] = True
+        values = np.full(len(self.tickers), np.nan)
+        values[positions[known]] = closes.to_numpy()[known]
+        valid = ~np.isnan(values)
+        stamp = date.as_unit('ns').value
+
+        if self.last_date is not None and date == self.last_date:
+            # Amend the current row; withdrawn closes fall back to the row before it
+            withdraw = present & ~valid
+            if self.size > 1:
+                previous = (self.head - 1) % self.capacity
+                self.prices[self.head, withdraw] = self.prices[previous, withdraw]
+                self.stamps[self.head, withdraw] = self.stamps[previous, withdraw]
+            else:
+                self.prices[self.head, withdraw] = np.nan
+                self.stamps[self.head, withdraw] = NO_DATE
+        else:
+            # A new row starts as a copy of the latest one
+            latest = self.head
+            self.head = (self.head + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+            if latest >= 0:
+                self.prices[self.head] = self.prices[latest]
+                self.stamps[self.head] = self.stamps[latest]
+            self.dates[self.head] = stamp
+        self.prices[self.head, valid] = values[valid]
+        self.stamps[self.head, valid] = stamp
+        self.last_date = date
+
+    def apply_frame(self, close_prices_df):
+        """Applies, in date order, every bar of `close_prices_df` not older than the latest bar."""
+        close_prices_df = close_prices_df.sort_index()
+        if self.last_date is not None:
+            close_prices_df = close_prices_df[close_prices_df.index >= self.last_date]
+        for date, row in close_prices_df.iterrows():
+            self.apply_bar(date, row)
+
+    def momentum(self):
+        """
+        Returns the same table as `compute_calendar_momentum` over the full history:
+        one row per ticker with at least one valid close, 'Ticker' plus one change
+        per horizon (and 'Stale' with stale='mark').
+        """
+        labels = list(self.horizons)
+        keep = self.stamps[self.head] != NO_DATE if self.size else np.zeros(len(self.tickers), dtype=bool)
+        if not keep.any():
+            return momentum_frame([], labels, np.empty((0, len(labels))), np.empty((0, len(labels)), dtype=bool),
+                                  self.stale)
+        # Ring slots in date order
+        slots = (self.head - self.size + 1 + np.arange(self.size)) % self.capacity
+        dates = pd.DatetimeIndex(self.dates[slots])
+        anchors = resolve_anchors(dates, self.horizons)
+
+        def price_at(row):
+            return self.prices[slots[row], keep], self.stamps[slots[row], keep]
+
+        changes, stale = anchored_changes(dates, anchors, price_at, int(keep.sum()), self.max_staleness)
+        return momentum_frame(self.tickers[keep], labels, changes, stale, self.stale)
+
+    def snapshot(self, columns=None):
+        """Returns (momentum_df, rank_index, excluded) like `build_momentum_snapshot`."""
+        momentum_df = self.momentum()
+        if columns is not None:
+            momentum_df = momentum_df[['Ticker'] + list(columns)].copy()
+        return snapshot_from_momentum(momentum_df, columns if columns is not None else list(self.horizons))
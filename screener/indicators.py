@@ -0,0 +1,276 @@
+"""
+Technical indicators over a date x ticker panel of closes (and volumes), as of
+the latest date.
+
+Every indicator reads from intermediates built once for the whole panel, such
+as the forward-filled closes, daily log returns and their cumulative sums.
+The sum over any trailing window is then a difference of two cumulative-sum
+rows, so adding an indicator or a window does not add another pass over the
+history. Windows count rows of the shared trading-day index, as `Horizon` int
+anchors do.
+"""
+import numpy as np
+import pandas as pd
+
+from .momentum import MAX_STALENESS, close_values, extract_close_prices, latest_valid_rows
+
+# Trading days per year, to annualize volatility
+TRADING_DAYS_PER_YEAR = 252
+
+
+class Indicator:
+    """
+    A technical indicator: a `kind` (a key of INDICATOR_KINDS), its window
+    lengths in trading days and the format of its values for display.
+    """
+
+    def __init__(self, kind, *windows, fmt='{:.2%}'):
+        self.kind = kind
+        self.windows = windows
+        self.fmt = fmt
+
+    def __repr__(self):
+        return f"Indicator({self.kind!r}, {', '.join(map(str, self.windows))})"
+
+
+# Indicators keyed by the column label shown in the app.
+INDICATORS = {
+    'Vol 3M': Indicator('volatility', 63),                      # annualized volatility of daily returns
+    'Risk-Adj 6M': Indicator('risk_adjusted', 126, fmt='{:.2f}'),  # 6-month log return / its volatility
+    'SMA 50/200': Indicator('sma_cross', 50, 200),              # > 0 when the 50-day average is above the 200-day
+    'EMA 12/26': Indicator('ema_cross', 12, 26),
+    'RSI 14': Indicator('rsi', 14, fmt='{:.1f}'),
+    '52W High': Indicator('high_distance', 252),                # distance below the 52-week high
+    'Rel Volume': Indicator('relative_volume', 20, 63),         # 20-day average volume vs. the 3-month average
+    'Dollar Volume': Indicator('dollar_volume', 20, fmt='${:,.0f}'),  # 20-day average close x volume
+}
+
+
+def column_formats(columns):
+    """Display formats of the indicator columns among `columns`, by label."""
+    return {col: INDICATORS[col].fmt for col in columns if col in INDICATORS}
+
+
+def extract_volumes(data_df):
+    """Returns the date x ticker 'Volume' DataFrame of a yfinance-shaped download, or None."""
+    if isinstance(data_df.columns, pd.MultiIndex) and 'Volume' in data_df.columns.get_level_values(0):
+        return data_df['Volume']
+    return None
+
+
+class _Panel:
+    """
+    Shared intermediates of one indicator run, each built on first use. Window
+    statistics only read the last `reach` + 1 rows; exponential means read the
+    whole history.
+    """
+
+    def __init__(self, history, volumes, reach):
+        self.history = history  # forward-filled closes, float64
+        self.closes = history[-(reach + 1):]
+        self.volumes = volumes[-(reach + 1):] if volumes is not None else None  # NaN where missing
+        self._cache = {}
+
+    def _get(self, name, build):
+        if name not in self._cache:
+            self._cache[name] = build()
+        return self._cache[name]
+
+    @staticmethod
+    def _cumulative(values):
+        """Cumulative sums of the non-NaN entries and of their count, with a leading zero row."""
+        valid = ~np.isnan(values)
+        sums = np.zeros((len(values) + 1, values.shape[1]))
+        counts = np.zeros((len(values) + 1, values.shape[1]), dtype=np.int64)
+        np.cumsum(np.where(valid, values, 0.0), axis=0, out=sums[1:])
+        np.cumsum(valid, axis=0, out=counts[1:])
+        return sums, counts
+
+    def trailing(self, name, window):
+        """(sum, count) of the non-NaN values of intermediate `name` over its last `window` rows."""
+        sums, counts = self._get(f"{name}.cumsum", lambda: self._cumulative(getattr(self, name)))
+        start = max(len(sums) - 1 - window, 0)
+        return sums[-1] - sums[start], counts[-1] - counts[start]
+
+    @property
+    def returns(self):
+        def build():
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.log(self.closes[1:] / self.closes[:-1])
+        return self._get('returns', build)
+
+    @property
+    def squared_returns(self):
+        return self._get('squared_returns', lambda: self.returns ** 2)
+
+    @property
+    def price_changes(self):
+        return self._get('price_changes', lambda: np.diff(self.history, axis=0))
+
+    @property
+    def listed(self):
+        """Number of rows since each ticker's first close."""
+        return self._get('listed', lambda: (~np.isnan(self.history)).sum(axis=0))
+
+    @property
+    def dollar_volumes(self):
+        return self._get('dollar_volumes', lambda: self.closes * self.volumes)
+
+    def ewm(self, values, alpha):
+        """
+        Exponentially weighted mean of every column as of the last row, equal to
+        pandas `ewm(alpha=alpha).mean()` (adjust=True): one weighted sum over the
+        rows instead of a recursion. einsum sums every column in the same order
+        whatever the number of columns, unlike a BLAS dot product, so results do
+        not depend on how the tickers are chunked.
+        """
+        weights = (1 - alpha) ** np.arange(len(values) - 1, -1, -1, dtype=np.float64)
+        valid = ~np.isnan(values)
+        with np.errstate(invalid='ignore'):
+            return (np.einsum('i,ij->j', weights, np.where(valid, values, 0.0))
+                    / np.einsum('i,ij->j', weights, valid.astype(np.float64)))
+
+    def rolling_std(self, window):
+        """Sample standard deviation of the last `window` daily returns; NaN unless all are present."""
+        total, count = self.trailing('returns', window)
+        squares, _ = self.trailing('squared_returns', window)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = (squares - total ** 2 / count) / (count - 1)
+        return np.where(count == window, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+
+    def sma(self, window):
+        total, count = self.trailing('closes', window)
+        return np.where(count == window, total / np.maximum(count, 1), np.nan)
+
+
+def _volatility(panel, window):
+    return panel.rolling_std(window) * np.sqrt(TRADING_DAYS_PER_YEAR)
+
+
+def _risk_adjusted(panel, window):
+    total, count = panel.trailing('returns', window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(count == window, total / (panel.rolling_std(window) * np.sqrt(window)), np.nan)
+
+
+def _sma_cross(panel, fast, slow):
+    return panel.sma(fast) / panel.sma(slow) - 1
+
+
+def _ema_cross(panel, fast, slow):
+    closes = panel.history
+    ratio = panel.ewm(closes, 2 / (fast + 1)) / panel.ewm(closes, 2 / (slow + 1)) - 1
+    return np.where(panel.listed >= slow, ratio, np.nan)
+
+
+def _rsi(panel, window):
+    # Wilder's smoothing is an exponential mean with alpha = 1 / window
+    changes = panel.price_changes
+    gains = panel.ewm(np.clip(changes, 0, None), 1 / window)  # NaN stays NaN
+    losses = panel.ewm(np.clip(-changes, 0, None), 1 / window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(panel.listed > window, 100 * gains / (gains + losses), np.nan)
+
+
+def _high_distance(panel, window):
+    if len(panel.closes) < window:
+        return np.full(panel.closes.shape[1], np.nan)
+    tail = panel.closes[-window:]
+    complete = ~np.isnan(tail[0])
+    high = np.max(np.where(np.isnan(tail), -np.inf, tail), axis=0)
+    return np.where(complete, tail[-1] / high - 1, np.nan)
+
+
+def _relative_volume(panel, fast, slow):
+    if panel.volumes is None or len(panel.volumes) < slow:
+        return np.full(panel.closes.shape[1], np.nan)
+    fast_total, fast_count = panel.trailing('volumes', fast)
+    slow_total, slow_count = panel.trailing('volumes', slow)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (fast_total / fast_count) / (slow_total / slow_count) - 1
+
+
+def _dollar_volume(panel, window):
+    if panel.volumes is None:
+        return np.full(panel.closes.shape[1], np.nan)
+    total, count = panel.trailing('dollar_volumes', window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return total / count
+
+
+# Indicator kinds, each computing one value per ticker from a _Panel and the windows
+INDICATOR_KINDS = {
+    'volatility': _volatility,
+    'risk_adjusted': _risk_adjusted,
+    'sma_cross': _sma_cross,
+    'ema_cross': _ema_cross,
+    'rsi': _rsi,
+    'high_distance': _high_distance,
+    'relative_volume': _relative_volume,
+    'dollar_volume': _dollar_volume,
+}
+
+
+def compute_indicators(close_prices_df, volume_df=None, indicators=None, max_staleness=MAX_STALENESS):
+    """
+    Computes every indicator for every ticker as of the latest date.
+
+    Closes are forward-filled over missing days, so a ticker without a bar on a
+    day counts as unchanged; volumes are averaged over the days they exist. A
+    value needs its whole window inside the ticker's history, else it is NaN.
+
+    Args:
+        close_prices_df (pd.DataFrame): Close prices, one column per ticker.
+        volume_df (pd.DataFrame, optional): Volumes with the same layout; the
+                                            volume indicators are NaN without it.
+        indicators (dict, optional): Mapping of label to Indicator. Defaults to
+                                     INDICATORS.
+        max_staleness (pd.Timedelta): Tickers whose latest close is older than
+                                      this, relative to the latest date, get NaN.
+
+    Returns:
+        pd.DataFrame: One row per ticker with at least one valid close, with
+                      'Ticker' and one column per indicator.
+    """
+    indicators = INDICATORS if indicators is None else indicators
+    labels = list(indicators)
+    if close_prices_df.empty:
+        return pd.DataFrame(columns=['Ticker'] + labels)
+    close_prices_df, values = close_values(close_prices_df)
+
+    # Latest valid close of every ticker at every date
+    last_valid = latest_valid_rows(values)
+    columns = np.arange(values.shape[1])
+    closes = np.where(last_valid >= 0, values[np.maximum(last_valid, 0), columns], np.nan).astype(np.float64)
+    volumes = None
+    if volume_df is not None:
+        volumes = volume_df.reindex(index=close_prices_df.index, columns=close_prices_df.columns)
+        volumes = volumes.to_numpy(dtype=np.float64, na_value=np.nan)
+
+    reach = max((max(indicator.windows) for indicator in indicators.values()), default=0)
+    panel = _Panel(closes, volumes, reach)
+    results = np.column_stack([INDICATOR_KINDS[indicator.kind](panel, *indicator.windows)
+                               for indicator in indicators.values()]) if labels else np.empty((len(columns), 0))
+
+    keep = last_valid[-1] >= 0
+    dates_ns = pd.DatetimeIndex(close_prices_df.index).as_unit('ns').asi8
+    stale = dates_ns[np.maximum(last_valid[-1], 0)] < dates_ns[-1] - pd.Timedelta(max_staleness).value
+    results[stale] = np.nan
+
+    indicators_df = pd.DataFrame(results[keep], columns=labels)
+    indicators_df.insert(0, 'Ticker', close_prices_df.columns[keep])
+    return indicators_df
+
+
+def calculate_indicators_for_all(data_df, indicators=None, max_staleness=MAX_STALENESS):
+    """
+    Calculates indicators from a yfinance-shaped download, using its 'Volume'
+    prices if it has any.
+
+    Raises:
+        ValueError: If `data_df` has no recognizable 'Close' prices.
+    """
+    close_prices_df = extract_close_prices(data_df)
+    if close_prices_df is None:
+        raise ValueError("'Close' prices not found in the expected column structure. Please verify data_df format.")
+    return compute_indicators(close_prices_df, extract_volumes(data_df), indicators, max_staleness)
@@ -0,0 +1,200 @@
+"""
+Lightweight tracing of pipeline stages and external calls.
+
+Code wraps work in `span(name, **attributes)` and may attach cache hit/miss,
+byte and row counts to the active span. Spans are kept in a bounded in-memory
+buffer and can be exported as JSON lines or in the Prometheus text format.
+
+Recording is off by default; while disabled, `span` hands back a shared no-op
+object, so instrumented code pays for little more than one function call.
+"""
+from collections import deque
+import json
+import threading
+import time
+import tracemalloc
+
+
+class _NullSpan:
+    """Stand-in returned while recording is disabled; ignores everything."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed unit of work; attributes set on it end up in the exported record."""
+
+    def __init__(self, recorder, name, attributes):
+        self.recorder = recorder
+        self.name = name
+        self.attributes = attributes
+        self.child_peak = 0
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        stack = self.recorder._stack()
+        self.parent = stack[-1] if stack else None
+        stack.append(self)
+        if self.recorder.trace_memory:
+            self.memory_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.started = time.time()
+        self._perf_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._perf_start
+        self.recorder._stack().pop()
+        record = {
+            'name': self.name,
+            'start': self.started,
+            'duration_s': duration,
+            'parent': self.parent.name if self.parent else None,
+            'thread': threading.current_thread().name,
+            'status': 'error' if exc_type else 'ok',
+        }
+        if exc_type:
+            record['error'] = f"{exc_type.__name__}: {exc}"
+        if self.recorder.trace_memory:
+            # reset_peak() in nested spans hides their peaks from us, so children report theirs upward
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            record['peak_bytes'] = max(0, peak - self.memory_start)
+            if self.parent is not None:
+                self.parent.child_peak = max(self.parent.child_peak, peak)
+        record.update(self.attributes)
+        self.recorder._record(record)
+        return False
+
+
+class Recorder:
+    """
+    Collects finished spans in a ring buffer of `capacity` records.
+
+    `trace_memory` enables per-span peak memory through tracemalloc, which slows
+    allocation-heavy code noticeably; peaks of spans running concurrently in
+    several threads are approximate.
+    """
+
+    def __init__(self, enabled=False, trace_memory=False, capacity=2000):
+        self.enabled = enabled
+        self.trace_memory = False
+        self.records = deque(maxlen=capacity)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.set_trace_memory(trace_memory)
+
+    def set_trace_memory(self, trace_memory):
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not trace_memory and self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.trace_memory = trace_memory
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def span(self, name, **attributes):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, attributes)
+
+    def current(self):
+        """Returns the innermost open span on this thread (a no-op span if none)."""
+        if not self.enabled:
+            return NULL_SPAN
+        stack = self._stack()
+        return stack[-1] if stack else NULL_SPAN
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.records)
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+
+
+# Process-wide recorder used by the module-level helpers below
+recorder = Recorder()
+
+
+def span(name, **attributes):
+    """Times a block as a span of the process-wide recorder: `with span('download', tickers=500) as s: ...`."""
+    return recorder.span(name, **attributes)
+
+
+def current_span():
+    """Returns the innermost open span on this thread, for attaching attributes such as cache='miss'."""
+    return recorder.current()
+
+
+def to_jsonl(records):
+    """Serializes span records as JSON lines."""
+    return ''.join(json.dumps(record, default=str) + '\n' for record in records)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def to_prometheus(records, prefix='screener'):
+    """
+    Aggregates span records per span name into Prometheus text-format metrics:
+    duration sum/count, errors, cache hits/misses, bytes, rows and peak memory.
+    """
+    stats = {}
+    for record in records:
+        entry = stats.setdefault(record['name'], {
+            'duration_sum': 0.0, 'count': 0, 'errors': 0, 'hit': 0, 'miss': 0,
+            'bytes': 0, 'rows': 0, 'peak_bytes': 0,
+        })
+        entry['duration_sum'] += record['duration_s']
+        entry['count'] += 1
+        entry['errors'] += record['status'] == 'error'
+        if record.get('cache') in ('hit', 'miss'):
+            entry[record['cache']] += 1
+        entry['bytes'] += record.get('bytes') or 0
+        entry['rows'] += record.get('rows') or 0
+        entry['peak_bytes'] = max(entry['peak_bytes'], record.get('peak_bytes') or 0)
+
+    lines = [
+        f"# HELP {prefix}_span_duration_seconds Time spent in each span.",
+        f"# TYPE {prefix}_span_duration_seconds summary",
+    ]
+    for name, entry in sorted(stats.items()):
+        lines.append(f'{prefix}_span_duration_seconds_sum{{span="{_label(name)}"}} {entry["duration_sum"]}')
+        lines.append(f'{prefix}_span_duration_seconds_count{{span="{_label(name)}"}} {entry["count"]}')
+
+    metrics = [
+        ('span_errors_total', 'counter', 'Spans that ended with an exception.', 'errors'),
+        ('cache_hits_total', 'counter', 'Spans served from a cache.', 'hit'),
+        ('cache_misses_total', 'counter', 'Spans that missed their cache.', 'miss'),
+        ('bytes_total', 'counter', 'Bytes transferred or loaded within the span.', 'bytes'),
+        ('rows_total', 'counter', 'Rows produced within the span.', 'rows'),
+        ('span_peak_memory_bytes', 'gauge', 'Largest traced memory peak of the span.', 'peak_bytes'),
+    ]
+    for metric, kind, help_text, key in metrics:
+        lines.append(f"# HELP {prefix}_{metric} {help_text}")
+        lines.append(f"# TYPE {prefix}_{metric} {kind}")
+        for name, entry in sorted(stats.items()):
+            lines.append(f'{prefix}_{metric}{{span="{_label(name)}"}} {entry[key]}')
+    return '\n'.join(lines) + '\n'
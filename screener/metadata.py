@@ -0,0 +1,193 @@
+"""
+Company metadata (name, sector, sub-industry, description) for a whole ticker
+universe, persisted in SQLite.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import os
+import sqlite3
+import threading
+import time
+
+from .instrumentation import span
+from .store import PRICE_STORE_DIR
+
+# SQLite database holding company metadata; override with the METADATA_DB_PATH environment variable.
+METADATA_DB_PATH = os.environ.get('METADATA_DB_PATH', os.path.join(PRICE_STORE_DIR, 'metadata.sqlite'))
+METADATA_FIELDS = ('name', 'sector', 'industry', 'description')
+# Columns stored alongside the fields: when info was last requested, and its error if the request failed
+INFO_COLUMNS = ('info_updated', 'info_error')
+# How long after a failed info request the ticker is requested again
+INFO_RETRY_DELAY = timedelta(hours=1)
+
+
+def yfinance_info(ticker_symbol):
+    """
+    Default metadata source for MetadataStore: maps yfinance's `.info` for one
+    ticker onto METADATA_FIELDS.
+    """
+    import yfinance as yf  # Imported lazily: it is slow to import and unused when reading from disk
+
+    info = yf.Ticker(ticker_symbol).info
+    return {
+        'name': info.get('longName'),
+        'sector': info.get('sector'),
+        'industry': info.get('industry'),
+        'description': info.get('longBusinessSummary'),
+    }
+
+
+class MetadataStore:
+    """
+    Company metadata persisted in SQLite and mirrored in an in-memory dict, so
+    lookups never touch the disk or the network.
+
+    Sector, sub-industry and name are seeded in bulk from the Wikipedia
+    constituents table (see `seed_constituents`). Descriptions, and any field the
+    table lacks, come from `info_loader` (yfinance by default), called on a
+    bounded thread pool and repeated for a ticker only once its last request is
+    older than `ttl`, or `retry_delay` if that request failed. This holds for
+    tickers whose info has no description too, so they are not requested again
+    on every call.
+    """
+
+    def __init__(self, path=METADATA_DB_PATH, info_loader=None, max_workers=8, ttl=timedelta(days=30),
+                 retry_delay=INFO_RETRY_DELAY):
+        self.path = path
+        self.info_loader = info_loader or yfinance_info
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+        self._in_flight = set()  # Tickers whose info a running refresh is fetching
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                "ticker TEXT PRIMARY KEY, name TEXT, sector TEXT, industry TEXT, description TEXT, "
+                "info_updated REAL, info_error TEXT)"
+            )
+            if 'info_error' not in {row[1] for row in conn.execute("PRAGMA table_info(metadata)")}:
+                conn.execute("ALTER TABLE metadata ADD COLUMN info_error TEXT")  # Stores created before it
+            rows = conn.execute(
+                f"SELECT ticker, {', '.join(METADATA_FIELDS + INFO_COLUMNS)} FROM metadata"
+            ).fetchall()
+        self._records = {
+            row[0]: dict(zip(METADATA_FIELDS + INFO_COLUMNS, row[1:])) for row in rows
+        }
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, ticker):
+        """Returns the stored metadata dict for `ticker` (empty if unknown)."""
+        return self._records.get(ticker, {})
+
+    def upsert(self, records, keep_existing=(), info_updated=None, info_error=None):
+        """
+        Merges {ticker: {field: value}} into the store. Missing values never
+        overwrite stored ones, and neither does any field listed in
+        `keep_existing` that is already set. `info_updated` records an info
+        request at that time, failed with `info_error` if given: one message for
+        all records, or a {ticker: message} dict.
+        """
+        with self._lock:
+            rows = []
+            for ticker, fields in records.items():
+                merged = dict(self._records.get(ticker, {}))
+                for field in METADATA_FIELDS:
+                    value = fields.get(field)
+                    if value and not (field in keep_existing and merged.get(field)):
+                        merged[field] = value
+                if info_updated is not None:
+                    merged['info_updated'] = info_updated
+                    merged['info_error'] = info_error.get(ticker) if isinstance(info_error, dict) else info_error
+                self._records[ticker] = merged
+                rows.append((ticker,) + tuple(merged.get(f) for f in METADATA_FIELDS + INFO_COLUMNS))
+
+            with self._connect() as conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO metadata (ticker, {', '.join(METADATA_FIELDS + INFO_COLUMNS)}) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+    def seed_constituents(self, table):
+        """
+        Stores name, GICS sector and GICS sub-industry from a Wikipedia constituents
+        table with yfinance-style symbols in its 'Symbol' column.
+        """
+        columns = {'Security': 'name', 'GICS Sector': 'sector', 'GICS Sub-Industry': 'industry'}
+        present = [c for c in columns if c in table.columns]
+        records = {
+            row['Symbol']: {columns[c]: row[c] for c in present}
+            for row in table[['Symbol'] + present].to_dict('records')
+        }
+        self.upsert(records)
+
+    def stale_tickers(self, tickers, missing_only=False):
+        """
+        Returns the tickers whose info was never requested, or last requested
+        longer ago than the TTL (the retry delay if that request failed). With
+        `missing_only`, only tickers without a description are considered.
+        """
+        now = time.time()
+        stale = []
+        for ticker in tickers:
+            record = self.get(ticker)
+            if missing_only and record.get('description'):
+                continue
+            age = self.retry_delay if record.get('info_error') else self.ttl
+            if (record.get('info_updated') or 0) < now - age.total_seconds():
+                stale.append(ticker)
+        return stale
+
+    def _load_info(self, ticker):
+        """Returns (ticker, fields, error) with `error` the message of a failed request, else None."""
+        with span('metadata.info', ticker=ticker) as s:
+            try:
+                return ticker, self.info_loader(ticker), None
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                s.set(status='error', error=error)
+                return ticker, {}, error
+
+    def refresh(self, tickers, missing_only=False):
+        """
+        Fetches info for the stale `tickers` in parallel and stores the results
+        in one write, recording the request time even if it failed or had no
+        description. Tickers another refresh is already fetching are skipped.
+        """
+        with self._lock:
+            stale = [t for t in self.stale_tickers(tickers, missing_only=missing_only) if t not in self._in_flight]
+            self._in_flight.update(stale)
+        if not stale:
+            return
+        try:
+            records, errors = {}, {}
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for ticker, fields, error in executor.map(self._load_info, stale):
+                    records[ticker], errors[ticker] = fields, error
+            # Wikipedia's GICS classification takes precedence over yfinance's
+            self.upsert(records, keep_existing=('name', 'sector', 'industry'),
+                        info_updated=time.time(), info_error=errors)
+        finally:
+            with self._lock:
+                self._in_flight.difference_update(stale)
+
+    def ensure(self, tickers):
+        """
+        Fetches info for any of `tickers` that has no description yet and is not
+        waiting for a retry, nor being fetched by a background refresh.
+        """
+        self.refresh(tickers, missing_only=True)
+
+    def refresh_in_background(self, tickers):
+        """Starts a daemon thread refreshing stale `tickers`, unless one is already running."""
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self.refresh, args=(list(tickers),), daemon=True)
+            self._refresh_thread.start()
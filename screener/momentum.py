@@ -0,0 +1,391 @@
+"""
+Vectorized momentum calculation over a date x ticker panel of close prices.
+
+Horizons are calendar spans resolved once against the panel's shared trading-day
+index, so every ticker is measured over the same dates however many bars it is
+missing. `compute_momentum` keeps the older per-ticker scheme, which counts back
+a fixed number of each ticker's own valid closes.
+"""
+import numpy as np
+import pandas as pd
+
+# Stamp for "no close yet" in int64 nanosecond date arrays
+NO_DATE = np.iinfo(np.int64).min
+
+# An anchor price older than this, relative to its anchor date, is stale
+MAX_STALENESS = pd.Timedelta(days=7)
+
+
+class Horizon:
+    """
+    A momentum horizon: the change between a start and an end anchor on the shared
+    trading-day index.
+
+    An anchor is an int (that many trading days, i.e. index rows, before the latest
+    date), a pd.DateOffset (the last trading day on or before the latest date
+    minus the offset), 'YTD' (the last trading day of the previous year) or None
+    (the latest date). Each ticker is priced at an anchor by its last close on or
+    before the anchor date.
+    """
+
+    def __init__(self, start, end=None):
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f"Horizon({self.start!r}, {self.end!r})"
+
+
+# Momentum horizons keyed by the column label shown in the app.
+MOMENTUM_HORIZONS = {
+    '1D': Horizon(1),                                                 # previous trading day
+    '1W': Horizon(pd.DateOffset(weeks=1)),
+    '1M': Horizon(pd.DateOffset(months=1)),
+    '2M': Horizon(pd.DateOffset(months=2)),
+    '3M': Horizon(pd.DateOffset(months=3)),
+    '6M': Horizon(pd.DateOffset(months=6)),
+    '12-1M': Horizon(pd.DateOffset(months=12), pd.DateOffset(months=1)),  # skips the latest month
+    'YTD': Horizon('YTD'),
+}
+
+# Lookbacks in each ticker's own valid closes, for `compute_momentum`.
+TRADING_DAY_HORIZONS = {
+    '1D': 1,   # 1 day
+    '1W': 5,   # Approx 1 week (5 trading days)
+    '1M': 22,  # Approx 1 month (22 trading days)
+    '2M': 44,  # Approx 2 months (44 trading days)
+}
+
+
+def extract_close_prices(data_df):
+    """
+    Extracts a date x ticker DataFrame of 'Close' prices from downloaded data.
+
+    Args:
+        data_df (pd.DataFrame): DataFrame containing historical stock data,
+                                typically downloaded from yfinance.
+
+    Returns:
+        pd.DataFrame or None: Close prices with one column per ticker, or None if
+                              no 'Close' prices could be found.
+    """
+    # Ensure data_df has a multi-level column index where one level is 'Close'
+    # yfinance.download with multiple tickers typically returns a MultiIndex (Metric, Ticker)
+    if isinstance(data_df.columns, pd.MultiIndex):
+        if 'Close' in data_df.columns.get_level_values(0):
+            return data_df['Close']
+        # Handle case where 'Close' might be on the second level, though less common for direct yf.download output
+        try:
+            # This might result in a single-level index if only one ticker was downloaded
+            close_prices_df = data_df.xs('Close', level=1, axis=1, drop_level=False)
+            # If it's still multi-index, drop the 'Close' level to get just ticker
+            if isinstance(close_prices_df.columns, pd.MultiIndex):
+                close_prices_df = close_prices_df.droplevel(1, axis=1)
+            return close_prices_df
+        except KeyError:
+            return None
+
+    # If it's a single-level index, assume it's already 'Close' prices per ticker
+    close_prices_df = data_df
+    # If there's only one column and it's not a ticker, try to find the 'Close' column
+    if 'Close' in close_prices_df.columns:
+        close_prices_df = close_prices_df[['Close']]
+        close_prices_df.columns = [data_df.columns[0]]  # Rename to the ticker
+    return close_prices_df
+
+
+def close_values(close_prices_df):
+    """
+    Returns (close_prices_df sorted by date, its values as a float array).
+    float32 and float64 panels are read in place; others are converted to
+    float64 with missing values as NaN.
+    """
+    if not close_prices_df.index.is_monotonic_increasing:
+        close_prices_df = close_prices_df.sort_index()
+    values = close_prices_df.to_numpy()
+    if values.dtype not in (np.float32, np.float64):
+        values = close_prices_df.to_numpy(dtype=np.float64, na_value=np.nan)
+    return close_prices_df, values
+
+
+def latest_valid_rows(values):
+    """Returns the row of each column's latest valid value at or before every row (-1 before its first)."""
+    rows = np.arange(len(values), dtype=np.int32)[:, None]
+    return np.maximum.accumulate(np.where(~np.isnan(values), rows, -1), axis=0)
+
+
+def last_valid_window(values, depth):
+    """
+    Collects the last `depth` non-NaN observations of every column in one pass.
+
+    Args:
+        values (np.ndarray): 2-D array of prices shaped (dates, tickers), sorted by date.
+        depth (int): Number of trailing valid observations to keep per ticker.
+
+    Returns:
+        tuple: (window, counts) where `window[k, j]` is the k-th most recent valid
+               price of ticker j (k=0 is the latest, NaN where the ticker has fewer
+               than k + 1 observations) and `counts[j]` is its number of valid prices.
+    """
+    valid = ~np.isnan(values)
+    seen = np.cumsum(valid, axis=0)
+    counts = seen[-1] if len(values) else np.zeros(values.shape[1], dtype=np.int64)
+
+    # Rank each valid observation from the end of its column: 0 for the last valid
+    # price, 1 for the one before it, and so on, regardless of NaN gaps in between.
+    rank_from_end = counts - seen
+    rows, cols = np.nonzero(valid & (rank_from_end < depth))
+
+    window = np.full((depth, values.shape[1]), np.nan)
+    window[rank_from_end[rows, cols], cols] = values[rows, cols]
+    return window, counts
+
+
+def compute_momentum(close_prices_df, horizons=None):
+    """
+    Vectorized momentum engine over a date x ticker panel of close prices.
+
+    Each ticker is measured from its own last valid close, and a horizon of `n` days
+    looks back `n` valid observations, skipping NaN gaps. All horizons are computed
+    in a single batched pass over one 2-D NumPy array.
+
+    Args:
+        close_prices_df (pd.DataFrame): Close prices, one column per ticker. float32
+                                        panels are read in place; changes are
+                                        always computed in float64.
+        horizons (dict, optional): Mapping of column label to lookback in trading
+                                   days. Defaults to TRADING_DAY_HORIZONS.
+
+    Returns:
+        pd.DataFrame: One row per ticker with at least two valid prices, holding
+                      'Ticker' and one percent-change column per horizon.
+    """
+    if horizons is None:
+        horizons = TRADING_DAY_HORIZONS
+    labels = list(horizons)
+    lookbacks = np.array([horizons[label] for label in labels], dtype=np.int64)
+
+    close_prices_df, values = close_values(close_prices_df)
+    depth = int(lookbacks.max()) + 1 if len(lookbacks) else 1
+    window, counts = last_valid_window(values, depth)
+
+    # Tickers with fewer than two valid prices cannot produce any change
+    keep = counts >= 2
+    current = window[0, keep]
+    past = window[lookbacks][:, keep]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        changes = np.where(past != 0, (current - past) / past, np.nan)
+
+    momentum_df = pd.DataFrame(changes.T, columns=labels)
+    momentum_df.insert(0, 'Ticker', close_prices_df.columns[keep])
+    return momentum_df
+
+
+def as_horizons(horizons):
+    """Normalizes a mapping of label to Horizon or int (trading days on the shared index)."""
+    if horizons is None:
+        return dict(MOMENTUM_HORIZONS)
+    return {label: spec if isinstance(spec, Horizon) else Horizon(int(spec)) for label, spec in horizons.items()}
+
+
+def anchor_span_days(anchor):
+    """Upper bound on the calendar days (or, for an int anchor, rows) an anchor reaches back."""
+    if anchor is None:
+        return 0
+    if isinstance(anchor, (int, np.integer)):
+        return int(anchor)
+    if anchor == 'YTD':
+        return 366
+    references = (pd.Timestamp('2000-03-01'), pd.Timestamp('2000-12-31'), pd.Timestamp('2001-03-31'))
+    return max((ref - (ref - anchor)).days for ref in references)
+
+
+def anchor_target(asof, anchor):
+    """Date an offset or 'YTD' anchor points at from `asof` (a Timestamp or a DatetimeIndex)."""
+    if anchor == 'YTD':
+        # The instant before January 1st of the as-of year, so that "on or before" excludes that day
+        return (asof + pd.Timedelta(days=1)).normalize() - pd.offsets.YearBegin(1) - pd.Timedelta(1)
+    return asof - anchor
+
+
+def anchor_rows(dates, anchor, asof_rows):
+    """
+    Resolves one anchor for many as-of rows of `dates` (sorted) with one vectorized
+    searchsorted; rows are -1 where the anchor falls before the first date.
+    """
+    dates = pd.DatetimeIndex(dates).as_unit('ns')
+    asof_rows = np.asarray(asof_rows)
+    if anchor is None:
+        return asof_rows
+    if isinstance(anchor, (int, np.integer)):
+        return np.maximum(asof_rows - int(anchor), -1)
+    return dates.searchsorted(anchor_target(dates[asof_rows], anchor), side='right') - 1
+
+
+def resolve_anchors(dates, horizons):
+    """
+    Resolves every horizon's anchors to rows of `dates` (sorted) with a single
+    searchsorted call.
+
+    Returns:
+        dict: label -> (start row, end row); a row is -1 if the anchor falls
+              before the first date.
+    """
+    dates = pd.DatetimeIndex(dates).as_unit('ns')
+    last = len(dates) - 1
+    latest = dates[-1]
+    rows, targets, pending = {}, [], []
+    for label, horizon in horizons.items():
+        for anchor in (horizon.start, horizon.end):
+            if anchor is None or isinstance(anchor, (int, np.integer)):
+                continue
+            targets.append(anchor_target(latest, anchor))
+            pending.append(anchor)
+    found = dates.searchsorted(pd.DatetimeIndex(targets).as_unit('ns'), side='right') - 1 if targets else []
+    resolved = {id(anchor): int(row) for anchor, row in zip(pending, found)}
+
+    for label, horizon in horizons.items():
+        pair = []
+        for anchor in (horizon.start, horizon.end):
+            if anchor is None:
+                pair.append(last)
+            elif isinstance(anchor, (int, np.integer)):
+                pair.append(max(last - int(anchor), -1))
+            else:
+                pair.append(resolved[id(anchor)])
+        rows[label] = tuple(pair)
+    return rows
+
+
+def anchored_changes(dates, anchors, price_at, n_tickers, max_staleness=MAX_STALENESS):
+    """
+    Computes the change of every horizon from its resolved anchor rows.
+
+    Args:
+        dates (pd.DatetimeIndex): The shared trading-day index.
+        anchors (dict): label -> (start row, end row), from `resolve_anchors`.
+        price_at (callable): row -> (prices, close dates) of every ticker at that
+                             row: its last close on or before the row's date, as
+                             float64, and that close's date as int64 ns (NO_DATE
+                             if it has none yet). Called once per distinct row.
+        n_tickers (int): Number of tickers `price_at` returns prices for.
+        max_staleness (pd.Timedelta): Oldest acceptable gap between an anchor's
+                                      date and the close used for it.
+
+    Returns:
+        tuple: (changes, stale), both shaped (tickers, horizons); `stale` marks
+               changes with an anchor price older than `max_staleness`.
+    """
+    dates_ns = pd.DatetimeIndex(dates).as_unit('ns').asi8
+    limit = pd.Timedelta(max_staleness).value
+    gathered = {}
+
+    def at(row):
+        if row not in gathered:
+            prices, stamps = price_at(row)
+            gathered[row] = (prices, (stamps != NO_DATE) & (stamps < dates_ns[row] - limit))
+        return gathered[row]
+
+    changes = np.full((n_tickers, len(anchors)), np.nan)
+    stale = np.zeros((n_tickers, len(anchors)), dtype=bool)
+    for j, (start, end) in enumerate(anchors.values()):
+        if start < 0 or end < 0:
+            continue  # Not enough history for this horizon
+        past, past_stale = at(start)
+        current, current_stale = at(end)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            changes[:, j] = np.where(past != 0, (current - past) / past, np.nan)
+        stale[:, j] = past_stale | current_stale
+    return changes, stale
+
+
+def momentum_frame(tickers, labels, changes, stale, stale_mode='exclude'):
+    """
+    Builds the momentum table from `anchored_changes` output. Stale changes are
+    set to NaN with stale_mode='exclude', or kept and listed in a 'Stale' column
+    with stale_mode='mark'.
+    """
+    if stale_mode == 'exclude':
+        changes = np.where(stale, np.nan, changes)
+    momentum_df = pd.DataFrame(changes, columns=labels)
+    momentum_df.insert(0, 'Ticker', tickers)
+    if stale_mode == 'mark':
+        labels = np.array(labels, dtype=object)
+        momentum_df['Stale'] = [', '.join(labels[row]) for row in stale]
+    return momentum_df
+
+
+def compute_calendar_momentum(close_prices_df, horizons=None, max_staleness=MAX_STALENESS, stale='exclude'):
+    """
+    Vectorized momentum over calendar horizons resolved once against the shared
+    trading-day index.
+
+    One pass builds, for every date, the row of each ticker's latest valid close;
+    every distinct anchor row then costs a single gather of one price per ticker.
+
+    Args:
+        close_prices_df (pd.DataFrame): Close prices, one column per ticker.
+        horizons (dict, optional): Mapping of column label to Horizon (or int, a
+                                   number of trading days on the shared index).
+                                   Defaults to MOMENTUM_HORIZONS.
+        max_staleness (pd.Timedelta): Anchor prices older than this relative to
+                                      the anchor date are stale.
+        stale (str): 'exclude' to drop stale changes (NaN) or 'mark' to keep them
+                     and list the affected horizons in a 'Stale' column.
+
+    Returns:
+        pd.DataFrame: One row per ticker with at least one valid close, holding
+                      'Ticker' and one percent-change column per horizon.
+    """
+    horizons = as_horizons(horizons)
+    if close_prices_df.empty:
+        return momentum_frame([], list(horizons), np.empty((0, len(horizons))),
+                              np.empty((0, len(horizons)), dtype=bool), stale)
+    close_prices_df, values = close_values(close_prices_df)
+    keep = ~np.isnan(values).all(axis=0)
+    values = values[:, keep]
+    last_valid = latest_valid_rows(values)
+    dates_ns = pd.DatetimeIndex(close_prices_df.index).as_unit('ns').asi8
+    columns = np.arange(values.shape[1])
+
+    def price_at(row):
+        idx = last_valid[row]
+        found = idx >= 0
+        prices = np.where(found, values[np.maximum(idx, 0), columns], np.nan).astype(np.float64)
+        return prices, np.where(found, dates_ns[np.maximum(idx, 0)], NO_DATE)
+
+    anchors = resolve_anchors(close_prices_df.index, horizons)
+    changes, stale_mask = anchored_changes(close_prices_df.index, anchors, price_at, values.shape[1], max_staleness)
+    return momentum_frame(close_prices_df.columns[keep], list(horizons), changes, stale_mask, stale)
+
+
+def calculate_momentum_for_all(data_df, horizons=None, max_staleness=MAX_STALENESS, stale='exclude'):
+    """
+    Calculates momentum for all tickers from a single DataFrame of downloaded data.
+    This function is now separate from data downloading and can be called repeatedly
+    on the `data_df` object.
+
+    Args:
+        data_df (pd.DataFrame): DataFrame containing historical stock data,
+                                typically downloaded from yfinance.
+                                Expected format is multi-index columns (e.g., 'Close', 'Ticker').
+        horizons (dict, optional): Mapping of column label to Horizon. Defaults
+                                   to MOMENTUM_HORIZONS.
+        max_staleness (pd.Timedelta): Anchor prices older than this are stale.
+        stale (str): 'exclude' or 'mark' stale changes, see `compute_calendar_momentum`.
+
+    Returns:
+        pd.DataFrame: A DataFrame with momentum results for each ticker,
+                      including 'Ticker' and one change column per horizon.
+
+    Raises:
+        ValueError: If `data_df` has no recognizable 'Close' prices.
+    """
+    if data_df.empty:
+        return pd.DataFrame()
+
+    close_prices_df = extract_close_prices(data_df)
+    if close_prices_df is None:
+        raise ValueError("'Close' prices not found in the expected column structure. Please verify data_df format.")
+
+    return compute_calendar_momentum(close_prices_df, horizons, max_staleness, stale)
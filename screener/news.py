@@ -0,0 +1,129 @@
+"""
+Concurrent, pooled and rate-limited fetching of Finviz news headlines.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+from .extract import extract_finviz_headlines
+from .instrumentation import current_span, span
+
+FINVIZ_QUOTE_URL = 'https://finviz.com/quote.ashx?t='
+FINVIZ_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36'
+}
+
+
+class HostRateLimiter:
+    """
+    Spaces out request starts to at most `rate` per second for each host, shared
+    by every worker thread.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = {}  # host -> monotonic time of the next free slot
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        """Blocks until a request to the host of `url` may start."""
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def parse_finviz_headlines(html, n_headlines):
+    """
+    Extracts up to `n_headlines` Headline records (see screener.extract) from a
+    Finviz quote page. Returns None if the page has no 'news-table'.
+    """
+    return extract_finviz_headlines(html, n_headlines)
+
+
+class NewsFetcher:
+    """
+    Fetches Finviz headlines for many tickers concurrently.
+
+    Requests run on a bounded thread pool over one keep-alive `requests.Session`,
+    are rate limited per host, and are retried with exponential backoff on
+    connection errors, 429 and 5xx responses. Parsed headlines are cached per
+    ticker for `ttl`. `base_url` can point at a local stub server for testing.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, base_url=FINVIZ_QUOTE_URL, max_workers=8, rate=10.0, timeout=10.0,
+                 retries=3, backoff=0.5, ttl=timedelta(minutes=15), n_headlines=3):
+        self.base_url = base_url
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.ttl = ttl
+        self.n_headlines = n_headlines
+        self.rate_limiter = HostRateLimiter(rate)
+
+        self.session = requests.Session()
+        self.session.headers.update(FINVIZ_HEADERS)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._cache = {}  # ticker -> (fetched_at, headlines)
+        self._cache_lock = threading.Lock()
+
+    def _get(self, url):
+        for attempt in range(self.retries + 1):
+            self.rate_limiter.wait(url)
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                if response.status_code not in self.RETRY_STATUSES or attempt == self.retries:
+                    response.raise_for_status()  # Raise an HTTPError for bad responses (4xx or 5xx)
+                    current_span().set(bytes=len(response.content), attempts=attempt + 1)
+                    return response.text
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == self.retries:
+                    raise
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def fetch(self, ticker):
+        """
+        Returns (headlines, error) for `ticker`. `headlines` is a list of
+        Headline records, or None if the page has no news table or the request
+        failed, in which case `error` holds the exception.
+        """
+        with span('news.fetch', ticker=ticker) as s:
+            with self._cache_lock:
+                cached = self._cache.get(ticker)
+            if cached and datetime.now() - cached[0] < self.ttl:
+                s.set(cache='hit')
+                return cached[1], None
+            s.set(cache='miss')
+
+            try:
+                html = self._get(self.base_url + ticker)
+            except requests.exceptions.RequestException as err:
+                s.set(status='error', error=str(err))
+                return None, err
+
+            headlines = parse_finviz_headlines(html, self.n_headlines)
+            s.set(rows=len(headlines) if headlines else 0)
+        with self._cache_lock:
+            self._cache[ticker] = (datetime.now(), headlines)
+        return headlines, None
+
+    def fetch_all(self, tickers):
+        """Fetches all `tickers` concurrently, returning {ticker: (headlines, error)}."""
+        with span('news.fetch_all', tickers=len(tickers)):
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                return dict(zip(tickers, executor.map(self.fetch, tickers)))
@@ -0,0 +1,125 @@
+"""
+Rankings over a momentum table, computed once per data snapshot.
+"""
+import numpy as np
+import pandas as pd
+
+from .indicators import INDICATORS, calculate_indicators_for_all, column_formats
+from .momentum import MAX_STALENESS, MOMENTUM_HORIZONS, calculate_momentum_for_all
+
+
+class RankIndex:
+    """
+    Sort orders, percentile ranks and lazily formatted display rows for one
+    momentum snapshot.
+
+    Orders for every column and direction are computed once with a single
+    argsort over the whole momentum matrix (NaN always last), so picking the top
+    or bottom k rows for any column is a slice, and only the rows actually shown
+    are ever formatted. Values are shown as percentages unless `formats` maps
+    their column to another format string.
+    """
+
+    def __init__(self, momentum_df, columns, formats=None):
+        self.columns = list(columns)
+        self.formats = [(formats or {}).get(col, '{:.2%}') for col in self.columns]
+        self.tickers = momentum_df['Ticker'].to_numpy()
+        self.values = momentum_df[self.columns].to_numpy(dtype=np.float64)
+        self.valid_counts = dict(zip(self.columns, (~np.isnan(self.values)).sum(axis=0)))
+
+        missing = np.isnan(self.values)
+        ascending = np.argsort(np.where(missing, np.inf, self.values), axis=0, kind='stable')
+        descending = np.argsort(np.where(missing, np.inf, -self.values), axis=0, kind='stable')
+        self._orders = {}
+        for j, col in enumerate(self.columns):
+            self._orders[(col, True)] = ascending[:, j]
+            self._orders[(col, False)] = descending[:, j]
+
+        self.percentiles = momentum_df[self.columns].rank(pct=True).to_numpy()
+        self._formatted = {}  # row position -> formatted display values
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def order(self, column, ascending=False, dropna=False):
+        """Returns row positions sorted by `column`; NaN rows last, or omitted if `dropna`."""
+        order = self._orders[(column, ascending)]
+        return order[:self.valid_counts[column]] if dropna else order
+
+    def head(self, column, k, ascending=False, dropna=False):
+        """Returns the positions of the first `k` rows sorted by `column`."""
+        return self.order(column, ascending, dropna)[:k]
+
+    def tickers_at(self, positions):
+        return self.tickers[positions].tolist()
+
+    def _format_row(self, position):
+        row = self._formatted.get(position)
+        if row is None:
+            row = [self.tickers[position]] + [
+                fmt.format(x) if not np.isnan(x) else "N/A" for fmt, x in zip(self.formats, self.values[position])
+            ]
+            self._formatted[position] = row
+        return row
+
+    def display_rows(self, positions, percentile_column=None):
+        """
+        Returns a display DataFrame ('Ticker' plus formatted momentum columns) for
+        `positions`, optionally with the percentile rank of `percentile_column`.
+        """
+        display_df = pd.DataFrame([self._format_row(p) for p in positions], columns=['Ticker'] + self.columns)
+        if percentile_column is not None:
+            pct = self.percentiles[positions, self.columns.index(percentile_column)]
+            display_df[f"{percentile_column} Percentile"] = [f"{x:.1%}" if not np.isnan(x) else "N/A" for x in pct]
+        return display_df
+
+
+def calculate_columns(data_df, columns=None, max_staleness=MAX_STALENESS, stale='exclude'):
+    """
+    Computes the momentum horizons and INDICATORS among `columns` (default: all
+    horizons) for `data_df`; returns one row per ticker with 'Ticker' and
+    `columns`, plus 'Stale' with stale='mark'. `max_staleness` and `stale` are
+    passed on to `calculate_momentum_for_all`.
+    """
+    columns = list(columns if columns is not None else MOMENTUM_HORIZONS)
+    momentum_df = calculate_momentum_for_all(
+        data_df, {col: MOMENTUM_HORIZONS[col] for col in columns if col in MOMENTUM_HORIZONS}, max_staleness, stale
+    )
+    indicators = {col: INDICATORS[col] for col in columns if col in INDICATORS}
+    if indicators and not momentum_df.empty:
+        indicators_df = calculate_indicators_for_all(data_df, indicators, max_staleness)
+        momentum_df = momentum_df.merge(indicators_df, on='Ticker', how='left')
+        momentum_df = momentum_df[['Ticker'] + columns + [col for col in momentum_df.columns
+                                                          if col not in columns and col != 'Ticker']]
+    return momentum_df
+
+
+def build_momentum_snapshot(data_df, columns=None, max_staleness=MAX_STALENESS, stale='exclude'):
+    """
+    Computes momentum (and the INDICATORS among `columns`) for `data_df`, drops
+    tickers without any value and builds the RankIndex over what is left.
+
+    Returns:
+        tuple: (momentum_df, rank_index, excluded) where `excluded` counts the
+               tickers dropped for lacking every momentum value.
+    """
+    columns = list(columns if columns is not None else MOMENTUM_HORIZONS)
+    return snapshot_from_momentum(calculate_columns(data_df, columns, max_staleness, stale), columns)
+
+
+def snapshot_from_momentum(momentum_df, columns):
+    """
+    Drops tickers without any value in `columns` from a momentum table and builds
+    the RankIndex over the rest; returns (momentum_df, rank_index, excluded).
+    """
+    if momentum_df.empty:
+        return momentum_df, None, 0
+
+    # Ensure momentum columns are numeric for sorting
+    for col in columns:
+        momentum_df[col] = pd.to_numeric(momentum_df[col], errors='coerce')
+
+    # Drop rows where all momentum values are NaN (e.g., if a ticker had no valid periods)
+    initial_rows = len(momentum_df)
+    momentum_df = momentum_df.dropna(subset=columns, how='all').reset_index(drop=True)
+    return momentum_df, RankIndex(momentum_df, columns, column_formats(columns)), initial_rows - len(momentum_df)
@@ -0,0 +1,83 @@
+"""
+Sector and sub-industry aggregation of the momentum table.
+"""
+import pandas as pd
+
+from .momentum import MOMENTUM_HORIZONS
+
+# Grouping levels offered in the app, mapped to MetadataStore fields.
+GROUP_LEVELS = {
+    'Sector': 'sector',
+    'Sub-Industry': 'industry',  # GICS Sub-Industry from the Wikipedia table
+}
+GROUP_STATS = ('Mean', 'Median', 'Breadth', 'Dispersion')
+
+
+def get_sector_map(store, tickers):
+    """
+    Returns a DataFrame indexed by ticker with the 'sector' and 'industry' columns
+    held by the MetadataStore `store` ('Unknown' where it has nothing).
+    """
+    sector_map = pd.DataFrame(
+        [{'sector': store.get(t).get('sector'), 'industry': store.get(t).get('industry')} for t in tickers],
+        index=pd.Index(tickers, name='Ticker'),
+    )
+    return sector_map.fillna('Unknown')
+
+
+def aggregate_group_momentum(momentum_df, sector_map, level='sector', columns=None):
+    """
+    Summarizes momentum per sector (or sub-industry) with one groupby.
+
+    Args:
+        momentum_df (pd.DataFrame): Output of calculate_momentum_for_all.
+        sector_map (pd.DataFrame): Ticker-indexed 'sector'/'industry' columns, see get_sector_map.
+        level (str): Column of `sector_map` to group by.
+        columns (list, optional): Momentum columns to summarize. Defaults to all MOMENTUM_HORIZONS.
+
+    Returns:
+        tuple: (summary, members). `summary` is indexed by group with a 'Members'
+               count and, per horizon, the equal-weighted 'Mean', 'Median',
+               'Breadth' (share of members that are up) and 'Dispersion'
+               (cross-sectional standard deviation), in (horizon, stat) columns.
+               `members` is `momentum_df` joined with `level`, for drill-down.
+    """
+    if columns is None:
+        columns = list(MOMENTUM_HORIZONS)
+
+    members = momentum_df.join(sector_map[level], on='Ticker')
+    members[level] = members[level].fillna('Unknown')
+
+    values = members[columns]
+    # 1.0 when up, 0.0 when flat or down, NaN when the horizon is missing
+    is_up = (values > 0).astype(float).where(values.notna())
+    up_columns = [f"{col} up" for col in columns]
+    grouped = pd.concat([values, is_up.set_axis(up_columns, axis=1)], axis=1).groupby(members[level])
+
+    moments = grouped[columns].agg(['mean', 'median', 'std'])
+    breadth = grouped[up_columns].mean()
+
+    summary = pd.DataFrame({('Members', ''): grouped.size()})
+    for col, up_col in zip(columns, up_columns):
+        summary[(col, 'Mean')] = moments[(col, 'mean')]
+        summary[(col, 'Median')] = moments[(col, 'median')]
+        summary[(col, 'Breadth')] = breadth[up_col]
+        summary[(col, 'Dispersion')] = moments[(col, 'std')]
+    summary.columns = pd.MultiIndex.from_tuples(summary.columns)
+    summary.index.name = level
+    return summary, members
+
+
+def format_group_summary(summary, sort_column, ascending=False, formats=None):
+    """
+    Sorts a group summary by the mean of `sort_column` and formats it for display:
+    percentages, except for the mean, median and dispersion of columns that
+    `formats` maps to another format string. Breadth is always a percentage.
+    """
+    formats = formats or {}
+    ordered = summary.sort_values((sort_column, 'Mean'), ascending=ascending)
+    formatted = pd.DataFrame({'Members': ordered['Members']}, index=ordered.index)
+    for col, stat in ordered.columns.drop('Members', level=0):
+        fmt = formats.get(col, '{:.2%}') if stat != 'Breadth' else '{:.2%}'
+        formatted[f"{col} {stat}"] = ordered[(col, stat)].apply(lambda x: fmt.format(x) if pd.notna(x) else "N/A")
+    return formatted
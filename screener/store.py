@@ -0,0 +1,710 @@
+"""
+On-disk OHLCV price store with incremental downloads, and the in-memory window
+cache shared by every consumer of the store.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import json
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .instrumentation import span
+from .downloads import DOWNLOAD_BATCH_SIZE, DOWNLOAD_RETRIES, DOWNLOAD_WORKERS, NO_DATA, DownloadScheduler
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Directory holding the on-disk price store; override with the PRICE_STORE_DIR environment variable.
+PRICE_STORE_DIR = os.environ.get(
+    'PRICE_STORE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.price_store')
+)
+# Intervals whose bars are keyed by calendar date and can be topped up incrementally.
+STORE_INTERVALS = ('1d', '5d', '1wk', '1mo', '3mo')
+# Most tickers loaded (and screened) at once; each chunk is downloaded in batches of DOWNLOAD_BATCH_SIZE
+DOWNLOAD_CHUNK_SIZE = 250
+# Counters of PriceStore.stats, set by every load
+LOAD_STATS = ('from_disk', 'topped_up', 'extended', 'full_downloads', 'requests', 'retried', 'downloaded_rows', 'failed')
+
+
+def period_start(period, today=None):
+    """
+    Translates a yfinance period string (e.g. '3mo', '1y', 'ytd', 'max') into the
+    calendar date the period starts on.
+    """
+    today = pd.Timestamp(today if today is not None else datetime.now()).normalize()
+    if period == 'ytd':
+        return today.replace(month=1, day=1)
+    if period == 'max':
+        return pd.Timestamp('1900-01-01')
+
+    match = re.fullmatch(r'(\d+)(d|wk|mo|y)', period)
+    if not match:
+        raise ValueError(f"Unsupported period: {period!r}")
+    count, unit = int(match.group(1)), match.group(2)
+    offsets = {
+        'd': pd.DateOffset(days=count),
+        'wk': pd.DateOffset(weeks=count),
+        'mo': pd.DateOffset(months=count),
+        'y': pd.DateOffset(years=count),
+    }
+    return today - offsets[unit]
+
+
+def yfinance_downloader(tickers, start, end=None, interval='1d'):
+    """
+    Default data source for PriceStore: downloads bars from `start` (inclusive) to
+    `end` (exclusive, None for today) with yfinance.
+    """
+    import yfinance as yf  # Imported lazily: it is slow to import and unused when reading from disk
+
+    return yf.download(tickers, start=start, end=end, interval=interval, progress=False, actions=False)
+
+
+class PriceStore:
+    """
+    On-disk OHLCV store: one long-format Parquet table per interval, keyed by
+    ticker and date, and a JSON manifest that records, per ticker, the earliest
+    date requested from the data source and the last stored bar.
+
+    `load` serves the requested window from disk and asks the data source only for
+    what is missing: tickers never seen before get the full window, everything else
+    gets the tail from its second-to-last stored bar onward. That overlap both
+    refreshes a bar stored mid-session and detects split/dividend adjustments, in
+    which case the ticker is reloaded in full. `read_window` serves from disk alone.
+
+    Only the tickers asked for are read from the table, and bars written by a
+    load are set aside in a staging file of their own until `flush` merges them
+    into the table a row group at a time, so memory use depends on the tickers
+    of one load rather than on the size of the table.
+
+    Several stores (threads or processes) can load into the same directory:
+    `flush` holds a lock file while it merges its bars into the table and its
+    manifest entries into the manifest as they are on disk at that moment, so
+    each writer keeps the tickers written by the others.
+
+    The `downloader` callable takes (tickers, start, end=None, interval='1d') and
+    returns a yfinance-shaped DataFrame, so a fake source can stand in for yfinance.
+    Downloads run through a DownloadScheduler: batches of `batch_size` tickers,
+    `workers` at a time, with up to `retries` retries of the tickers that fail.
+    Tickers still failing are served from disk if stored and recorded in
+    `failed`; everything downloaded is kept, so a later load only requests them.
+    """
+
+    MANIFEST_NAME = 'manifest.json'
+    LOCK_NAME = 'store.lock'
+    # Age after which a staging file is taken to be left over by a writer that never flushed
+    STAGING_MAX_AGE = timedelta(days=1)
+    TABLE_NAME = 'prices.parquet'
+    # Rows per row group of the table, the unit it is read and rewritten in
+    ROW_GROUP_SIZE = 65536
+    # Relative change in an already-final close above which history is considered re-adjusted
+    ADJUSTMENT_TOLERANCE = 1e-6
+
+    def __init__(self, root=PRICE_STORE_DIR, interval='1d', downloader=None, batch_size=DOWNLOAD_BATCH_SIZE,
+                 workers=DOWNLOAD_WORKERS, retries=DOWNLOAD_RETRIES):
+        self.interval = interval
+        self.directory = os.path.join(root, interval)
+        self.downloader = downloader or yfinance_downloader
+        self.scheduler = DownloadScheduler(self.downloader, batch_size, workers, retries)
+        os.makedirs(self.directory, exist_ok=True)
+        self.manifest = self._read_manifest()
+        self.stats = {}
+        self.failed = {}  # Ticker -> reason its download failed in the last load
+        self._frames = {}  # Ticker -> Date-indexed frame read or written by the current load
+        self._written = set()  # Tickers whose frames were written and not yet staged
+        self._staged = {}  # Ticker -> staging file holding its latest bars not yet merged into the table
+        self._stage_count = 0  # Staging files written, to name the next one
+        self._checked = set()  # Tickers found up to date since the last flush
+
+    # --- Disk I/O ---
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.directory, self.MANIFEST_NAME)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_atomic(self, path, write):
+        # Write to a temporary file first so concurrent readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    def _save_manifest(self):
+        def write(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump(self.manifest, f, indent=1, sort_keys=True)
+        self._write_atomic(os.path.join(self.directory, self.MANIFEST_NAME), write)
+
+    def _table_path(self):
+        return os.path.join(self.directory, self.TABLE_NAME)
+
+    def _read_rows(self, path, tickers, start=None, fields=None):
+        """
+        Reads the rows of `tickers` (from `start` on) from the long-format table
+        at `path`, a row group at a time, skipping the row groups whose ticker
+        range holds none of them. Returns a pyarrow Table, or None if there is
+        no readable table.
+        """
+        try:
+            parquet_file = pq.ParquetFile(path)
+        except (OSError, ValueError):
+            return None
+        names = parquet_file.schema_arrow.names
+        columns = None if fields is None else ['Ticker', 'Date'] + [field for field in fields if field in names]
+        wanted = sorted(tickers)
+        value_set = pa.array(wanted, pa.string())
+        ticker_column = names.index('Ticker')
+        parts = []
+        for i in range(parquet_file.metadata.num_row_groups):
+            statistics = parquet_file.metadata.row_group(i).column(ticker_column).statistics
+            if statistics is not None and statistics.has_min_max:
+                first = bisect_left(wanted, statistics.min)
+                if first == len(wanted) or wanted[first] > statistics.max:
+                    continue
+            group = parquet_file.read_row_group(i, columns=columns)
+            mask = pc.is_in(group['Ticker'].cast(pa.string()), value_set=value_set)
+            if start is not None:
+                mask = pc.and_(mask, pc.greater_equal(group['Date'], pa.scalar(start, group.schema.field('Date').type)))
+            parts.append(group.filter(mask))
+        if not parts:
+            return parquet_file.schema_arrow.empty_table().select(columns or names)
+        return pa.concat_tables(parts)
+
+    def _read_long(self, path, tickers, start=None, fields=None):
+        """Same as `_read_rows`, as a DataFrame."""
+        rows = self._read_rows(path, tickers, start, fields)
+        return rows.to_pandas() if rows is not None else pd.DataFrame(columns=['Ticker', 'Date'])
+
+    def _read_frames(self, tickers):
+        """Returns ticker -> stored frame for `tickers`, reading those not held in memory from disk."""
+        missing = [ticker for ticker in tickers if ticker in self.manifest and ticker not in self._frames]
+        sources = {}  # File -> tickers whose latest bars it holds
+        for ticker in missing:
+            sources.setdefault(self._staged.get(ticker, self._table_path()), []).append(ticker)
+        for path, group in sources.items():
+            for ticker, rows in self._read_long(path, group).groupby('Ticker', sort=False):
+                self._frames[ticker] = rows.drop(columns='Ticker').set_index('Date')
+        return {ticker: self._frames[ticker] for ticker in tickers if ticker in self._frames}
+
+    def read(self, ticker):
+        """Returns all stored bars for `ticker`, or None if nothing is stored."""
+        return self._read_frames([ticker]).get(ticker)
+
+    def write(self, ticker, frame, start):
+        """
+        Replaces the stored bars for `ticker`, recording `start` as the first
+        requested date. Changes reach the disk on `flush`.
+        """
+        self._frames[ticker] = frame
+        self._written.add(ticker)
+        entry = {
+            'start': start.strftime('%Y-%m-%d'),
+            'last': frame.index[-1].strftime('%Y-%m-%d'),
+        }
+        if 'checked' in self.manifest.get(ticker, {}):
+            entry['checked'] = self.manifest[ticker]['checked']
+        self.manifest[ticker] = entry
+
+    def mark_checked(self, ticker, when):
+        """Records that the stored bars of `ticker` were up to date with the data source at `when`."""
+        self.manifest[ticker]['checked'] = when.isoformat(timespec='seconds')
+        self._checked.add(ticker)
+
+    def checked_at(self, ticker):
+        """Returns when the stored bars of `ticker` were last found up to date, or None."""
+        checked = self.manifest.get(ticker, {}).get('checked')
+        return datetime.fromisoformat(checked) if checked else None
+
+    def _written_table(self):
+        frames = {ticker: self._frames[ticker] for ticker in self._written}
+        return pa.Table.from_pandas(pd.concat(frames, names=['Ticker', 'Date']).reset_index(), preserve_index=False)
+
+    def _stage(self):
+        """Moves the frames written since the last call out of memory, into a staging file."""
+        if not self._written:
+            return
+        path = os.path.join(self.directory, f"staged.{os.getpid()}.{id(self)}.{self._stage_count}.parquet")
+        pq.write_table(self._written_table(), path)
+        self._stage_count += 1
+        for ticker in self._written:
+            self._staged[ticker] = path
+        self._written = set()
+
+    def _merged_batches(self, table_file, written):
+        """Yields the table on disk without the rows rewritten since, then the staged and `written` bars."""
+        if table_file is not None:
+            replaced = pa.array(sorted(set(self._staged) | self._written), pa.string())
+            for batch in table_file.iter_batches(batch_size=self.ROW_GROUP_SIZE):
+                batch = pa.Table.from_batches([batch])
+                yield batch.filter(pc.invert(pc.is_in(batch['Ticker'].cast(pa.string()), value_set=replaced)))
+        sources = {}  # Staging file -> tickers whose latest bars it holds
+        for ticker, path in self._staged.items():
+            if ticker not in self._written:
+                sources.setdefault(path, []).append(ticker)
+        for path, group in sources.items():
+            yield self._read_rows(path, group)
+        if written is not None:
+            yield written
+
+    @staticmethod
+    def _conform(batch, schema):
+        """Casts `batch` to `schema`, adding the fields it lacks as nulls."""
+        columns = [batch[field.name].cast(field.type) if field.name in batch.column_names
+                   else pa.nulls(len(batch), field.type) for field in schema]
+        return pa.Table.from_arrays(columns, schema=schema)
+
+    def _merge(self):
+        """Rewrites the table with the staged and written bars, streaming it a row group at a time."""
+        try:
+            table_file = pq.ParquetFile(self._table_path())
+        except (OSError, ValueError):
+            table_file = None  # Missing or unreadable: rebuilt from the bars written since
+        written = self._written_table() if self._written else None
+        staged_paths = set(self._staged.values())
+        schemas = [pq.read_schema(path) for path in sorted(staged_paths)]
+        if table_file is not None:
+            schemas.insert(0, table_file.schema_arrow)
+        if written is not None:
+            schemas.append(written.schema)
+        fields = list(dict.fromkeys(name for schema in schemas for name in schema.names
+                                    if name not in ('Ticker', 'Date')))
+        schema = pa.schema([('Ticker', pa.string()), ('Date', pa.timestamp('us'))]
+                           + [(field, pa.float64()) for field in fields])
+
+        def write(tmp_path):
+            with pq.ParquetWriter(tmp_path, schema) as writer:
+                for batch in self._merged_batches(table_file, written):
+                    if len(batch):
+                        writer.write_table(self._conform(batch, schema), row_group_size=self.ROW_GROUP_SIZE)
+        self._write_atomic(self._table_path(), write)
+        for path in staged_paths:
+            os.remove(path)
+        self._staged = {}
+        self._written = set()
+
+    @contextmanager
+    def _locked(self):
+        """Holds the store's lock file, so one writer at a time merges into the table and the manifest."""
+        with open(os.path.join(self.directory, self.LOCK_NAME), 'a+') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)  # Released when the file is closed
+                yield
+                return
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _merge_manifest(self, replaced):
+        """
+        Returns the manifest on disk updated with the entries of the `replaced`
+        tickers and the check times of the tickers found up to date, if the
+        stored bars they were checked against are still the ones on disk.
+        """
+        manifest = self._read_manifest()
+        for ticker in replaced:
+            manifest[ticker] = self.manifest[ticker]
+        for ticker in self._checked - replaced:
+            entry, ours = manifest.get(ticker), self.manifest[ticker]
+            if entry is None:
+                manifest[ticker] = ours
+            elif (entry['start'], entry['last']) == (ours['start'], ours['last']):
+                entry['checked'] = max(entry.get('checked', ''), ours['checked'])
+        return manifest
+
+    def _remove_stale_staging(self):
+        cutoff = (datetime.now() - self.STAGING_MAX_AGE).timestamp()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.startswith('staged.') and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def flush(self):
+        """
+        Merges the bars written since the last flush into the table, then the
+        changed manifest entries into the manifest, under the store's lock.
+        """
+        replaced = set(self._staged) | self._written
+        if replaced or self._checked:
+            with self._locked():
+                if replaced:
+                    self._merge()
+                self.manifest = self._merge_manifest(replaced)
+                self._save_manifest()
+                self._remove_stale_staging()
+        self._checked = set()
+        self._frames = {}
+
+    def read_window(self, tickers, start, fields=None):
+        """
+        Returns a yfinance-shaped DataFrame (columns: field x ticker) with the
+        stored bars of `tickers` from `start` onward, without contacting the data
+        source. `fields` (e.g. ['Close']) limits the price fields returned.
+        """
+        start = pd.Timestamp(start)
+        held = [ticker for ticker in tickers if ticker in self._frames]
+        parts = []
+        if held:
+            # Frames hold the bars of the current load, flushed or not
+            table = pd.concat({ticker: self._frames[ticker] for ticker in held}, names=['Ticker', 'Date']).reset_index()
+            parts.append(table[table['Date'] >= start])
+        sources = {}  # File -> tickers whose latest bars it holds
+        for ticker in tickers:
+            if ticker in self.manifest and ticker not in self._frames:
+                sources.setdefault(self._staged.get(ticker, self._table_path()), []).append(ticker)
+        for path, group in sources.items():
+            parts.append(self._read_long(path, group, start, fields))
+        parts = [part for part in parts if not part.empty]
+        if not parts:
+            return pd.DataFrame()
+        window = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+        if fields is not None:
+            window = window[['Ticker', 'Date'] + [field for field in fields if field in window.columns]]
+        wide = window.set_index(['Date', 'Ticker']).unstack('Ticker').sort_index(axis=1).sort_index()
+        wide.columns.names = ['Price', 'Ticker']
+        return wide
+
+    def last_date(self, ticker):
+        """Returns the date of the last stored bar for `ticker`, or None."""
+        entry = self.manifest.get(ticker)
+        return pd.Timestamp(entry['last']) if entry else None
+
+    # --- Incremental loading ---
+
+    def _fetch(self, tickers, start, end=None, retry_empty=True):
+        """Downloads through the scheduler; returns (frames, failed) as `DownloadScheduler.run` does."""
+        frames, failed = self.scheduler.run(tickers, start, end, self.interval, retry_empty)
+        for key in ('requests', 'retried', 'downloaded_rows'):
+            self.stats[key] += self.scheduler.stats[key]
+        return frames, failed
+
+    def load(self, tickers, period, fields=None):
+        """
+        Returns a yfinance-shaped DataFrame (columns: field x ticker) covering
+        `period` for `tickers`, downloading only the bars missing from disk.
+        `fields` limits the price fields returned, as in `read_window`.
+        """
+        return self.load_window(tickers, period_start(period), fields)
+
+    def load_window(self, tickers, start, fields=None, flush=True, fresh_for=None):
+        """
+        Same as `load`, for a window beginning on the date `start`. Tickers stored
+        with a later first requested date only get the missing head segment.
+        With `flush=False` new bars are staged on disk until `flush` is called,
+        so that loading a universe in chunks rewrites the table once. Tickers found
+        up to date less than `fresh_for` (a timedelta) ago are not topped up, so
+        reloading after a partial failure only requests the tickers that failed.
+        """
+        start = pd.Timestamp(start)
+        now = datetime.now()
+        self.stats = dict.fromkeys(LOAD_STATS, 0)
+        self.failed = {}
+
+        stored = {}
+        needs_full = []
+        tail_groups = {}  # anchor date -> tickers topped up from that date
+        frames = self._read_frames(tickers)  # One pass over the table for the whole chunk
+        for ticker in tickers:
+            frame = frames.get(ticker)
+            if frame is None or frame.empty:
+                needs_full.append(ticker)
+                continue
+            stored[ticker] = frame
+            checked = self.checked_at(ticker)
+            if fresh_for is not None and checked is not None and now - checked < fresh_for:
+                self.stats['from_disk'] += 1
+                continue
+            anchor = frame.index[-2] if len(frame) >= 2 else frame.index[-1]
+            tail_groups.setdefault(anchor, []).append(ticker)
+
+        for anchor, group in tail_groups.items():
+            fresh, failed = self._fetch(group, anchor)
+            for ticker in group:
+                old = stored[ticker]
+                new = fresh.get(ticker)
+                if new is None or new.empty:
+                    # Still failing after the retries: serve the stored bars
+                    self.failed[ticker] = failed.get(ticker, NO_DATA)
+                    self.stats['from_disk'] += 1
+                    continue
+                if anchor in new.index and len(old) >= 2:
+                    old_close, new_close = old.at[anchor, 'Close'], new.at[anchor, 'Close']
+                    if abs(new_close - old_close) > self.ADJUSTMENT_TOLERANCE * abs(old_close):
+                        # History was re-adjusted (split or dividend): reload this ticker in full
+                        del stored[ticker]
+                        needs_full.append(ticker)
+                        continue
+                if not new.columns.isin(old.columns).all():
+                    # The source now returns a field the stored bars lack: reload this ticker in full
+                    del stored[ticker]
+                    needs_full.append(ticker)
+                    continue
+                self.mark_checked(ticker, now)
+                cols = new.columns.intersection(old.columns, sort=False)
+                overlap = old.reindex(new.index)[cols]
+                if np.array_equal(overlap.to_numpy(dtype=float), new[cols].to_numpy(dtype=float), equal_nan=True):
+                    # Nothing changed since the last load, so skip rewriting the file
+                    self.stats['from_disk'] += 1
+                    continue
+                merged = pd.concat([old[old.index < new.index[0]], new])
+                self.write(ticker, merged, pd.Timestamp(self.manifest[ticker]['start']))
+                stored[ticker] = merged
+                self.stats['topped_up'] += 1
+
+        # Tickers first requested for a narrower window only need the older head segment
+        head_groups = {}  # first requested date -> tickers extended back from that date
+        for ticker in stored:
+            covered_from = pd.Timestamp(self.manifest[ticker]['start'])
+            if covered_from > start:
+                head_groups.setdefault(covered_from, []).append(ticker)
+
+        for covered_from, group in head_groups.items():
+            # No bars before a ticker's listing is a valid answer, so empty heads are not retried
+            fresh, failed = self._fetch(group, start, end=covered_from, retry_empty=False)
+            for ticker in group:
+                if failed.get(ticker, NO_DATA) != NO_DATA:
+                    # Keep the narrower start, so the head is requested again next time
+                    self.failed[ticker] = failed[ticker]
+                    continue
+                old = stored[ticker]
+                head = fresh.get(ticker)
+                if head is not None and not head.empty:
+                    old = pd.concat([head[head.index < old.index[0]], old])
+                self.write(ticker, old, start)
+                stored[ticker] = old
+                self.stats['extended'] += 1
+
+        if needs_full:
+            fresh, failed = self._fetch(needs_full, start)
+            for ticker, frame in fresh.items():
+                self.write(ticker, frame, start)
+                self.mark_checked(ticker, now)
+                stored[ticker] = frame
+                self.stats['full_downloads'] += 1
+            for ticker, reason in failed.items():
+                self.failed[ticker] = reason
+                frame = self.read(ticker)
+                if frame is not None and not frame.empty:
+                    stored[ticker] = frame  # Re-adjusted history that could not be reloaded, served as stored
+
+        self.stats['failed'] = len(self.failed)
+        window = self.read_window(list(stored), start, fields)
+        if flush:
+            self.flush()
+        else:
+            self._stage()
+            self._frames = {}
+        return window
+
+
+class ChunkLoader:
+    """
+    Loads a ticker universe chunk by chunk through a PriceStore for the window
+    beginning on `start`, as the app and the CLI both do: the store keeps new
+    bars in memory until `flush`, so its table is rewritten once, and the
+    `stats` and `failed` tickers of every chunk are added up.
+
+    Without a store, or once it fails with an OSError (recorded in `warnings`),
+    chunks are downloaded in full from the data source. With `offline` they
+    are only read from the store, and a chunk loaded before is read back from
+    the store rather than loaded again.
+    """
+
+    def __init__(self, store, start, fields=None, fresh_for=None, offline=False, downloader=None, interval='1d'):
+        self.store = store
+        self.start = pd.Timestamp(start)
+        self.fields = fields
+        self.fresh_for = fresh_for
+        self.offline = offline
+        self.downloader = downloader or (store.downloader if store is not None else yfinance_downloader)
+        self.interval = store.interval if store is not None else interval
+        self.stats = dict.fromkeys(LOAD_STATS, 0)
+        self.failed = {}  # Ticker -> reason its download failed
+        self.served = 0  # Tickers the store returned with bars, stored or downloaded
+        self.warnings = []  # Store errors, as messages for the user
+        self._loaded = set()
+
+    def load(self, chunk):
+        """Returns the yfinance-shaped prices of the tickers in `chunk` (possibly empty)."""
+        if self.store is not None:
+            try:
+                if self.offline or tuple(chunk) in self._loaded:
+                    with span('store.read', tickers=len(chunk)) as s:
+                        data_df = self.store.read_window(chunk, self.start, fields=self.fields)
+                        s.set(rows=len(data_df))
+                    return data_df
+                with span('store.load', tickers=len(chunk)) as s:
+                    data_df = self.store.load_window(chunk, self.start, fields=self.fields, flush=False,
+                                                     fresh_for=self.fresh_for)
+                    s.set(rows=len(data_df))
+                self._loaded.add(tuple(chunk))
+                for key in LOAD_STATS:
+                    self.stats[key] += self.store.stats[key]
+                self.failed.update(self.store.failed)
+                if not data_df.empty:
+                    self.served += data_df.columns.get_level_values('Ticker').nunique()
+                return data_df
+            except OSError as e:
+                self.warnings.append(f"Local price store unavailable ({e}). Downloading the full period instead.")
+                self.store = None
+        if self.offline:
+            return pd.DataFrame()
+        with span('store.download', tickers=len(chunk)) as s:
+            data_df = self.downloader(chunk, start=self.start.strftime('%Y-%m-%d'), interval=self.interval)
+            s.set(rows=len(data_df) if data_df is not None else 0)
+        return data_df if data_df is not None else pd.DataFrame()
+
+    def flush(self):
+        """Writes the bars downloaded so far to the store."""
+        if self.store is None:
+            return
+        try:
+            self.store.flush()
+        except OSError as e:
+            self.warnings.append(f"Could not save the downloaded bars to the local price store ({e}).")
+
+
+class WindowCache:
+    """
+    In-memory cache holding the widest window downloaded so far per ticker universe
+    and interval, shared by every session of the app.
+
+    A request for a window inside the cached one is answered with a row slice of
+    the cached frame, without copying or downloading anything. Only a wider window
+    (or an expired entry) calls `fetch(start)`, which is expected to download just
+    the missing segment, e.g. through PriceStore.load_window. A window missing
+    some of its tickers (their downloads failed) expires after `retry_after`
+    instead of `ttl`. Returned frames are shared and must be treated as read-only.
+
+    Given a `refresh` callable as well, an expired window is served as it is while
+    a background thread reloads it (stale-while-revalidate); the reloaded frame
+    replaces it in one assignment, so readers get either the old or the new one.
+    Every returned frame carries the time its window was loaded in
+    `attrs['loaded_at']`, so results derived from it can be keyed on the exact
+    snapshot they were computed from.
+    """
+
+    def __init__(self, ttl=timedelta(hours=4), retry_after=timedelta(minutes=5)):
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self._entries = {}  # (tickers, interval) -> (start, data, loaded_at, complete)
+        self._refreshers = {}  # (tickers, interval) -> refresh callable last passed to `get`
+        self._refreshing = set()  # Keys being reloaded by `refresh`
+        self._lock = threading.Lock()  # Guards the dicts above; never held during a download
+        self._key_locks = {}  # (tickers, interval) -> lock held while that window is downloaded
+
+    @staticmethod
+    def _entry(tickers, start, data):
+        loaded_at = datetime.now()
+        data.attrs['loaded_at'] = loaded_at  # Carried over to every slice handed out
+        complete = data.empty or set(tickers) <= set(data.columns.get_level_values(-1))
+        return start, data, loaded_at, complete
+
+    def _expired(self, entry):
+        return datetime.now() - entry[2] > (self.ttl if entry[3] else self.retry_after)
+
+    def get(self, tickers, period, interval, fetch, refresh=None):
+        """
+        Returns data for `tickers` covering `period`, calling `fetch(start)` only if
+        the cached window does not reach back far enough or, without `refresh`,
+        has expired. `refresh(start)` loads like `fetch` but must be safe to call
+        from a background thread, i.e. must not touch the UI; see `refresh`.
+        """
+        key = (tuple(tickers), interval)
+        with self._lock:
+            if refresh is not None:
+                self._refreshers[key] = refresh
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # Downloads run outside the shared lock: only callers of the same window wait for one
+        with key_lock:
+            start = period_start(period)
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and self._expired(entry):
+                    if refresh is not None:
+                        if key not in self._refreshing:
+                            threading.Thread(target=self._refresh_quietly, args=(tickers, interval),
+                                             daemon=True).start()
+                    else:
+                        # Refresh the whole window held so far, not just the requested one
+                        start = min(start, entry[0])
+                        entry = None
+            if entry is None or start < entry[0]:
+                entry = self._entry(tickers, start, fetch(start))
+                if not entry[1].empty:  # Never hold on to a failed download
+                    with self._lock:
+                        self._entries[key] = entry
+
+        data = entry[1]
+        if data.empty:
+            return data
+        return data.iloc[data.index.searchsorted(period_start(period)):]
+
+    def refresh(self, tickers, interval):
+        """
+        Reloads the whole cached window of `tickers` on the calling thread with the
+        `refresh` callable last passed to `get` for it, and swaps the result in.
+        Returns whether it did; nothing happens if the window is not cached, has
+        no refresh callable or is being refreshed already. A failed or empty
+        reload leaves the cached window in place (errors propagate).
+        """
+        key = (tuple(tickers), interval)
+        with self._lock:
+            entry, refresh = self._entries.get(key), self._refreshers.get(key)
+            if entry is None or refresh is None or key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+        try:
+            with span('window.refresh', tickers=len(tickers), interval=interval) as s:
+                data = refresh(entry[0])
+                s.set(rows=len(data))
+        except Exception:
+            with self._lock:
+                self._refreshing.discard(key)
+            raise
+        with self._lock:
+            self._refreshing.discard(key)
+            current = self._entries.get(key)
+            if data.empty or (current is not None and current[0] < entry[0]):
+                return False  # Keep the old window, or a wider one loaded in the meantime
+            self._entries[key] = self._entry(tickers, entry[0], data)
+        return True
+
+    def _refresh_quietly(self, tickers, interval):
+        try:
+            self.refresh(tickers, interval)
+        except Exception:
+            pass  # The stale window stays in place and is retried on a later request
+
+    def refreshing(self, tickers, interval):
+        """Returns whether the cached window for `tickers` is being reloaded."""
+        return (tuple(tickers), interval) in self._refreshing
+
+    def loaded_at(self, tickers, interval):
+        """Returns when the cached window for `tickers` was last loaded, or None."""
+        entry = self._entries.get((tuple(tickers), interval))
+        return entry[2] if entry is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,87 @@
+"""
+Chunked screening of large universes.
+
+Tickers are loaded in bounded-size chunks and each chunk is reduced to its rows
+of the momentum table before the next one is loaded, so peak memory depends on
+the chunk size rather than on the size of the universe. Every chunk is computed
+on the same trading-day calendar, so the merged table, and the rankings built
+over it, are identical to a single pass over the whole universe.
+"""
+import pandas as pd
+
+from .instrumentation import span
+from .momentum import MAX_STALENESS, MOMENTUM_HORIZONS
+from .ranking import calculate_columns, snapshot_from_momentum
+from .store import DOWNLOAD_CHUNK_SIZE
+
+
+def iter_chunks(tickers, size=DOWNLOAD_CHUNK_SIZE):
+    """Yields consecutive lists of at most `size` tickers."""
+    tickers = list(tickers)
+    for i in range(0, len(tickers), size):
+        yield tickers[i:i + size]
+
+
+def stream_snapshot(tickers, load_chunk, columns=None, chunk_size=DOWNLOAD_CHUNK_SIZE,
+                    max_staleness=MAX_STALENESS, stale='exclude', progress=None):
+    """
+    Builds the same (momentum_df, rank_index, excluded) as `build_momentum_snapshot`
+    over the whole of `tickers`, holding the prices of one chunk at a time.
+
+    The calendar is the union of the dates seen so far and each chunk is
+    computed on it. Horizons and indicator windows count rows of that calendar,
+    so a chunk computed before a later chunk added dates to it is loaded and
+    computed again at the end. With daily bars from one exchange that does not
+    happen in practice.
+
+    Args:
+        tickers (list): Tickers to screen.
+        load_chunk (callable): Takes a list of tickers and returns their
+                               yfinance-shaped prices (possibly empty or
+                               None). If a chunk reloaded for the final
+                               calendar comes back without prices, its
+                               first results are kept.
+        columns (list, optional): Momentum horizons and indicators to compute.
+                                  Defaults to all MOMENTUM_HORIZONS.
+        chunk_size (int): Tickers per chunk.
+        max_staleness (pd.Timedelta): See `calculate_momentum_for_all`.
+        stale (str): See `calculate_momentum_for_all`.
+        progress (callable, optional): Called with (tickers done, total) after
+                                       every chunk.
+
+    Returns:
+        tuple: (momentum_df, rank_index, excluded) as in `build_momentum_snapshot`.
+    """
+    columns = list(columns if columns is not None else MOMENTUM_HORIZONS)
+    calendar = pd.DatetimeIndex([])
+    parts = []  # [chunk, calendar it was computed on, its momentum rows]
+    done = 0
+
+    def compute(chunk, data_df):
+        with span('stream.compute', tickers=len(chunk)) as s:
+            momentum_df = calculate_columns(data_df.reindex(calendar), columns, max_staleness, stale)
+            s.set(rows=len(momentum_df))
+        return momentum_df
+
+    for chunk in iter_chunks(tickers, chunk_size):
+        data_df = load_chunk(chunk)
+        if data_df is not None and not data_df.empty:
+            calendar = calendar.union(data_df.index)
+            parts.append([chunk, calendar, compute(chunk, data_df)])
+        del data_df  # Only the momentum rows of a chunk outlive it
+        done += len(chunk)
+        if progress is not None:
+            progress(done, len(tickers))
+
+    for part in parts:
+        if not part[1].equals(calendar):
+            data_df = load_chunk(part[0])
+            if data_df is not None and not data_df.empty:  # Otherwise the rows computed first are kept
+                part[2] = compute(part[0], data_df)
+            del data_df
+
+    frames = [part[2] for part in parts if not part[2].empty]
+    if not frames:
+        return pd.DataFrame(columns=['Ticker'] + columns), None, 0
+    momentum_df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    return snapshot_from_momentum(momentum_df, columns)
@@ -0,0 +1,200 @@
+"""
+Ticker universes: a registry of constituent sources (Wikipedia index tables,
+CSV files or URLs), each backed by a cached snapshot of its last good fetch.
+"""
+import io
+import os
+import re
+
+import pandas as pd
+
+from .extract import extract_table
+from .instrumentation import span
+from .store import PRICE_STORE_DIR
+
+SP500_WIKIPEDIA_URL = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
+SP400_WIKIPEDIA_URL = 'https://en.wikipedia.org/wiki/List_of_S%26P_400_companies'
+SP600_WIKIPEDIA_URL = 'https://en.wikipedia.org/wiki/List_of_S%26P_600_companies'
+# Holdings of the iShares Russell 3000 ETF (IWV), which tracks the index
+RUSSELL3000_HOLDINGS_URL = ('https://www.ishares.com/us/products/239714/ishares-russell-3000-etf/'
+                            '1467271812596.ajax?fileType=csv&fileName=IWV_holdings&dataType=fund')
+# Directory holding the last good constituents of every universe; override with UNIVERSE_SNAPSHOT_DIR.
+UNIVERSE_SNAPSHOT_DIR = os.environ.get('UNIVERSE_SNAPSHOT_DIR', os.path.join(PRICE_STORE_DIR, 'universes'))
+# Small list used for demonstration when Wikipedia cannot be reached
+FALLBACK_TICKERS = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA', 'TSLA', 'JPM', 'V', 'PG', 'UNH']
+
+# Accepted spellings of the constituents columns, mapped to the Wikipedia S&P 500 names
+COLUMN_ALIASES = {
+    'Symbol': ('Symbol', 'Ticker symbol', 'Ticker', 'symbol', 'ticker'),
+    'Security': ('Security', 'Company', 'Name', 'name', 'company'),
+    'GICS Sector': ('GICS Sector', 'Sector', 'sector'),
+    'GICS Sub-Industry': ('GICS Sub-Industry', 'Industry', 'Sub-Industry', 'industry'),
+}
+
+
+def normalize_constituents(table):
+    """
+    Renames the columns of a constituents table to 'Symbol', 'Security', 'GICS
+    Sector' and 'GICS Sub-Industry' (whichever it has), converts symbols to
+    yfinance style (BRK.B -> BRK-B) and drops blank and duplicate symbols.
+
+    Raises:
+        ValueError: If the table has no recognizable symbol column.
+    """
+    renames = {}
+    for name, aliases in COLUMN_ALIASES.items():
+        found = next((alias for alias in aliases if alias in table.columns), None)
+        if found is not None:
+            renames[found] = name
+    if 'Symbol' not in renames.values():
+        raise ValueError(f"No symbol column found among {list(table.columns)}.")
+    table = table.rename(columns=renames)[list(renames.values())].dropna(subset=['Symbol'])
+    # yfinance uses '-' instead of '.' for some tickers (e.g., BRK.B -> BRK-B)
+    symbols = table['Symbol'].astype(str).str.strip().str.upper().str.replace('.', '-', regex=False)
+    table = table.assign(Symbol=symbols)
+    table = table[table['Symbol'].str.fullmatch(r'[A-Z0-9][A-Z0-9\-^=]*')]
+    return table.drop_duplicates('Symbol').reset_index(drop=True)
+
+
+def parse_constituents_table(html):
+    """
+    Parses the first table with a symbol column out of a Wikipedia index page,
+    reading only that table (see screener.extract.extract_table).
+    """
+    table = extract_table(html, lambda header: any(alias in header for alias in COLUMN_ALIASES['Symbol']),
+                          columns={alias for aliases in COLUMN_ALIASES.values() for alias in aliases})
+    if table is None:
+        raise ValueError("No constituents table found on the page.")
+    return normalize_constituents(table)
+
+
+def parse_constituents_csv(text):
+    """
+    Parses constituents from CSV text: a table with a symbol column, possibly
+    below a preamble (as in ETF holdings files), or a bare list of symbols one
+    per line. Holdings rows of other asset classes than equity are dropped.
+    """
+    lines = text.splitlines()
+    # Skip any preamble up to the header row
+    header = next((i for i, line in enumerate(lines)
+                   if any(re.match(rf'"?{re.escape(alias)}"?\s*(,|$)', line) for alias in COLUMN_ALIASES['Symbol'])),
+                  None)
+    if header is None:
+        table = pd.read_csv(io.StringIO(text), header=None, usecols=[0], names=['Symbol'], dtype=str,
+                            skip_blank_lines=True)
+    else:
+        table = pd.read_csv(io.StringIO('\n'.join(lines[header:])), dtype=str, on_bad_lines='skip')
+        if 'Asset Class' in table.columns:
+            table = table[table['Asset Class'] == 'Equity']
+    return normalize_constituents(table.dropna(how='all'))
+
+
+def fetch_url(url):
+    """GETs `url` with a browser User-Agent; raises for HTTP errors."""
+    import requests  # Imported lazily: only needed when the universe is fetched online
+
+    headers = {"User-Agent": "Mozilla/5.0"}
+    response = requests.get(url, headers=headers, timeout=30)
+    response.raise_for_status()
+    return response
+
+
+class WikipediaSource:
+    """Constituents from the first table with a symbol column on a Wikipedia page."""
+
+    kind = 'wikipedia'
+
+    def __init__(self, url):
+        self.url = url
+
+    def fetch(self):
+        with span('universe.fetch', source=self.kind) as s:
+            response = fetch_url(self.url)
+            constituents = parse_constituents_table(response.text)
+            s.set(bytes=len(response.content), rows=len(constituents))
+        return constituents
+
+
+class CsvSource:
+    """Constituents from a local CSV file or a CSV URL (see parse_constituents_csv)."""
+
+    kind = 'csv'
+
+    def __init__(self, path):
+        self.path = path
+
+    def fetch(self):
+        with span('universe.fetch', source=self.kind) as s:
+            if re.match(r'https?://', self.path):
+                text = fetch_url(self.path).text
+            else:
+                with open(self.path, encoding='utf-8-sig') as f:
+                    text = f.read()
+            constituents = parse_constituents_csv(text)
+            s.set(bytes=len(text), rows=len(constituents))
+        return constituents
+
+
+# Universes offered to users, by name
+UNIVERSES = {
+    'S&P 500': WikipediaSource(SP500_WIKIPEDIA_URL),
+    'S&P 400': WikipediaSource(SP400_WIKIPEDIA_URL),
+    'S&P 600': WikipediaSource(SP600_WIKIPEDIA_URL),
+    'Russell 3000': CsvSource(RUSSELL3000_HOLDINGS_URL),
+}
+
+
+def snapshot_path(name, snapshot_dir=UNIVERSE_SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_').lower() + '.csv')
+
+
+def load_universe(name, source=None, snapshot_dir=UNIVERSE_SNAPSHOT_DIR):
+    """
+    Fetches the constituents of universe `name` from `source` (default: its
+    UNIVERSES entry) and keeps them as the universe's snapshot. If the fetch
+    fails, the last snapshot is served instead.
+
+    Returns:
+        tuple: (constituents, origin) where `origin` is the source kind, or
+               'snapshot' when the snapshot was served.
+
+    Raises:
+        Exception: The fetch error, if there is no snapshot to fall back to.
+    """
+    source = source or UNIVERSES[name]
+    path = snapshot_path(name, snapshot_dir)
+    try:
+        constituents = source.fetch()
+    except Exception:
+        if not os.path.exists(path):
+            raise
+        with span('universe.snapshot', source=source.kind) as s:
+            constituents = pd.read_csv(path, dtype=str)
+            s.set(rows=len(constituents))
+        return constituents, 'snapshot'
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        constituents.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass  # The snapshot is a convenience; the fetched constituents are still good
+    return constituents, source.kind
+
+
+def fetch_sp500_constituents(url=SP500_WIKIPEDIA_URL):
+    """
+    Fetches the S&P 500 constituents table from Wikipedia.
+    Handles the '.' to '-' replacement for compatibility with yfinance.
+
+    Returns:
+        pd.DataFrame: The constituents table, with yfinance-style tickers in
+                      'Symbol' alongside 'Security', 'GICS Sector' and
+                      'GICS Sub-Industry'.
+    """
+    return WikipediaSource(url).fetch()
+
+
+def parse_sp500_constituents(html):
+    """Parses the constituents table out of the Wikipedia page `html` (see fetch_sp500_constituents)."""
+    return parse_constituents_table(html)
@@ -0,0 +1,224 @@
+"""
+Stale-while-revalidate datasets and the background thread that keeps them warm.
+
+Readers are always served the last good snapshot of a dataset at once. When
+the snapshot has expired, a refresh runs in a background thread and its result
+replaces the snapshot in a single assignment once it is complete, so a reader
+sees either the old snapshot or the new one and never waits for the network;
+a failed refresh leaves the old snapshot in place. The CacheWarmer refreshes
+registered datasets shortly before they expire and at fixed times of the
+trading day, so that most expiries never reach a reader at all.
+"""
+from datetime import datetime, time, timedelta
+import threading
+from zoneinfo import ZoneInfo
+
+from .instrumentation import span
+
+# Time zone of the exchange whose session the refresh times follow
+MARKET_TIMEZONE = 'America/New_York'
+# Times of day (market time, weekdays) at which every dataset is refreshed: after the close, before the open
+REFRESH_TIMES = (time(16, 30), time(9, 0))
+# How long before its expiry a dataset is refreshed
+REFRESH_LEAD = timedelta(minutes=15)
+# How long the warmer waits before trying a failed refresh again
+RETRY_DELAY = timedelta(minutes=10)
+
+
+def format_age(age):
+    """Formats a timedelta as a short age such as '45 s', '12 min', '3 h 5 min' or '2 days'."""
+    seconds = int(age.total_seconds())
+    if seconds < 60:
+        return f"{seconds} s"
+    if seconds < 3600:
+        return f"{seconds // 60} min"
+    if seconds < 86400:
+        hours, minutes = divmod(seconds // 60, 60)
+        return f"{hours} h {minutes} min" if minutes else f"{hours} h"
+    days = seconds // 86400
+    return f"{days} day{'s' if days > 1 else ''}"
+
+
+class Refreshable:
+    """
+    The last good value of `load()`, kept for `ttl` and refreshed in the
+    background after that. `load` must not touch the UI, as it may run on a
+    background thread.
+    """
+
+    def __init__(self, load, ttl, name='dataset'):
+        self.load = load
+        self.ttl = ttl
+        self.name = name
+        self.error = None  # The exception of the last failed refresh, if it failed
+        self._snapshot = None  # (value, loaded_at), replaced as a whole
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def loaded_at(self):
+        snapshot = self._snapshot
+        return snapshot[1] if snapshot is not None else None
+
+    @property
+    def refreshing(self):
+        return self._refresh_lock.locked()
+
+    def get(self):
+        """
+        Returns the current value, loading it first if there is none yet (in which
+        case errors propagate). An expired value is returned as it is while a
+        background refresh replaces it.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.refresh()
+        if datetime.now() - snapshot[1] > self.ttl:
+            self.refresh_in_background()
+        return snapshot[0]
+
+    def refresh(self):
+        """
+        Loads a new value and swaps it in, unless a refresh is already running, in
+        which case this waits for it. Returns the current value afterwards.
+
+        Raises:
+            Exception: The error of `load`, if there is no previous value to keep.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            with self._refresh_lock:  # Another thread is refreshing: wait for its result
+                pass
+        else:
+            try:
+                with span('warm.refresh', dataset=self.name):
+                    value = self.load()
+                self._snapshot = (value, datetime.now())
+                self.error = None
+            except Exception as e:
+                self.error = e
+                if self._snapshot is None:
+                    raise
+            finally:
+                self._refresh_lock.release()
+        if self._snapshot is None:
+            raise self.error
+        return self._snapshot[0]
+
+    def refresh_in_background(self):
+        """Starts a daemon thread running `refresh`, unless a refresh is already running."""
+        if self.refreshing or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._refresh_quietly, daemon=True)
+        self._thread.start()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception:
+            pass  # Recorded in self.error; readers keep being served the previous value
+
+
+class CacheWarmer:
+    """
+    Daemon thread refreshing registered datasets ahead of their expiry and at
+    `times` of day in `timezone` (weekdays only), checking every `poll`. A
+    dataset whose refresh failed is tried again after `retry_delay`.
+
+    A dataset is registered with `watch` under a name; registering the same name
+    again replaces it. Its `refresh` callable runs on the warmer thread, one
+    dataset at a time, so it must not touch the UI.
+    """
+
+    def __init__(self, lead=REFRESH_LEAD, times=REFRESH_TIMES, timezone=MARKET_TIMEZONE, poll=timedelta(minutes=1),
+                 retry_delay=RETRY_DELAY):
+        self.lead = lead
+        self.retry_delay = retry_delay
+        self.times = times
+        self.timezone = ZoneInfo(timezone)
+        self.poll = poll
+        self.errors = {}  # name -> (when, exception) of its last refresh, if it failed
+        self._jobs = {}  # name -> (refresh, loaded_at, ttl)
+        self._last_run = {}  # name -> when the warmer last refreshed it
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def watch(self, name, refresh, loaded_at=None, ttl=None):
+        """
+        Registers a dataset. `loaded_at` returns when it was last loaded (None if
+        never); without it, the warmer counts from its own last refresh, starting
+        now. A refresh that leaves `loaded_at` unchanged (nothing new to swap in)
+        counts as a load too, so it is not repeated on every poll. Without `ttl`
+        the dataset is only refreshed at the scheduled times.
+        """
+        with self._lock:
+            self._jobs[name] = (refresh, loaded_at, ttl)
+            if loaded_at is None:
+                self._last_run.setdefault(name, datetime.now())
+
+    def last_scheduled(self, now):
+        """Returns the latest scheduled refresh time at or before `now` (naive local time), or None."""
+        market_now = now.astimezone(self.timezone)
+        candidates = []
+        for days_back in range(7):
+            day = market_now.date() - timedelta(days=days_back)
+            if day.weekday() >= 5:
+                continue
+            for at in self.times:
+                scheduled = datetime.combine(day, at, tzinfo=self.timezone)
+                if scheduled <= market_now:
+                    candidates.append(scheduled)
+            if candidates:
+                break
+        return max(candidates).astimezone().replace(tzinfo=None) if candidates else None
+
+    def due(self, now=None):
+        """Names of the datasets that expire within the lead time or missed a scheduled refresh."""
+        now = now or datetime.now()
+        scheduled = self.last_scheduled(now)
+        with self._lock:
+            jobs = dict(self._jobs)
+            last_runs = dict(self._last_run)
+        names = []
+        for name, (_, loaded_at, ttl) in jobs.items():
+            times = [loaded_at() if loaded_at is not None else None, last_runs.get(name)]
+            last = max((t for t in times if t is not None), default=None)
+            if last is None:
+                continue  # Nothing loaded yet: the first reader loads it
+            failed = self.errors.get(name)
+            if failed is not None and now - failed[0] < self.retry_delay:
+                continue
+            if (ttl is not None and now - last >= ttl - self.lead) or (scheduled is not None and last < scheduled):
+                names.append(name)
+        return names
+
+    def run_pending(self, now=None):
+        """Refreshes every due dataset on the calling thread; returns their names."""
+        names = self.due(now)
+        for name in names:
+            with self._lock:
+                refresh = self._jobs[name][0]
+            try:
+                with span('warm.run', dataset=name):
+                    refresh()
+                self.errors.pop(name, None)
+            except Exception as e:
+                self.errors[name] = (datetime.now(), e)
+            with self._lock:
+                self._last_run[name] = datetime.now()
+        return names
+
+    def _loop(self):
+        while not self._stop.wait(self.poll.total_seconds()):
+            self.run_pending()
+
+    def start(self):
+        """Starts the warmer thread, unless it is running."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='cache-warmer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -1,10 +1,22 @@
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 from datetime import datetime, timedelta
-import io
-import requests
-from bs4 import BeautifulSoup
+import sqlite3
+import time
+
+from screener.backtest import PORTFOLIO_SIZES, REBALANCE_FREQUENCIES, format_backtest_summary, run_backtest
+from screener.closes import CLOSE_DTYPES, SharedCloseStore, load_close_matrix, ohlcv_frame_bytes
+from screener.details import iter_details, page_count, page_of
+from screener.indicators import INDICATORS, column_formats
+from screener.instrumentation import current_span, recorder, span, to_jsonl, to_prometheus
+from screener.metadata import MetadataStore
+from screener.momentum import MOMENTUM_HORIZONS, extract_close_prices
+from screener.news import NewsFetcher
+from screener.ranking import build_momentum_snapshot
+from screener.sectors import GROUP_LEVELS, aggregate_group_momentum, format_group_summary, get_sector_map
+from screener.store import STORE_INTERVALS, ChunkLoader, PriceStore, WindowCache
+from screener.universe import FALLBACK_TICKERS, UNIVERSES, load_universe, parse_constituents_csv
+from screener.warmer import CacheWarmer, Refreshable, format_age
 
 # --- Streamlit App Configuration ---
 st.set_page_config(
@@ -136,45 +148,176 @@ section[data-testid="stSidebar"] * {
 
 # --- Cell 1: Import Libraries and Define Ticker Fetching Function ---
 
-@st.cache_data(ttl=timedelta(days=1))  # Cache for 1 day to avoid frequent Wikipedia fetches
-def get_sp500_tickers():
+# Label of the uploaded watchlist option in the universe selector
+CUSTOM_WATCHLIST = "Custom Watchlist"
+
+
+def load_universe_tickers(universe, metadata_store):
+    """
+    Loads the tickers of `universe` from its source in the universe registry
+    (or its last saved list) and seeds the metadata store with its sector
+    columns. Runs on the cache warmer thread too, so it reports through its
+    result instead of the UI.
+
+    Returns:
+        tuple: (tickers, origin, seed_error) with `origin` as in load_universe and
+               `seed_error` the error of seeding the metadata store, if any.
+    """
+    constituents, origin = load_universe(universe)
+    # Keep the sector and sub-industry columns so details never need a per-ticker call for them
+    try:
+        metadata_store.seed_constituents(constituents)
+        seed_error = None
+    except (OSError, sqlite3.Error) as e:
+        seed_error = e
+    return constituents['Symbol'].tolist(), origin, seed_error
+
+
+@st.cache_resource
+def get_universe_dataset(universe='S&P 500'):
+    """Returns the process-wide constituents of `universe`, kept for a day and then refreshed in the background."""
+    metadata_store = get_metadata_store()
+    return Refreshable(lambda: load_universe_tickers(universe, metadata_store), ttl=timedelta(days=1), name=f"tickers:{universe}")
+
+
+def get_universe_tickers(universe='S&P 500'):
     """
-    Fetches the list of S&P 500 tickers from Wikipedia.
-    Handles the '. ' to '-' replacement for compatibility with yfinance.
+    Returns the tickers of `universe`. Only the first call per process waits
+    for the source; later ones get the last loaded list at once, falling back to
+    a small hardcoded list when nothing could be loaded yet.
     """
-    url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
+    dataset = get_universe_dataset(universe)
+    if dataset.loaded_at is None:
+        current_span().set(cache='miss')
     try:
-        headers = {"User-Agent": "Mozilla/5.0"}
-        html = requests.get(url, headers=headers).text
-        tables = pd.read_html(html)
-        # Assuming the first table contains the S&P 500 list
-        tickers = tables[0]['Symbol'].tolist()
-        # yfinance uses '-' instead of '.' for some tickers (e.g., BRK.B -> BRK-B)
-        return [t.replace('.', '-') for t in tickers]
+        tickers, origin, seed_error = dataset.get()
     except Exception as e:
-        st.error(f"Error fetching S&P 500 tickers from Wikipedia: {e}")
+        st.error(f"Error fetching {universe} tickers: {e}")
         st.warning("Falling back to a small hardcoded list for demonstration. Please check your internet connection or URL.")
-        # Fallback to a small list if Wikipedia parsing fails
-        return ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA', 'TSLA', 'JPM', 'V', 'PG', 'UNH']
+        # Fallback to a small list if the source cannot be parsed or reached; the next run tries again
+        return list(FALLBACK_TICKERS)
+    if origin == 'snapshot':
+        st.warning(f"Could not fetch the {universe} constituents. Using the last saved list instead.")
+    if seed_error is not None:
+        st.warning(f"Could not update the company metadata store: {seed_error}")
+    return tickers
+
+@st.cache_data
+def get_watchlist_tickers(content):
+    """Parses an uploaded watchlist (CSV with a Symbol or Ticker column, or one symbol per line)."""
+    current_span().set(cache='miss')
+    constituents = parse_constituents_csv(content.decode('utf-8-sig'))
+    try:
+        get_metadata_store().seed_constituents(constituents)
+    except (OSError, sqlite3.Error) as e:
+        st.warning(f"Could not update the company metadata store: {e}")
+    return constituents['Symbol'].tolist()
+
+# --- Cell 2: Download Daily Data for the Universe ---
+
+@st.cache_resource
+def get_window_cache(precision='float32'):
+    """Returns the process-wide WindowCache for close matrices of `precision`, shared across sessions."""
+    return WindowCache(ttl=timedelta(hours=4))  # Refresh data every 4 hours to pick up new bars
 
-# --- Cell 2: Download All S&P 500 Daily Data ---
 
-@st.cache_data(ttl=timedelta(hours=4))  # Cache data for 4 hours to reduce API calls
-def download_sp500_data(tickers, period='3mo', interval='1d'):
+@st.cache_resource
+def get_close_store():
+    """Returns the store of memory-mapped close matrices shared by sessions and worker processes."""
+    return SharedCloseStore()
+
+
+def load_closes(tickers, start, close_store, interval='1d', precision='float32', fresh_for=None, progress=None):
+    """
+    Loads the closes and volumes of `tickers` since `start` as a shared
+    `precision` matrix through the package's chunked loader, reading what it
+    can from the local price store.
+
+    Runs on background threads too (see WindowCache.refresh), so instead of
+    touching the UI it reports through its result and the `progress` callback.
+
+    Args:
+        tickers (list): Tickers to load.
+        start (pd.Timestamp): First date.
+        close_store (SharedCloseStore): Store the result is memory-mapped from.
+        interval (str): Bar interval.
+        precision (str): Key of CLOSE_DTYPES.
+        fresh_for (timedelta, optional): See PriceStore.load_window.
+        progress (callable, optional): Called with (tickers done, total) after
+                                       every chunk.
+
+    Returns:
+        tuple: (data, messages) where `messages` is a list of (level, text)
+               pairs, `level` naming the st function to show the text with.
+    """
+    store = None
+    store_error = None
+    if interval in STORE_INTERVALS:
+        try:
+            store = PriceStore(interval=interval)
+        except OSError as e:
+            store_error = f"Local price store unavailable ({e}). Downloading the full period instead."
+    loader = ChunkLoader(store, start, fields=['Close', 'Volume'], fresh_for=fresh_for, interval=interval)
+    matrix = load_close_matrix(tickers, loader, CLOSE_DTYPES[precision], close_store, progress=progress)
+
+    messages = [('warning', warning) for warning in [store_error] + loader.warnings if warning]
+    if loader.store is not None:  # Dropped by the loader if it failed
+        stats, failed = loader.stats, loader.failed
+        # Failed tickers without stored bars were neither read nor downloaded
+        messages.append(('info', f"Read {loader.served - stats['full_downloads']} tickers from the local price store "
+                                 f"({stats['downloaded_rows']} new bars downloaded, "
+                                 f"{stats['full_downloads']} tickers fetched in full)."))
+        if failed:
+            sample = ', '.join(list(failed)[:10])
+            messages.append(('warning', f"{len(failed)} tickers could not be downloaded after retries ({sample}"
+                                        f"{', ...' if len(failed) > 10 else ''}). Their stored bars are used where "
+                                        f"available, and tickers left without any are downloaded again on the next "
+                                        f"run after a few minutes."))
+    # Nothing downloaded comes back empty; the caller reports it
+    return (matrix.to_frame() if matrix is not None else pd.DataFrame()), messages
+
+
+def download_sp500_data(tickers, period='3mo', interval='1d', precision='float32'):
     """
     Downloads historical stock data for a list of tickers.
+
+    Tickers are downloaded in chunks, and each chunk is reduced to its closes
+    and volumes before the next one arrives, so the full OHLCV download is
+    never held at once. The result is a `precision` (float32 or float64) matrix
+    memory-mapped from disk so every session and worker process shares one copy.
+    Results are kept in the shared WindowCache, so switching to a shorter period
+    slices the data already in memory and a longer one only downloads the
+    missing older bars. Once the cached window expires it keeps being served
+    while a background thread reloads it.
     """
     # Check if using fallback tickers and inform the user clearly
-    if len(tickers) == 10 and tickers[0] == 'AAPL':  # Assuming the hardcoded list starts with AAPL
-        st.warning("Using a small hardcoded list of tickers due to Wikipedia fetch error. "
-                   "To see full S&P 500 results, please ensure your internet connection is stable "
-                   "and the Wikipedia URL is accessible.")
+    if list(tickers) == FALLBACK_TICKERS:
+        st.warning("Using a small hardcoded list of tickers due to a constituents fetch error. "
+                   "To see full results, please ensure your internet connection is stable "
+                   "and the constituents source is accessible.")
+    window_cache = get_window_cache(precision)
+    close_store = get_close_store()
+
+    def fetch(start):
+        current_span().set(cache='miss')
+        st.info(f"Fetching {len(tickers)} tickers...")
+        st.info(f"Downloading {interval} data since {start:%Y-%m-%d} for all tickers...")
+        progress = st.progress(0.0, text="Downloading data, this may take a moment...")
+        # Tickers refreshed within the cache TTL (before a failed download of others) are read from disk
+        data, messages = load_closes(
+            tickers, start, close_store, interval, precision, fresh_for=window_cache.ttl,
+            progress=lambda done, total: progress.progress(done / total, text=f"Downloaded {done} of {total} tickers...")
+        )
+        progress.empty()
+        for level, message in messages:
+            getattr(st, level)(message)
+        return data
 
-    st.info(f"Fetching {len(tickers)} S&P 500 tickers...")
-    st.info(f"Downloading {period} of {interval} data for all tickers...")
-    
-    with st.spinner("Downloading data, this may take a moment..."):
-        all_tickers_data = yf.download(tickers, period=period, interval=interval, progress=False, actions=False)
+    def refresh(start):
+        # Runs without a UI; a failed ticker keeps its stored bars and is reported on the next foreground load
+        return load_closes(tickers, start, close_store, interval, precision)[0]
+
+    all_tickers_data = window_cache.get(tickers, period, interval, fetch, refresh=refresh)
 
     if all_tickers_data.empty:
         st.warning("WARNING: No data downloaded. Please check ticker list and Yahoo Finance availability.")
@@ -183,116 +326,144 @@ def download_sp500_data(tickers, period='3mo', interval='1d'):
         st.success("Data download complete.")
         return all_tickers_data
 
-# --- Cell 3: Define Momentum Calculation Function ---
+# --- Cell 3: Momentum and Rankings ---
 
-def calculate_momentum_for_all(data_df):
+@st.cache_resource(max_entries=16)
+def get_momentum_snapshot(snapshot_key, _data_df, columns):
     """
-    Calculates momentum for all tickers from a single DataFrame of downloaded data.
-    This function is now separate from data downloading and can be called repeatedly
-    on the `data_df` object.
-
-    Args:
-        data_df (pd.DataFrame): DataFrame containing historical stock data,
-                                typically downloaded from yfinance.
-                                Expected format is multi-index columns (e.g., 'Close', 'Ticker').
-
-    Returns:
-        pd.DataFrame: A DataFrame with momentum results for each ticker,
-                      including 'Ticker', '1D', '1W', '1M', '2M' change.
+    Computes momentum and its RankIndex once per data snapshot, identified by
+    `snapshot_key`, and shares them across reruns and sessions (read-only).
     """
-    momentum_results = []
-
-    if data_df.empty:
-        return pd.DataFrame()
+    current_span().set(cache='miss')
+    return build_momentum_snapshot(_data_df, columns)
 
-    # Ensure data_df has a multi-level column index where one level is 'Close'
-    # yfinance.download with multiple tickers typically returns a MultiIndex (Metric, Ticker)
-    if isinstance(data_df.columns, pd.MultiIndex):
-        if 'Close' in data_df.columns.get_level_values(0):
-            close_prices_df = data_df['Close']
+@st.cache_resource(max_entries=16)
+def get_backtest(snapshot_key, _data_df, rebalance, size):
+    """
+    Runs the walk-forward backtest once per data snapshot and settings, and shares
+    the (summary, periods) result across reruns and sessions (read-only).
+    """
+    current_span().set(cache='miss')
+    return run_backtest(extract_close_prices(_data_df), rebalance=rebalance, size=size)
+
+# --- Company Metadata and Sector Momentum ---
+
+@st.cache_resource
+def get_metadata_store():
+    """Returns the process-wide MetadataStore."""
+    return MetadataStore()
+
+
+@st.cache_data
+def get_group_momentum(momentum_df, sector_map, level, columns):
+    """Cached aggregate_group_momentum for the sector view."""
+    current_span().set(cache='miss')
+    return aggregate_group_momentum(momentum_df, sector_map, level=level, columns=columns)
+
+# --- News Fetching ---
+
+@st.cache_resource
+def get_news_fetcher():
+    """Returns the process-wide NewsFetcher, so its connection pool and cache outlive reruns."""
+    return NewsFetcher()
+
+def render_detail_card(ticker, label, record, headlines, error):
+    """Renders the metadata and headlines of one ticker as a single expander."""
+    sector = record.get('sector') or 'Sector not available'
+    with st.expander(f"{label} · {ticker} · {record.get('name') or ticker} · {sector}"):
+        lines = []
+        if record.get('industry'):
+            lines.append(f"**Sub-Industry:** {record['industry']}")
+        lines.append(f"**Description:** {record.get('description') or 'Company description not available.'}")
+        if error is not None:
+            lines.append(f"**News:** could not be fetched from Finviz ({error}).")
+        elif headlines is None:
+            lines.append("**News:** Finviz has no news table for this ticker.")
+        elif not headlines:
+            lines.append("**News:** no headlines found on Finviz.")
         else:
-            # Handle case where 'Close' might be on the second level, though less common for direct yf.download output
-            try:
-                # This might result in a single-level index if only one ticker was downloaded
-                close_prices_df = data_df.xs('Close', level=1, axis=1, drop_level=False)
-                # If it's still multi-index, drop the 'Close' level to get just ticker
-                if isinstance(close_prices_df.columns, pd.MultiIndex):
-                    close_prices_df = close_prices_df.droplevel(1, axis=1)
-                else: # If it became single-level (e.g., one ticker), then it's already just the ticker
-                    pass
-            except KeyError:
-                st.error("Error: 'Close' prices not found in the expected column structure. Please verify data_df format.")
-                return pd.DataFrame()
-    else:
-        # If it's a single-level index, assume it's already 'Close' prices per ticker
-        close_prices_df = data_df
-        # If there's only one column and it's not a ticker, try to find the 'Close' column
-        if 'Close' in close_prices_df.columns:
-            close_prices_df = close_prices_df[['Close']]
-            if len(close_prices_df.columns) == 1:
-                close_prices_df.columns = [data_df.columns[0]] # Rename to the ticker
-            else:
-                st.warning("Warning: Unrecognized single-level DataFrame structure. Attempting to proceed.")
-
-    # Iterate through each ticker's 'Close' price series
-    for ticker in close_prices_df.columns:
-        df_ticker_close = close_prices_df[ticker].dropna()
-
-        if df_ticker_close.empty or len(df_ticker_close) < 2:
-            # st.write(f"Skipping {ticker}: Not enough data for momentum calculation.")
-            continue
-
-        # Ensure the index is sorted for reliable date lookups (already generally handled by yfinance)
-        df_ticker_close = df_ticker_close.sort_index()
-
-        current_price = df_ticker_close.iloc[-1]
-
-        def get_past_price(series, days_ago):
-            # We need at least `days_ago + 1` data points for a period of `days_ago`
-            # (e.g., for 1 day ago, we need today and yesterday, so 2 points).
-            if len(series) < days_ago + 1:
-                return None
-            return series.iloc[-(days_ago + 1)]
-
-        def safe_pct_change(current, past):
-            if past is not None and past != 0:
-                return (current - past) / past
-            return None
-
-        momentum = {
-            'Ticker': ticker,
-            '1D': safe_pct_change(current_price, get_past_price(df_ticker_close, 1)),
-            '1W': safe_pct_change(current_price, get_past_price(df_ticker_close, 5)),    # Approx 1 week (5 trading days)
-            '1M': safe_pct_change(current_price, get_past_price(df_ticker_close, 22)),   # Approx 1 month (22 trading days)
-            '2M': safe_pct_change(current_price, get_past_price(df_ticker_close, 44))    # Approx 2 months (44 trading days)
-        }
-        momentum_results.append(momentum)
+            lines.append("**Latest headlines:**\n" + '\n'.join(
+                f"- **{h.title}** ({h.source + ', ' if h.source else ''}"
+                f"{f'{h.published:%b %d, %I:%M %p} ET' if h.published else h.when})" for h in headlines
+            ))
+        st.markdown('\n\n'.join(lines))  # One element per ticker, not one per line
 
-    return pd.DataFrame(momentum_results)
+# --- Background Refreshes ---
 
-# --- NEW: Function to fetch company description and sector using yfinance ---
-@st.cache_data(ttl=timedelta(weeks=1)) # Cache for a week as descriptions and sectors don't change often
-def get_company_description_and_sector_yf(ticker_symbol):
+@st.cache_resource
+def get_cache_warmer():
     """
-    Fetches the company's long business summary (description) and sector using yfinance.
-    Returns a tuple (description, sector).
+    Returns the process-wide CacheWarmer, started. It refreshes the datasets
+    registered by `watch_datasets` shortly before they expire and after the
+    market close and before the open, so readers rarely meet an expired one.
     """
-    try:
-        ticker_obj = yf.Ticker(ticker_symbol)
-        info = ticker_obj.info
-        description = info.get('longBusinessSummary', 'Description not available.')
-        sector = info.get('sector', 'Sector not available.')
-        return description, sector
-    except Exception as e:
-        return f"Description not available (Error: {e})", "Sector not available."
+    warmer = CacheWarmer()
+    warmer.start()
+    return warmer
+
+
+def watch_datasets(universe, tickers, precision):
+    """Registers the constituents, prices and company metadata of `universe` with the cache warmer."""
+    warmer = get_cache_warmer()
+    dataset = get_universe_dataset(universe)
+    warmer.watch(f"tickers:{universe}", dataset.refresh, lambda: dataset.loaded_at, dataset.ttl)
+    window_cache = get_window_cache(precision)
+    warmer.watch(f"prices:{universe}:{precision}", lambda: window_cache.refresh(tickers, '1d'),
+                 lambda: window_cache.loaded_at(tickers, '1d'), window_cache.ttl)
+    metadata_store = get_metadata_store()
+    warmer.watch(f"metadata:{universe}", lambda: metadata_store.refresh(tickers))
+
+
+def show_staleness(data, universe_dataset=None, refreshing=False):
+    """Shows how long ago the constituents and the prices in `data` were loaded."""
+    now = datetime.now()
+    parts = []
+    if universe_dataset is not None and universe_dataset.loaded_at is not None:
+        parts.append(f"Constituents loaded {format_age(now - universe_dataset.loaded_at)} ago"
+                     f"{' (refreshing in the background)' if universe_dataset.refreshing else ''}.")
+    if 'loaded_at' in data.attrs:
+        parts.append(f"Prices loaded {format_age(now - data.attrs['loaded_at'])} ago"
+                     f"{' (refreshing in the background)' if refreshing else ''}.")
+    if parts:
+        st.caption(' '.join(parts))
 
 
 # --- Main Streamlit App Logic ---
+def show_diagnostics(run_started):
+    """Shows the spans recorded during this run, a per-stage summary and export buttons."""
+    records = [record for record in recorder.snapshot() if record['start'] >= run_started]
+    with st.expander("Diagnostics", expanded=True):
+        if not records:
+            st.info("No spans recorded for this run yet.")
+            return
+        spans_df = pd.DataFrame(records)
+        summary = spans_df.groupby('name').agg(
+            Calls=('duration_s', 'size'), Total_s=('duration_s', 'sum'), Max_s=('duration_s', 'max')
+        ).sort_values('Total_s', ascending=False)
+        if 'cache' in spans_df:
+            cache_counts = pd.crosstab(spans_df['name'], spans_df['cache']).reindex(
+                index=summary.index, columns=['hit', 'miss'], fill_value=0
+            )
+            summary['Hits'] = cache_counts['hit']
+            summary['Misses'] = cache_counts['miss']
+        if 'peak_bytes' in spans_df:
+            summary['Peak_MB'] = spans_df.groupby('name')['peak_bytes'].max() / 1e6
+        st.markdown(f"**{len(records)} spans, run time {time.time() - run_started:.2f}s**")
+        st.dataframe(summary.fillna(0).round(3), width='stretch')
+        st.markdown("All spans:")
+        st.dataframe(spans_df, width='stretch')
+        st.download_button("Download spans (JSON lines)", to_jsonl(records),
+                           file_name="screener_spans.jsonl", mime="application/json")
+        st.download_button("Download metrics (Prometheus)", to_prometheus(records),
+                           file_name="screener_metrics.prom", mime="text/plain")
+
+
 def main():
     st.title("📈 S&P 500 Momentum Analyzer")
-    st.markdown("""
-    This application fetches daily stock data for S&P 500 companies and calculates their price momentum
-    over various periods (1-day, 1-week, 1-month, 2-months). Use the sidebar to customize your analysis.
+    st.markdown(f"""
+    This application fetches daily stock data for S&P 500 companies (or another index, or your own watchlist)
+    and calculates their price momentum over various periods ({', '.join(MOMENTUM_HORIZONS)}). Use the sidebar
+    to customize your analysis.
     """)
 
     # --- User Inputs in Sidebar ---
@@ -300,12 +471,29 @@ def main():
         st.header("Analysis Settings")
         st.markdown("Adjust the parameters below to refine your momentum analysis.")
 
+        universe = st.selectbox(
+            "Ticker Universe:",
+            list(UNIVERSES) + [CUSTOM_WATCHLIST],
+            help="Index whose constituents are screened, or a watchlist file of your own. Large universes are "
+                 "downloaded in chunks; the first download of a few thousand tickers takes a while."
+        )
+        watchlist = None
+        if universe == CUSTOM_WATCHLIST:
+            watchlist = st.file_uploader(
+                "Watchlist file:",
+                type=['csv', 'txt'],
+                help="A CSV file with a Symbol or Ticker column (Name, Sector and Industry columns are used if "
+                     "present), or a text file with one symbol per line."
+            )
+
         data_period_options = {
             "2 Months": "2mo",
             "3 Months": "3mo",
             "6 Months": "6mo",
             "1 Year": "1y",
-            "2 Years": "2y"
+            "2 Years": "2y",
+            "5 Years": "5y",
+            "10 Years": "10y"
         }
         selected_period_label = st.selectbox(
             "Select Data Period for Download:",
@@ -317,9 +505,13 @@ def main():
 
         sort_column = st.selectbox(
             "Sort Results by:",
-            ['1M', '1W', '1D', '2M'],
-            index=0, # Default to 1M
-            help="Select the momentum period to sort the top and bottom lists."
+            list(MOMENTUM_HORIZONS) + list(INDICATORS),
+            index=list(MOMENTUM_HORIZONS).index('1M'), # Default to 1M
+            help="Select the momentum period or indicator to sort the top and bottom lists. Horizons are calendar "
+                 "spans ending on the latest trading day; 12-1M runs from 12 months to 1 month ago. Indicators "
+                 "use trading-day windows: volatility, risk-adjusted return (return over volatility), moving "
+                 "average crossovers, RSI, distance below the 52-week high, and 20-day volume against the "
+                 "3-month average or in dollars."
         )
         sort_order = st.radio(
             "Sort Order:",
@@ -337,42 +529,123 @@ def main():
             help="Set how many top and bottom tickers to show in each table."
         )
 
+        full_precision = st.checkbox(
+            "Full precision (float64)",
+            value=False,
+            help="Keep close prices and volumes in float64 instead of float32. Doubles the price memory; "
+                 "momentum differs only beyond the 6th significant digit, and float32 rounds volumes above "
+                 "about 16.8 million by at most a few shares per hundred million."
+        )
+        precision = 'float64' if full_precision else 'float32'
+
+        st.markdown("---")
+        diagnostics = st.checkbox(
+            "Enable diagnostics",
+            value=recorder.enabled,
+            help="Record timings, cache hits, bytes and row counts for each stage and external call "
+                 "(applies to the whole server process)."
+        )
+        trace_memory = st.checkbox(
+            "Trace peak memory",
+            value=recorder.trace_memory,
+            disabled=not diagnostics,
+            help="Also record peak memory per stage. This slows the app down noticeably."
+        )
+        recorder.enabled = diagnostics
+        recorder.set_trace_memory(diagnostics and trace_memory)
+
         st.markdown("---")
         st.markdown("Developed with ❤️ using Streamlit and yfinance.")
 
+    run_started = time.time()
+    run_analysis(selected_period, sort_column, ascending, num_display, precision, universe, watchlist)
+
+    if recorder.enabled:
+        with st.sidebar:
+            show_diagnostics(run_started)
+
+
+def run_analysis(selected_period, sort_column, ascending, num_display, precision='float32', universe='S&P 500',
+                 watchlist=None):
+    """Runs the download, momentum and display pipeline for the sidebar settings."""
     # --- Data Download ---
-    sp500_tickers = get_sp500_tickers()
-    if not sp500_tickers:
-        st.error("Could not retrieve S&P 500 tickers. Please try again later.")
+    if universe == CUSTOM_WATCHLIST and watchlist is None:
+        st.info("Upload a watchlist file in the sidebar to screen it.")
+        return
+    with span('tickers', universe=universe) as s:
+        s.set(cache='hit')  # The ticker loaders mark a miss when their body actually runs
+        try:
+            if watchlist is not None:
+                universe_tickers = get_watchlist_tickers(watchlist.getvalue())
+            else:
+                universe_tickers = get_universe_tickers(universe)
+        except ValueError as e:
+            st.error(f"Could not read the watchlist: {e}")
+            return
+        s.set(rows=len(universe_tickers))
+    if not universe_tickers:
+        st.error(f"Could not retrieve {universe} tickers. Please try again later.")
         return
 
-    all_tickers_data = download_sp500_data(sp500_tickers, period=selected_period)
+    # Refresh descriptions for the whole universe off the main thread
+    get_metadata_store().refresh_in_background(universe_tickers)
+    if watchlist is None:
+        watch_datasets(universe, universe_tickers, precision)
+
+    with span('download', period=selected_period) as s:
+        s.set(cache='hit')  # The fetch callback marks a miss when the window cache has to load
+        all_tickers_data = download_sp500_data(universe_tickers, period=selected_period, precision=precision)
+        s.set(rows=len(all_tickers_data), bytes=int(all_tickers_data.memory_usage().sum()))
 
     if all_tickers_data.empty:
         st.warning("No data available to calculate momentum.")
         return
+    show_staleness(all_tickers_data, get_universe_dataset(universe) if watchlist is None else None,
+                   get_window_cache(precision).refreshing(universe_tickers, '1d'))
+
+    close_bytes = int(all_tickers_data.memory_usage(index=False).sum())
+    n_dates, n_tickers = all_tickers_data['Close'].shape
+    full_bytes = ohlcv_frame_bytes(n_dates, n_tickers)
+    st.caption(f"Close prices and volumes held as a {n_dates} x {n_tickers} {precision} matrix per field "
+               f"({close_bytes / 1e6:.1f} MB, memory-mapped and shared by all sessions) instead of a float64 OHLCV "
+               f"frame ({full_bytes / 1e6:.1f} MB per session), saving {(full_bytes - close_bytes) / 1e6:.1f} MB "
+               f"of resident memory per session."
+               + (" In float32, volumes above about 16.8 million are rounded to ~7 significant digits."
+                  if precision == 'float32' else ""))
 
     # --- Momentum Calculation ---
     st.subheader("Calculating Momentum...")
-    momentum_df = calculate_momentum_for_all(all_tickers_data)
+    momentum_columns = list(MOMENTUM_HORIZONS)
+    rank_columns = momentum_columns + list(INDICATORS)
+    # Label of the sorted values in headings: a change for a horizon, the indicator itself otherwise
+    sort_label = f"{sort_column} Change" if sort_column in MOMENTUM_HORIZONS else sort_column
+    # Momentum, indicators and rankings are computed once per downloaded snapshot, not on every rerun
+    snapshot_key = (tuple(universe_tickers), selected_period, precision, all_tickers_data.attrs.get('loaded_at'))
+    try:
+        with span('momentum') as s:
+            s.set(cache='hit')
+            momentum_df, rank_index, excluded_rows = get_momentum_snapshot(
+                snapshot_key, all_tickers_data, tuple(rank_columns)
+            )
+            s.set(rows=len(momentum_df))
+    except ValueError as e:
+        st.error(f"Error: {e}")
+        return
 
     if momentum_df.empty:
         st.warning("No momentum results generated. Check data validity or selected period.")
         return
 
-    # Ensure momentum columns are numeric for sorting
-    for col in ['1D', '1W', '1M', '2M']:
-        momentum_df[col] = pd.to_numeric(momentum_df[col], errors='coerce')
-    
-    # Drop rows where all momentum values are NaN (e.g., if a ticker had no valid periods)
-    initial_rows = len(momentum_df)
-    # Corrected the typo from '1M' to '2M' in the dropna subset as per typical momentum calculations
-    momentum_df.dropna(subset=['1D', '1W', '1M', '2M'], how='all', inplace=True) 
     final_rows = len(momentum_df)
-    
+
+    short_history = [col for col in rank_columns if rank_index.valid_counts[col] == 0]
+    if short_history:
+        st.info(f"Not enough history for {', '.join(short_history)} with the selected period. "
+                f"Choose a longer data period to fill these columns.")
+
     # Inform user about data completeness (retained for clarity, can be removed for final polish)
-    if final_rows < initial_rows:
-        st.info(f"Note: {initial_rows - final_rows} tickers were excluded due to incomplete data for all momentum periods. Displaying results for {final_rows} tickers.")
+    if excluded_rows:
+        st.info(f"Note: {excluded_rows} tickers were excluded due to incomplete data for all momentum periods. Displaying results for {final_rows} tickers.")
     else:
         st.success(f"Momentum calculated for all {final_rows} tickers.")
 
@@ -380,122 +653,112 @@ def main():
     # --- Display Results with User Controls (Tables First) ---
     st.subheader("Analysis Results")
 
-    # Format percentage columns for display
-    formatted_momentum_df = momentum_df.copy()
-    for col in ['1D', '1W', '1M', '2M']:
-        formatted_momentum_df[col] = formatted_momentum_df[col].apply(lambda x: f"{x:.2%}" if pd.notna(x) else "N/A")
-
     # Use columns for a cleaner side-by-side display
-    col1, col2 = st.columns(2)
-
-    with col1:
-        st.markdown(f"#### Top {min(num_display, final_rows)} Tickers by {sort_column} Change")
-        # Ensure we don't try to display more rows than available
-        top_results = momentum_df.sort_values(sort_column, ascending=False).head(num_display)
-        st.dataframe(formatted_momentum_df.loc[top_results.index].reset_index(drop=True), use_container_width=True)
-
-    with col2:
-        st.markdown(f"#### Bottom {min(num_display, final_rows)} Tickers by {sort_column} Change")
-        # Ensure we don't try to display more rows than available
-        bottom_results = momentum_df.sort_values(sort_column, ascending=True).head(num_display)
-        st.dataframe(formatted_momentum_df.loc[bottom_results.index].reset_index(drop=True), use_container_width=True)
+    with span('render.tables', rows=2 * num_display):
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.markdown(f"#### Top {min(num_display, final_rows)} Tickers by {sort_label}")
+            # Only the rows shown are looked up and formatted
+            top_positions = rank_index.head(sort_column, num_display, ascending=False)
+            st.dataframe(rank_index.display_rows(top_positions, percentile_column=sort_column), width='stretch')
+
+        with col2:
+            st.markdown(f"#### Bottom {min(num_display, final_rows)} Tickers by {sort_label}")
+            bottom_positions = rank_index.head(sort_column, num_display, ascending=True)
+            st.dataframe(rank_index.display_rows(bottom_positions, percentile_column=sort_column), width='stretch')
+
+    # --- Sector and Sub-Industry Momentum ---
+    st.markdown(f"#### Sector Momentum by {sort_label}")
+    group_label = st.radio("Group by:", list(GROUP_LEVELS), horizontal=True,
+                           help="Aggregate momentum by GICS sector or sub-industry.")
+    group_level = GROUP_LEVELS[group_label]
+    group_columns = momentum_columns + ([sort_column] if sort_column not in momentum_columns else [])
+    with span('sectors', level=group_level) as s:
+        s.set(cache='hit')
+        group_summary, group_members = get_group_momentum(
+            momentum_df, get_sector_map(get_metadata_store(), momentum_df['Ticker'].tolist()), group_level, group_columns
+        )
+        s.set(rows=len(group_summary))
+    st.dataframe(format_group_summary(group_summary, sort_column, ascending=ascending,
+                                      formats=column_formats(group_columns)), width='stretch')
+
+    # Drill down into one group's ranked constituents, reusing the joined table and the rank order
+    selected_group = st.selectbox(
+        f"Show constituents of {group_label.lower()}:",
+        group_summary.sort_values((sort_column, 'Mean'), ascending=ascending).index.tolist(),
+    )
+    ranked = rank_index.order(sort_column, ascending=ascending)
+    in_group = (group_members[group_level] == selected_group).to_numpy()
+    st.dataframe(rank_index.display_rows(ranked[in_group[ranked]], percentile_column=sort_column),
+                 width='stretch')
+
+    # --- Walk-Forward Backtest ---
+    with st.expander("Backtest: how have these rankings performed?"):
+        st.markdown("At each rebalance date over the downloaded history, tickers are ranked on every horizon and "
+                    "equal-weighted top and bottom portfolios are held until the next rebalance. "
+                    "Hit rates count names beating (top) or trailing (bottom) the median ticker.")
+        bt_col1, bt_col2 = st.columns(2)
+        with bt_col1:
+            rebalance_label = st.selectbox("Rebalance:", list(REBALANCE_FREQUENCIES), index=1)
+        with bt_col2:
+            size_label = st.selectbox("Portfolio size:", list(PORTFOLIO_SIZES))
+        try:
+            with span('backtest', rebalance=REBALANCE_FREQUENCIES[rebalance_label]) as s:
+                s.set(cache='hit')
+                backtest_summary, backtest_periods = get_backtest(
+                    snapshot_key, all_tickers_data, REBALANCE_FREQUENCIES[rebalance_label], PORTFOLIO_SIZES[size_label]
+                )
+                s.set(rows=len(backtest_periods))
+        except ValueError as e:
+            st.info(f"{e} Choose a longer data period or a more frequent rebalance.")
+        else:
+            st.caption(f"{len(backtest_periods)} rebalances from {backtest_periods.index[0]:%Y-%m-%d} "
+                       f"to {backtest_periods.index[-1]:%Y-%m-%d}. Returns are per holding period.")
+            st.dataframe(format_backtest_summary(backtest_summary), width='stretch')
+            # Growth of the top and bottom portfolios on the selected horizon
+            # The backtest ranks on momentum horizons only
+            chart_horizon = sort_column if sort_column in MOMENTUM_HORIZONS else '1M'
+            held = backtest_periods[chart_horizon][['Top', 'Bottom']].fillna(0)
+            st.markdown(f"##### Cumulative Return of {chart_horizon} Portfolios")
+            st.line_chart((1 + held).cumprod() - 1)
 
     st.markdown("---")
 
-    # --- Company Descriptions and Sector Summaries (Second) ---
-    st.header("Detailed Company Information (Description & Sector)")
-
-    # Determine top and bottom tickers for details fetching based on user's sort_column and num_display
-    # Filter out NaNs in the sort_column before sorting
-    momentum_df_filtered = momentum_df.dropna(subset=[sort_column])
-
-    momentum_df_sorted_top = momentum_df_filtered.sort_values(sort_column, ascending=False)
-    top_tickers = momentum_df_sorted_top.head(num_display)['Ticker'].to_list()
-
-    momentum_df_sorted_bottom = momentum_df_filtered.sort_values(sort_column, ascending=True)
-    bottom_tickers = momentum_df_sorted_bottom.head(num_display)['Ticker'].to_list()
-    # Combine the lists and remove duplicates using set for efficient fetching
-    all_tickers_for_details = list(set(top_tickers + bottom_tickers))
-
-    if not all_tickers_for_details:
-        st.info("No tickers available to fetch descriptions or sectors for. Please ensure momentum data is present.")
-    else:
-        st.info(f"Fetching news for {len(all_tickers_for_details)} top/bottom tickers by {sort_column} momentum...")
-        with st.spinner("Retrieving company details..."):
-            for ticker in all_tickers_for_details:
-                description, sector = get_company_description_and_sector_yf(ticker)
-                st.markdown(f"#### {ticker}:")
-                if sector and sector != 'Sector not available.':
-                    st.markdown(f"**Sector:** {sector}")
-                else:
-                    st.info(f"Sector not available for {ticker}.")
-
-                if description and description != 'Description not available.':
-                    st.markdown(f"**Description:** {description}")
-                else:
-                    st.info(f"Company description not available for {ticker}.")
-                st.markdown("---") # Separator for each ticker's info
-
-
-    # --- News Headlines (Third) ---
-    st.header("Latest News Headlines")
-
-    if not all_tickers_for_details: # Re-use the list from above
-        st.info("No tickers available to fetch news for. Please ensure momentum data is present.")
+    # --- Company Details and News ---
+    st.header("Company Details and Latest News")
+
+    # Top and bottom tickers by the sort column, leaving out tickers with no value in it
+    top_tickers = rank_index.tickers_at(rank_index.head(sort_column, num_display, ascending=False, dropna=True))
+    bottom_tickers = rank_index.tickers_at(rank_index.head(sort_column, num_display, ascending=True, dropna=True))
+    # Rank labels in display order; a ticker on both lists (small universes) is shown once
+    detail_labels = {}
+    for side, side_tickers in (('Top', top_tickers), ('Bottom', bottom_tickers)):
+        for position, ticker in enumerate(side_tickers, start=1):
+            detail_labels.setdefault(ticker, f"{side} {position}")
+    detail_tickers = list(detail_labels)
+
+    if not detail_tickers:
+        st.info("No tickers available to fetch details or news for. Please ensure momentum data is present.")
     else:
-        st.info(f"Fetching news for {len(all_tickers_for_details)} top/bottom 1-week momentum tickers...")
-        finviz_url = 'https://finviz.com/quote.ashx?t='
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36'
-        }
-        news_tables = {}
-        n_headlines = 3 # Number of article headlines displayed per ticker
-
-        with st.spinner("Downloading news data, this might take a moment."):
-            for ticker in all_tickers_for_details:
-                url = finviz_url + ticker
-                try:
-                    response = requests.get(url, headers=headers)
-                    response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
-
-                    html = BeautifulSoup(response.text, features="lxml")
-                    news_table = html.find(id='news-table')
-                    if news_table:
-                        news_tables[ticker] = news_table
-                    else:
-                        st.warning(f"Could not find 'news-table' for {ticker} from Finviz.")
-
-                except requests.exceptions.RequestException as err:
-                    st.error(f"Error fetching news for {ticker}: {err}")
-        st.success("News data fetching attempt complete.")
-
-        st.markdown("### Latest Headlines")
-        # Display News Data
-        if news_tables:
-            for ticker in all_tickers_for_details:
-                df = news_tables.get(ticker) # Use .get() to avoid KeyError if ticker is not in news_tables
-                if df:
-                    df_tr = df.findAll('tr')
-                    st.markdown(f"#### {ticker}:")
-                    news_count = 0
-                    for i, table_row in enumerate(df_tr):
-                        if news_count >= n_headlines:
-                            break
-
-                        a_tag = table_row.find('a')
-                        td_tag = table_row.find('td')
-
-                        if a_tag and td_tag:
-                            a_text = a_tag.text
-                            td_text = td_tag.text.strip()
-                            st.markdown(f"- **{a_text}** ({td_text})")
-                            news_count += 1
-                    if news_count == 0:
-                        st.info(f"No headlines found for {ticker} from Finviz.")
-                else:
-                    st.info(f"No news data available to display for {ticker}.")
-                st.markdown("---") # Separator for each ticker's news
-
+        n_pages = page_count(len(detail_tickers))
+        page = 1
+        if n_pages > 1:
+            def page_label(p):
+                on_page = page_of(detail_tickers, p)
+                return f"{detail_labels[on_page[0]]} – {detail_labels[on_page[-1]]}"
+
+            # Only the tickers on the selected page are fetched
+            page = st.radio("Tickers:", range(1, n_pages + 1), horizontal=True, format_func=page_label)
+        page_tickers = page_of(detail_tickers, page)
+        # One placeholder per ticker keeps the cards in rank order, whichever fetch finishes first
+        placeholders = {ticker: st.empty() for ticker in page_tickers}
+        for ticker, placeholder in placeholders.items():
+            placeholder.caption(f"{detail_labels[ticker]}: {ticker}, fetching details and news...")
+        with span('details', tickers=len(page_tickers)):
+            for ticker, record, headlines, error in iter_details(page_tickers, get_metadata_store(), get_news_fetcher()):
+                with placeholders[ticker].container():
+                    render_detail_card(ticker, detail_labels[ticker], record, headlines, error)
 
     st.markdown("---")
     st.info("Data provided by Yahoo Finance and Finviz. Momentum is calculated based on daily close prices. Performance is not indicative of future results.")